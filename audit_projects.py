@@ -2,22 +2,34 @@
 # -*- coding: utf-8 -*-
 
 from pathlib import Path
+import argparse
 import csv
+import json
+import math
+import os
 import re
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+import profiling
+from site_index import SiteIndex
+
 ROOT = Path(".").resolve()
 PROJECTS_DIR = ROOT / "works" / "projects"
 CSV_PATH = ROOT / "projects.csv"
 REPORT_PATH = ROOT / "inbox" / "project_audit_report.txt"
+MANIFEST_PATH = ROOT / "inbox" / "project_audit_manifest.json"
+MANIFEST_VERSION = 1
 
 IGNORE_DIRS = {"_template-project"}  # 模板不算项目
+GALLERY_RE = re.compile(r"\d{2,3}\.(jpg|jpeg|png|webp|JPG|JPEG|PNG|WEBP)")
 
 def read_csv_slugs(csv_path: Path) -> set[str]:
     slugs = set()
     if not csv_path.exists():
         return slugs
-    with csv_path.open("r", encoding="utf-8", newline="") as f:
+    with profiling.span("csv"), csv_path.open("r", encoding="utf-8", newline="") as f:
         reader = csv.DictReader(f)
         for row in reader:
             slug = (row.get("project_slug") or "").strip()
@@ -25,7 +37,12 @@ def read_csv_slugs(csv_path: Path) -> set[str]:
                 slugs.add(slug)
     return slugs
 
-def list_project_folders(projects_dir: Path) -> list[Path]:
+def list_project_folders(projects_dir: Path, index: SiteIndex | None = None) -> list[Path]:
+    if index is not None:
+        # 从内存里的快照取；SiteIndex 本身就不收 _trash_invalid_* / _img_backup_*
+        listing = index.listdir(projects_dir.relative_to(ROOT).as_posix())
+        return [projects_dir / name for name, e in sorted(listing.items())
+                if e.is_dir and name not in IGNORE_DIRS and not name.startswith(".")]
     if not projects_dir.exists():
         return []
     folders = []
@@ -38,164 +55,445 @@ def slug_ok(slug: str) -> bool:
     # p-YYYY-NNN-slug
     return bool(re.fullmatch(r"p-\d{4}-\d{3}-[a-z0-9]+(?:-[a-z0-9]+)*", slug))
 
-def find_case_insensitive(path: Path, name: str) -> Path | None:
-    """Return a file path under 'path' matching name case-insensitively, if any."""
-    if not path.exists():
-        return None
-    target_lower = name.lower()
-    for p in path.iterdir():
-        if p.is_file() and p.name.lower() == target_lower:
-            return p
-    return None
+def list_file_names(path: Path) -> list[str]:
+    """One directory listing; audit_one derives every check from it."""
+    names = []
+    with os.scandir(path) as it:
+        for e in it:
+            if e.is_file():
+                names.append(e.name)
+    return names
 
-def audit_one(project_dir: Path) -> dict:
-    slug = project_dir.name
+def read_listing(project_dir: Path) -> tuple[bool, list[str] | None]:
+    """(index.html exists, file names in img/ or None when there is no img/)."""
     img_dir = project_dir / "img"
+    if img_dir.is_dir():
+        img_files = list_file_names(img_dir)
+    else:
+        img_files = [] if img_dir.exists() else None
+    return (project_dir / "index.html").exists(), img_files
 
-    # Required files (case-sensitive expectation)
-    index_html = project_dir / "index.html"
-    thumb = img_dir / "thumb.jpg"
-    hero = img_dir / "hero.jpg"
+def index_listing(project_dir: Path, index: SiteIndex) -> tuple[bool, list[str] | None]:
+    """read_listing() from a SiteIndex snapshot instead of the disk."""
+    rel = project_dir.relative_to(ROOT).as_posix()
+    top = index.listdir(rel)
+    img = top.get("img")
+    if img is None:
+        img_files = None
+    elif img.is_dir:
+        img_files = [name for name, e in index.listdir(f"{rel}/img").items() if not e.is_dir]
+    else:
+        img_files = []
+    return "index.html" in top, img_files
 
-    # Case-insensitive matches (to catch Thumb.JPG etc.)
-    thumb_ci = find_case_insensitive(img_dir, "thumb.jpg")
-    hero_ci = find_case_insensitive(img_dir, "hero.jpg")
-    hero_jpg_jpg = find_case_insensitive(img_dir, "hero.jpg.jpg")
+def audit_one(project_dir: Path, listing: tuple[bool, list[str] | None] | None = None) -> dict:
+    slug = project_dir.name
+    with profiling.span("audit_one", project=slug):
+        # 只列一次 img/（或从快照里取），大小写匹配都从这份列表里查
+        has_index, img_files = listing if listing is not None else read_listing(project_dir)
+        by_lower = {}
+        for n in img_files or []:
+            by_lower.setdefault(n.lower(), n)
 
-    issues = []
-    warnings = []
+        # Case-insensitive matches (to catch Thumb.JPG etc.)
+        thumb_ci = by_lower.get("thumb.jpg")
+        hero_ci = by_lower.get("hero.jpg")
+        hero_jpg_jpg = by_lower.get("hero.jpg.jpg")
 
-    if not slug_ok(slug):
-        warnings.append(f"Slug not matching recommended pattern p-YYYY-NNN-slug: {slug}")
+        issues = []
+        warnings = []
 
-    if not index_html.exists():
-        issues.append("Missing project page: index.html (expected works/projects/<slug>/index.html)")
+        if not slug_ok(slug):
+            warnings.append(f"Slug not matching recommended pattern p-YYYY-NNN-slug: {slug}")
 
-    if not img_dir.exists():
-        issues.append("Missing img/ folder")
-    else:
-        if thumb.exists():
-            pass
-        elif thumb_ci:
-            warnings.append(f"thumb.jpg exists but with different casing: {thumb_ci.name} (recommend rename to thumb.jpg)")
-        else:
-            issues.append("Missing img/thumb.jpg")
+        if not has_index:
+            issues.append("Missing project page: index.html (expected works/projects/<slug>/index.html)")
 
-        if hero.exists():
-            pass
-        elif hero_ci:
-            warnings.append(f"hero.jpg exists but with different casing: {hero_ci.name} (recommend rename to hero.jpg)")
+        if img_files is None:
+            issues.append("Missing img/ folder")
         else:
-            # Special common mistake
-            if hero_jpg_jpg:
-                issues.append(f"Found {hero_jpg_jpg.name} but missing hero.jpg (rename hero.jpg.jpg -> hero.jpg)")
+            if "thumb.jpg" in img_files:
+                pass
+            elif thumb_ci:
+                warnings.append(f"thumb.jpg exists but with different casing: {thumb_ci} (recommend rename to thumb.jpg)")
             else:
-                issues.append("Missing img/hero.jpg")
-
-        # Quick count of gallery images (01.jpg, 02.jpg... any extension)
-        gallery = []
-        if img_dir.exists():
-            for p in img_dir.iterdir():
-                if p.is_file() and re.fullmatch(r"\d{2,3}\.(jpg|jpeg|png|webp|JPG|JPEG|PNG|WEBP)", p.name):
-                    gallery.append(p.name)
-        gallery.sort()
-
-        if len(gallery) == 0:
-            warnings.append("No gallery images like 01.jpg/02.jpg found (optional but recommended)")
-        else:
-            # Check mixed numbering styles (e.g., 01 + 010)
-            has_two = any(re.fullmatch(r"\d{2}\..+", n) for n in gallery)
-            has_three = any(re.fullmatch(r"\d{3}\..+", n) for n in gallery)
-            if has_two and has_three:
-                warnings.append("Gallery numbering mixes 2-digit and 3-digit (e.g., 01.jpg and 010.jpg). Recommend unify.")
+                issues.append("Missing img/thumb.jpg")
+
+            if "hero.jpg" in img_files:
+                pass
+            elif hero_ci:
+                warnings.append(f"hero.jpg exists but with different casing: {hero_ci} (recommend rename to hero.jpg)")
+            else:
+                # Special common mistake
+                if hero_jpg_jpg:
+                    issues.append(f"Found {hero_jpg_jpg} but missing hero.jpg (rename hero.jpg.jpg -> hero.jpg)")
+                else:
+                    issues.append("Missing img/hero.jpg")
+
+            # Quick count of gallery images (01.jpg, 02.jpg... any extension)
+            gallery = sorted(n for n in img_files if GALLERY_RE.fullmatch(n))
+
+            if len(gallery) == 0:
+                warnings.append("No gallery images like 01.jpg/02.jpg found (optional but recommended)")
+            else:
+                # Check mixed numbering styles (e.g., 01 + 010)
+                has_two = any(re.fullmatch(r"\d{2}\..+", n) for n in gallery)
+                has_three = any(re.fullmatch(r"\d{3}\..+", n) for n in gallery)
+                if has_two and has_three:
+                    warnings.append("Gallery numbering mixes 2-digit and 3-digit (e.g., 01.jpg and 010.jpg). Recommend unify.")
+
+        return {
+            "slug": slug,
+            "issues": issues,
+            "warnings": warnings,
+        }
+
+def stat_mtime_ns(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def stat_size(path: Path) -> int | None:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return None
 
+def project_fingerprint(project_dir: Path, index: SiteIndex | None = None) -> dict:
+    """
+    audit_one 只看文件名（存在/大小写/编号），所以目录 mtime 足够判断是否要重审：
+    新增、删除、改名都会更新所在目录的 mtime。index.html 额外记大小。
+    """
+    if index is not None:
+        rel = project_dir.relative_to(ROOT).as_posix()
+        entries = [index.entries.get(f"{rel}{name}") for name in ("", "/img", "/index.html")]
+        return {
+            "dir_mtime": entries[0].mtime_ns if entries[0] else None,
+            "img_mtime": entries[1].mtime_ns if entries[1] else None,
+            "index_size": entries[2].size if entries[2] else None,
+        }
     return {
-        "slug": slug,
-        "issues": issues,
-        "warnings": warnings,
+        "dir_mtime": stat_mtime_ns(project_dir),
+        "img_mtime": stat_mtime_ns(project_dir / "img"),
+        "index_size": stat_size(project_dir / "index.html"),
     }
 
-def main():
-    lines = []
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    lines.append(f"Project Audit Report - {ts}")
-    lines.append(f"Root: {ROOT}")
-    lines.append("")
+def load_manifest(manifest_path: Path) -> dict:
+    if not manifest_path.exists():
+        return {}
+    try:
+        data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        print(f"⚠️ Manifest unreadable, doing a full audit: {manifest_path.name}")
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("projects", {})
+
+def save_manifest(manifest_path: Path, projects: dict) -> None:
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+    data = {"version": MANIFEST_VERSION, "projects": projects}
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+
+def is_git_rev(value: str) -> bool:
+    out = subprocess.run(["git", "rev-parse", "--verify", "--quiet", f"{value}^{{commit}}"],
+                         cwd=ROOT, capture_output=True, text=True)
+    return out.returncode == 0
+
+def parse_timestamp(value: str) -> float | None:
+    """
+    '@<epoch>', ISO date/datetime or bare epoch seconds -> epoch seconds.
+    None means: treat it as a git revision. Anything that resolves as a revision
+    (an all-digit short hash, a 20240101 tag) is one, unless written as @<epoch>.
+    """
+    explicit = value.startswith("@")
+    if not explicit and is_git_rev(value):
+        return None
+    try:
+        ts = float(value[1:] if explicit else value)
+    except ValueError:
+        if explicit:
+            return None
+        try:
+            ts = datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    # nan / inf 也能被 float() 接受
+    return ts if math.isfinite(ts) else None
+
+def git_changed_slugs(rev: str) -> set[str]:
+    """Project slugs touched since a git revision (committed, staged, unstaged or untracked)."""
+    prefix = PROJECTS_DIR.relative_to(ROOT).as_posix() + "/"
+    cmds = [
+        ["git", "diff", "--name-only", rev, "--", prefix],
+        ["git", "ls-files", "--others", "--exclude-standard", "--", prefix],
+    ]
+    slugs = set()
+    for cmd in cmds:
+        out = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise SystemExit(f"❌ git failed for --since {rev}: {out.stderr.strip()}")
+        for line in out.stdout.splitlines():
+            if line.startswith(prefix):
+                slugs.add(line[len(prefix):].split("/", 1)[0])
+    return slugs
+
+def select_stale(folders: list[Path], cached: dict, since: str | None,
+                 changed: set[str] | None = None, index: SiteIndex | None = None) -> tuple[dict, set[str]]:
+    """
+    Decide which projects need audit_one again.
+    Returns (fresh fingerprints by slug, stale slugs).
+    Without --since: stale = fingerprint differs from the manifest.
+    With --since:    stale = changed after the timestamp / git rev (CI 用), plus anything never cached.
+    With changed:    the caller already knows (watch_site.py); only those slugs are re-stat'ed.
+    With index:      fingerprints come from the snapshot (site_pipeline.py), nothing is stat'ed.
+    """
+    if changed is not None:
+        fingerprints = {}
+        stale = set()
+        for p in folders:
+            slug = p.name
+            if slug in changed or slug not in cached:
+                fingerprints[slug] = project_fingerprint(p, index)
+                stale.add(slug)
+            else:
+                fingerprints[slug] = cached[slug]["fingerprint"]
+        return fingerprints, stale
+
+    fingerprints = {p.name: project_fingerprint(p, index) for p in folders}
+    stale = {slug for slug in fingerprints if slug not in cached}
+
+    if since is None:
+        for slug, fp in fingerprints.items():
+            if cached.get(slug, {}).get("fingerprint") != fp:
+                stale.add(slug)
+        return fingerprints, stale
+
+    ts = parse_timestamp(since)
+    if ts is not None:
+        cutoff = int(ts * 1_000_000_000)
+        for slug, fp in fingerprints.items():
+            if any(v is not None and v >= cutoff for v in (fp["dir_mtime"], fp["img_mtime"])):
+                stale.add(slug)
+    else:
+        stale |= git_changed_slugs(since) & fingerprints.keys()
+    return fingerprints, stale
+
+def project_status(result: dict) -> str:
+    if result["issues"]:
+        return "FAIL"
+    if result["warnings"]:
+        return "WARN"
+    return "OK"
+
+class TextReport:
+    """原来的 emoji 文本格式，逐行写出。"""
+
+    STATUS_LABELS = {"OK": "✅ OK", "FAIL": "❌ FAIL", "WARN": "⚠️ WARN"}
+
+    def __init__(self, f):
+        self.f = f
+
+    def _line(self, text: str = "") -> None:
+        self.f.write(text + "\n")
+
+    def header(self, ts: str) -> None:
+        self._line(f"Project Audit Report - {ts}")
+        self._line(f"Root: {ROOT}")
+        self._line()
+
+    def csv_section(self, csv_count: int, folder_count: int, missing: list[str], extra: list[str]) -> None:
+        self._line("CSV vs Folder Consistency")
+        self._line(f"- projects.csv slugs: {csv_count}")
+        self._line(f"- folder slugs:     {folder_count}")
+        if missing:
+            self._line(f"❌ In CSV but folder missing ({len(missing)}):")
+            for s in missing:
+                self._line(f"  - {s}")
+        else:
+            self._line("✅ All CSV slugs have folders.")
+        if extra:
+            self._line(f"⚠️ Folder exists but not in CSV ({len(extra)}):")
+            for s in extra:
+                self._line(f"  - {s}")
+        else:
+            self._line("✅ No extra folders outside CSV.")
+        self._line()
+
+    def csv_missing(self) -> None:
+        self._line("⚠️ projects.csv not found (skipping CSV consistency check).")
+        self._line()
+
+    def projects_start(self) -> None:
+        self._line("Per-project Checks")
+
+    def project(self, result: dict, status: str) -> None:
+        self._line(f"{self.STATUS_LABELS[status]}  {result['slug']}")
+        for it in result["issues"]:
+            self._line(f"   - ISSUE: {it}")
+        for wt in result["warnings"]:
+            self._line(f"   - WARN:  {wt}")
+        self._line()
+        self.f.flush()
+
+    def summary(self, total: int, bad: int, warn_count: int) -> None:
+        self._line("Summary")
+        self._line(f"- Total projects checked: {total}")
+        self._line(f"- FAIL (must fix):        {bad}")
+        self._line(f"- WARN (recommended):     {warn_count}")
+
+class JsonlReport:
+    """One JSON object per line, for dashboards (type = header/csv/project/summary)."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def _record(self, **fields) -> None:
+        self.f.write(json.dumps(fields, ensure_ascii=False) + "\n")
+
+    def header(self, ts: str) -> None:
+        self._record(type="header", generated=ts, root=str(ROOT))
+
+    def csv_section(self, csv_count: int, folder_count: int, missing: list[str], extra: list[str]) -> None:
+        self._record(type="csv", csv_slugs=csv_count, folder_slugs=folder_count,
+                     missing_folders=missing, extra_folders=extra)
+
+    def csv_missing(self) -> None:
+        self._record(type="csv", csv_slugs=None, folder_slugs=None, missing_folders=[], extra_folders=[])
+
+    def projects_start(self) -> None:
+        pass
+
+    def project(self, result: dict, status: str) -> None:
+        self._record(type="project", slug=result["slug"], status=status,
+                     issues=result["issues"], warnings=result["warnings"])
+        self.f.flush()
+
+    def summary(self, total: int, bad: int, warn_count: int) -> None:
+        self._record(type="summary", total=total, fail=bad, warn=warn_count)
+
+REPORT_FORMATS = {
+    "text": (TextReport, REPORT_PATH),
+    "jsonl": (JsonlReport, REPORT_PATH.with_suffix(".jsonl")),
+}
+
+def iter_results(folders: list[Path], stale: set[str], cached: dict, jobs: int, pool: str,
+                 listings: dict | None = None):
+    """
+    Yield (project_dir, result) in folder order.
+    Stale projects go to the worker pool up front; results are consumed in order,
+    so the report stays deterministic no matter which worker finishes first.
+    listings: slug -> index_listing() when the caller has a SiteIndex (no disk reads then).
+    """
+    listings = listings or {}
+    if jobs <= 1:
+        for p in folders:
+            yield p, audit_one(p, listings.get(p.name)) if p.name in stale else cached[p.name]["result"]
+        return
+
+    executor_cls = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+    with executor_cls(max_workers=jobs) as ex:
+        futures = {p.name: ex.submit(audit_one, p, listings.get(p.name)) for p in folders if p.name in stale}
+        for p in folders:
+            fut = futures.pop(p.name, None)
+            yield p, fut.result() if fut is not None else cached[p.name]["result"]
+
+def run_audit(incremental: bool = False, since: str | None = None, jobs: int = 1,
+              pool: str = "thread", fmt: str = "text", changed: set[str] | None = None,
+              index: SiteIndex | None = None, projects: list[dict] | None = None) -> None:
+    """
+    main() 的主体；watch_site.py 直接调用并传 changed（只重审这些 slug）。
+    site_pipeline.py 传 index（目录快照）和 projects（已解析的 projects.csv），不再遍历、不再读 CSV。
+    """
+    if changed is not None:
+        incremental = True
+    jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
 
     if not PROJECTS_DIR.exists():
         print("❌ works/projects not found.")
         return
 
-    csv_slugs = read_csv_slugs(CSV_PATH)
-    folders = list_project_folders(PROJECTS_DIR)
+    csv_slugs = {p["slug"] for p in projects} if projects is not None else read_csv_slugs(CSV_PATH)
+    folders = list_project_folders(PROJECTS_DIR, index)
     folder_slugs = {p.name for p in folders}
 
-    # CSV vs folder mismatch
-    if CSV_PATH.exists():
-        missing_folders = sorted(csv_slugs - folder_slugs)
-        extra_folders = sorted(folder_slugs - csv_slugs)
-        lines.append("CSV vs Folder Consistency")
-        lines.append(f"- projects.csv slugs: {len(csv_slugs)}")
-        lines.append(f"- folder slugs:     {len(folder_slugs)}")
-        if missing_folders:
-            lines.append(f"❌ In CSV but folder missing ({len(missing_folders)}):")
-            for s in missing_folders:
-                lines.append(f"  - {s}")
-        else:
-            lines.append("✅ All CSV slugs have folders.")
-        if extra_folders:
-            lines.append(f"⚠️ Folder exists but not in CSV ({len(extra_folders)}):")
-            for s in extra_folders:
-                lines.append(f"  - {s}")
-        else:
-            lines.append("✅ No extra folders outside CSV.")
-        lines.append("")
-    else:
-        lines.append("⚠️ projects.csv not found (skipping CSV consistency check).")
-        lines.append("")
+    cached = load_manifest(MANIFEST_PATH) if incremental else {}
+    fingerprints, stale = select_stale(folders, cached, since, changed, index)
+    listings = {p.name: index_listing(p, index) for p in folders if p.name in stale} if index is not None else None
+
+    report_cls, report_path = REPORT_FORMATS[fmt]
+    report_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Per-project checks
     total = 0
     bad = 0
     warn_count = 0
+    manifest = {}
 
-    lines.append("Per-project Checks")
-    for p in folders:
-        total += 1
-        result = audit_one(p)
-        issues = result["issues"]
-        warnings = result["warnings"]
-
-        status = "✅ OK"
-        if issues:
-            status = "❌ FAIL"
-            bad += 1
-        elif warnings:
-            status = "⚠️ WARN"
-            warn_count += 1
-
-        lines.append(f"{status}  {result['slug']}")
-        if issues:
-            for it in issues:
-                lines.append(f"   - ISSUE: {it}")
-        if warnings:
-            for wt in warnings:
-                lines.append(f"   - WARN:  {wt}")
-        lines.append("")
-
-    lines.append("Summary")
-    lines.append(f"- Total projects checked: {total}")
-    lines.append(f"- FAIL (must fix):        {bad}")
-    lines.append(f"- WARN (recommended):     {warn_count}")
-    lines.append("")
-
-    # Write report
-    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    REPORT_PATH.write_text("\n".join(lines), encoding="utf-8")
-
-    print(f"✅ Audit complete. Report saved to:\n{REPORT_PATH}")
+    # 边审边写：报告按项目顺序流式写入，不在内存里攒整份
+    with report_path.open("w", encoding="utf-8") as f:
+        report = report_cls(f)
+        report.header(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+        # CSV vs folder mismatch
+        if CSV_PATH.exists():
+            report.csv_section(
+                len(csv_slugs),
+                len(folder_slugs),
+                sorted(csv_slugs - folder_slugs),
+                sorted(folder_slugs - csv_slugs),
+            )
+        else:
+            report.csv_missing()
+
+        report.projects_start()
+        for p, result in iter_results(folders, stale, cached, jobs, pool, listings):
+            total += 1
+            manifest[p.name] = {"fingerprint": fingerprints[p.name], "result": result}
+
+            status = project_status(result)
+            if status == "FAIL":
+                bad += 1
+            elif status == "WARN":
+                warn_count += 1
+            report.project(result, status)
+
+        report.summary(total, bad, warn_count)
+
+    save_manifest(MANIFEST_PATH, manifest)
+
+    print(f"✅ Audit complete. Report saved to:\n{report_path}")
     print("\nQuick summary:")
     print(f"Total: {total} | FAIL: {bad} | WARN: {warn_count}")
+    if incremental:
+        print(f"Re-audited: {len(stale)} | From manifest: {total - len(stale)}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Audit works/projects against projects.csv and the folder conventions.")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Only re-audit projects whose folders changed since the last run (uses the manifest)")
+    ap.add_argument("--since", metavar="REV|TIMESTAMP",
+                    help="Re-audit projects changed since a git revision or a timestamp (@epoch / ISO; a bare number "
+                         "is an epoch only if it isn't also a revision); implies --incremental")
+    ap.add_argument("--jobs", "-j", type=int, default=1,
+                    help="Audit projects with N workers (default: 1; 0 = one per CPU)")
+    ap.add_argument("--pool", choices=["thread", "process"], default="thread",
+                    help="Worker pool type for --jobs (default: thread, the scan is I/O bound)")
+    ap.add_argument("--format", choices=sorted(REPORT_FORMATS), default="text",
+                    help="Report format: text (project_audit_report.txt) or jsonl (project_audit_report.jsonl)")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "audit_projects")
+    run_audit(
+        incremental=args.incremental or args.since is not None,
+        since=args.since,
+        jobs=args.jobs,
+        pool=args.pool,
+        fmt=args.format,
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the maintenance scripts on synthetic sites.
+
+For every size (projects x gallery images) a throwaway site is generated in a
+temp dir: projects.csv, works/projects/<slug>/{index.html, img/...} and an
+images.zip inbox. It has the mess real sites have: Thumb.JPG / HERO.jpg
+casing, hero.jpg.jpg, 2- and 3-digit gallery numbers side by side, upper-case
+extensions, folders with invalid names, projects missing from the CSV or from
+disk, old works/work-* links, __MACOSX / .DS_Store junk in the zip. Images are
+tiny valid JPEGs padded with a COM segment to --image-kb, each with its own
+content.
+
+Each script runs as a subprocess in a fresh hard-linked copy of the site (the
+scripts replace files, never write into them, so the pristine copy stays
+intact). Wall time and peak RSS (os.wait4 rusage, Linux/macOS) are recorded,
+best and median of --repeat runs; a run over --timeout is killed and
+recorded with exit_code null. Results go to
+inbox/benchmarks/<date>-<commit>.json; --compare prints the change against an
+earlier results file, so a regression shows up between two commits.
+
+  python3 benchmark_scripts.py [--sizes 10x20 1000x20 50000x10] [--scripts NAME ...]
+                               [--zip-images N] [--image-kb N] [--messy 0.1] [--repeat 3]
+                               [--timeout 300] [--seed 1] [--compare OLD.json] [--keep]
+"""
+
+from pathlib import Path
+import argparse
+import base64
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+ROOT = Path(".").resolve()
+REPO = Path(__file__).resolve().parent
+RESULTS_DIR = ROOT / "inbox" / "benchmarks"
+RESULTS_VERSION = 1
+
+# 名字 -> 命令行参数（在合成站点的根目录里运行）
+SCRIPTS = {
+    "audit_projects": [],
+    "fix_projects_state": [],
+    "normalize_gallery_numbers": [],
+    "sync_home_work_cards": [],
+    "update_project_links": [],
+    "setup_assets": ["--zip", "images.zip"],
+}
+DEFAULT_SIZES = ("10x20", "1000x20")
+# build_site.py（sync_home_work_cards）要用的站点文件
+SITE_FILES = ("style.css", "script.js")
+
+# 16x12 的 JPEG，合成图片都从它派生
+TINY_JPEG = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABsSFBcUERsXFhceHBsgKEIrKCUlKFE6PTBCYFVlZF9VXVtqeJmBanGQc1tdhbWGkJ6jq62r"
+    "Z4C8ybqmx5moq6T/2wBDARweHigjKE4rK06kbl1upKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSkpKSk"
+    "pKT/wAARCAAMABADASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAT/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFAEBAAAAAAAA"
+    "AAAAAAAAAAAAA//EABQRAQAAAAAAAAAAAAAAAAAAAAD/2gAMAwEAAhEDEQA/AJgAlf/Z"
+)
+MESS_KINDS = ("bad-name", "case", "double-ext", "no-index", "not-in-csv", "missing-folder", "mixed-digits", "upper-ext")
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8" />
+  <title>{title}</title>
+  <link rel="stylesheet" href="../../../style.css" />
+</head>
+<body>
+  <nav>
+    <a href="../../../index.html">Home</a>
+    <a href="../../work-one/index.html">Previous project</a>
+  </nav>
+  <main class="project-main">
+    <img src="img/{hero}" alt="{title} hero" />
+{gallery}  </main>
+</body>
+</html>
+"""
+
+def synthetic_jpeg(n: int, size: int, rng: random.Random) -> bytes:
+    """TINY_JPEG with a COM segment right after SOI: distinct content, padded to about size bytes."""
+    body = f"synthetic {n} ".encode("ascii")
+    body += rng.randbytes(max(0, size - len(TINY_JPEG) - len(body) - 4))
+    segments = []
+    for i in range(0, len(body), 65533):  # 一个 COM 段最多 65533 字节
+        chunk = body[i:i + 65533]
+        segments.append(b"\xff\xfe" + struct.pack(">H", len(chunk) + 2) + chunk)
+    return TINY_JPEG[:2] + b"".join(segments) + TINY_JPEG[2:]
+
+def make_project(projects_dir: Path, i: int, images: int, mess: str | None, image_kb: int, rng: random.Random) -> int:
+    """Write one project folder. Returns the number of files written."""
+    slug = f"p-{2000 + i // 1000}-{i % 1000:03d}-synthetic-project-{i}"
+    folder = projects_dir / (f"Synthetic Project {i}" if mess == "bad-name" else slug)
+    img = folder / "img"
+    img.mkdir(parents=True)
+    thumb, hero = ("Thumb.JPG", "HERO.jpg") if mess == "case" else ("thumb.jpg", "hero.jpg")
+    if mess == "double-ext":
+        hero = "hero.jpg.jpg"
+    ext = ".JPG" if mess == "upper-ext" else ".jpg"
+    names = [thumb, hero]
+    for n in range(1, images + 1):
+        width = 3 if mess == "mixed-digits" and n % 2 else 2
+        names.append(f"{n:0{width}d}{ext}")
+    for k, name in enumerate(names):
+        (img / name).write_bytes(synthetic_jpeg(i * 1000 + k, image_kb * 1024, rng))
+    if mess == "no-index":
+        return len(names)
+    gallery = "".join(f'    <img src="img/{name}" alt="image {name}" loading="lazy" />\n' for name in names[2:])
+    (folder / "index.html").write_text(PAGE.format(title=f"Synthetic project {i}", hero=hero, gallery=gallery), encoding="utf-8")
+    return len(names) + 1
+
+def make_zip(path: Path, count: int, image_kb: int, rng: random.Random) -> None:
+    """An images.zip like a phone / Finder export: mixed-case names plus macOS junk."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+        for n in range(count):
+            name = f"images/IMG_{n:04d}.{'JPG' if n % 3 else 'jpg'}"
+            zf.writestr(name, synthetic_jpeg(10**9 + n, image_kb * 1024, rng))
+            if n % 10 == 0:
+                zf.writestr(f"__MACOSX/images/._IMG_{n:04d}.JPG", b"\x00\x05\x16\x07" + bytes(78))
+        zf.writestr("images/.DS_Store", bytes(6148))
+
+def make_site(base: Path, projects: int, images: int, zip_images: int, image_kb: int, messy: float, seed: int) -> int:
+    """Generate the synthetic site in base. Returns the number of files."""
+    rng = random.Random(seed)
+    projects_dir = base / "works" / "projects"
+    projects_dir.mkdir(parents=True)
+    shutil.copytree(REPO / "templates", base / "templates")
+    for name in SITE_FILES:
+        if (REPO / name).exists():
+            shutil.copy2(REPO / name, base / name)
+
+    files = 0
+    rows = []
+    for i in range(projects):
+        mess = rng.choice(MESS_KINDS) if rng.random() < messy else None
+        slug = f"p-{2000 + i // 1000}-{i % 1000:03d}-synthetic-project-{i}"
+        if mess != "missing-folder":
+            files += make_project(projects_dir, i, images, mess, image_kb, rng)
+        if mess != "not-in-csv":
+            rows.append({"project_slug": slug, "title": f"Synthetic project {i}", "year": str(2000 + i // 1000)})
+    with (base / "projects.csv").open("w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["project_slug", "title", "year"])
+        w.writeheader()
+        w.writerows(rows)
+    make_zip(base / "images.zip", zip_images, image_kb, rng)
+    return files + 2
+
+def clone(src: Path, dst: Path) -> None:
+    shutil.copytree(src, dst, copy_function=os.link, symlinks=True)
+
+def run_script(script: str, args: list[str], cwd: Path, log: Path, timeout: float) -> tuple[float, int, int | None]:
+    """(seconds, peak RSS in KB, exit code or None if it was killed after timeout seconds) of one run."""
+    with log.open("wb") as out:
+        t0 = time.perf_counter()
+        p = subprocess.Popen(
+            [sys.executable, str(REPO / f"{script}.py"), *args],
+            cwd=cwd, stdin=subprocess.DEVNULL, stdout=out, stderr=subprocess.STDOUT,
+        )
+        killer = threading.Timer(timeout, p.kill)
+        killer.start()
+        # wait4 同时拿到退出状态和这个子进程自己的 rusage
+        _pid, status, usage = os.wait4(p.pid, 0)
+        elapsed = time.perf_counter() - t0
+        killer.cancel()
+    p.returncode = os.waitstatus_to_exitcode(status)
+    peak = usage.ru_maxrss if sys.platform != "darwin" else usage.ru_maxrss // 1024  # macOS 单位是字节
+    timed_out = os.WIFSIGNALED(status) and elapsed >= timeout
+    return elapsed, peak, None if timed_out else p.returncode
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def parse_size(text: str) -> tuple[int, int]:
+    try:
+        projects, images = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected PROJECTSxIMAGES, e.g. 1000x20, got {text!r}")
+    return projects, images
+
+def compare(old_path: Path, results: list[dict], tolerance: float) -> int:
+    """Print old -> new per (script, size). Returns how many got slower than tolerance."""
+    old = json.loads(old_path.read_text(encoding="utf-8"))
+    before = {(r["script"], r["size"]): r for r in old.get("results", [])}
+    print(f"\nAgainst {old_path.name} ({old.get('commit', '?')}):")
+    slower = 0
+    for r in results:
+        o = before.get((r["script"], r["size"]))
+        if o is None or not o["best"]:
+            print(f"  {r['script']:<28} {r['size']:>10}  (new)")
+            continue
+        ratio = r["best"] / o["best"]
+        flag = "⚠️ " if ratio > 1 + tolerance else "  "
+        slower += ratio > 1 + tolerance
+        print(f"{flag}{r['script']:<28} {r['size']:>10}  {o['best']:8.3f}s -> {r['best']:8.3f}s ({ratio:5.2f}x)"
+              f"  RSS {o['peak_rss_kb'] / 1024:6.1f} -> {r['peak_rss_kb'] / 1024:6.1f} MB")
+    return slower
+
+def main():
+    ap = argparse.ArgumentParser(description="Time the maintenance scripts (wall time, peak RSS) on synthetic sites.")
+    ap.add_argument("--sizes", nargs="+", type=parse_size, metavar="PROJECTSxIMAGES",
+                    default=[parse_size(s) for s in DEFAULT_SIZES], help=f"Site sizes (default: {' '.join(DEFAULT_SIZES)})")
+    ap.add_argument("--scripts", nargs="+", choices=sorted(SCRIPTS), default=list(SCRIPTS), metavar="NAME",
+                    help=f"Scripts to time (default: all of {', '.join(SCRIPTS)})")
+    ap.add_argument("--zip-images", type=int, default=200, help="Images in the synthetic images.zip (default: 200)")
+    ap.add_argument("--image-kb", type=int, default=1, help="Size of each synthetic image in KB (default: 1)")
+    ap.add_argument("--messy", type=float, default=0.1, help="Share of projects with a problem (default: 0.1)")
+    ap.add_argument("--repeat", type=int, default=3, help="Runs per script and size (default: 3)")
+    ap.add_argument("--timeout", type=float, default=300, help="Kill a run after this many seconds (default: 300)")
+    ap.add_argument("--seed", type=int, default=1, help="Random seed, same seed = same site (default: 1)")
+    ap.add_argument("--compare", type=Path, metavar="OLD.json", help="Show the change against an earlier results file")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="Slowdown flagged by --compare (default: 0.10 = 10%%)")
+    ap.add_argument("--keep", action="store_true", help="Keep the temp dir (sites + logs) and print where it is")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="site-bench-"))
+    results = []
+    try:
+        for projects, images in args.sizes:
+            size = f"{projects}x{images}"
+            pristine = tmp / size / "site"
+            t0 = time.perf_counter()
+            files = make_site(pristine, projects, images, args.zip_images, args.image_kb, args.messy, args.seed)
+            print(f"▶ {size}: {files} files generated in {time.perf_counter() - t0:.1f}s")
+            for script in args.scripts:
+                runs, peak, code = [], 0, 0
+                for n in range(max(1, args.repeat)):
+                    work = tmp / size / f"{script}-{n}"
+                    clone(pristine, work)
+                    seconds, rss, code = run_script(script, SCRIPTS[script], work, tmp / size / f"{script}-{n}.log", args.timeout)
+                    runs.append(round(seconds, 4))
+                    peak = max(peak, rss)
+                    if not args.keep:
+                        shutil.rmtree(work)
+                    if code != 0:
+                        break
+                r = {
+                    "script": script,
+                    "size": size,
+                    "projects": projects,
+                    "images": images,
+                    "files": files,
+                    "runs": runs,
+                    "best": min(runs),
+                    "median": statistics.median(runs),
+                    "peak_rss_kb": peak,
+                    "exit_code": code,
+                }
+                results.append(r)
+                if code is None:
+                    mark = f"❌ (killed after {args.timeout:.0f}s)"
+                else:
+                    mark = "✅" if code == 0 else f"❌ (exit {code}, see {script}-*.log)"
+                print(f"  {mark} {script:<28} best {r['best']:8.3f}s  median {r['median']:8.3f}s  peak RSS {peak / 1024:6.1f} MB")
+    finally:
+        if args.keep:
+            print(f"ℹ️ Sites and logs kept in {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    commit = git_commit()
+    data = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {"zip_images": args.zip_images, "image_kb": args.image_kb, "messy": args.messy,
+                   "repeat": args.repeat, "seed": args.seed, "timeout": args.timeout},
+        "results": results,
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    out.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"\n✅ Results: {out}")
+    if args.compare:
+        slower = compare(args.compare, results, args.tolerance)
+        if slower:
+            print(f"⚠️ {slower} result(s) slower than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
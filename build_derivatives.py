@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Responsive derivatives for every source image under works/projects/*/img:
+
+  img/feature/feature-01.jpg -> img/feature/feature-01-480w.webp, ...-800w.webp, ...
+                                (+ .avif when the encoder supports it)
+
+Encoding runs on all cores. inbox/derivatives_cache.json remembers each source's
+content hash, so unchanged images are never re-encoded. Afterwards every project
+index.html gets its <img> tags wrapped in <picture> with srcset/sizes.
+
+Encoders: Pillow if installed (WebP, and AVIF when Pillow was built with it),
+otherwise the cwebp CLI for WebP only (brew install webp). cwebp can't apply
+the EXIF orientation, so without Pillow rotated/flipped photos are skipped.
+
+A <picture> that is already on the page keeps its hand-written <source>s
+(media queries, art direction); only the generated ones are added or updated.
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from audit_projects import list_project_folders
+from image_headers import display_size
+from media_catalogue import Catalogue
+import profiling
+from site_journal import Batch
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 是可选依赖
+    Image = None
+
+ROOT = Path(".").resolve()
+PROJECTS_DIR = ROOT / "works" / "projects"
+CACHE_PATH = ROOT / "inbox" / "derivatives_cache.json"
+
+SOURCE_EXTS = {".jpg", ".jpeg", ".png"}
+WIDTHS = (480, 800, 1200, 1600)
+QUALITY = 80
+HERO_SIZES = "100vw"
+DEFAULT_SIZES = "(max-width: 768px) 100vw, 50vw"
+# <source> 的顺序就是浏览器挑选的优先级
+FORMAT_ORDER = ("avif", "webp")
+MIME = {"avif": "image/avif", "webp": "image/webp"}
+
+PICTURE_OR_IMG = re.compile(r"<picture\b.*?</picture>|<img\b[^>]*>", re.S | re.I)
+IMG_TAG = re.compile(r"<img\b[^>]*>", re.S | re.I)
+SRC_ATTR = re.compile(r'\bsrc\s*=\s*"([^"]+)"', re.I)
+SOURCE_TAG = re.compile(r"<source\b[^>]*>", re.I)
+TYPE_ATTR = re.compile(r'\btype\s*=\s*"([^"]+)"', re.I)
+MEDIA_ATTR = re.compile(r"\bmedia\s*=", re.I)
+
+def pillow_can_save(fmt: str) -> bool:
+    if Image is None:
+        return False
+    Image.init()
+    return fmt.upper() in Image.SAVE
+
+def available_formats() -> list[str]:
+    formats = []
+    if pillow_can_save("avif"):
+        formats.append("avif")
+    if pillow_can_save("webp") or shutil.which("cwebp"):
+        formats.append("webp")
+    return formats
+
+def plan_widths(width: int, widths: tuple[int, ...]) -> list[int]:
+    """Widths below the source width, plus the source width itself if it's under the largest one."""
+    planned = [w for w in widths if w < width]
+    if width <= max(widths) and width not in planned:
+        planned.append(width)
+    return planned or [max(widths)]
+
+def rendition_name(src_name: str, width: int, fmt: str) -> str:
+    stem = src_name.rsplit(".", 1)[0]
+    return f"{stem}-{width}w.{fmt}"
+
+def encode(src: str, jobs: list[tuple[str, int, str]], quality: int) -> list[tuple[str, int, str]]:
+    """Worker: write every (fmt, width, out_path) rendition of one source. Runs in a child process."""
+    src_path = Path(src)
+    if pillow_can_save("webp"):
+        with Image.open(src_path) as im:
+            im = ImageOps.exif_transpose(im)
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+            for fmt, width, out in jobs:
+                height = max(1, round(im.height * width / im.width))
+                resized = im if width >= im.width else im.resize((width, height), Image.LANCZOS)
+                tmp = Path(out + ".tmp")
+                if fmt == "webp":
+                    resized.save(tmp, "WEBP", quality=quality, method=6)
+                else:
+                    resized.save(tmp, "AVIF", quality=quality)
+                os.replace(tmp, out)
+        return jobs
+
+    for fmt, width, out in jobs:
+        if fmt != "webp":
+            continue
+        tmp = out + ".tmp"
+        subprocess.run(
+            ["cwebp", "-quiet", "-q", str(quality), "-m", "6", "-resize", str(width), "0", src, "-o", tmp],
+            check=True,
+        )
+        os.replace(tmp, out)
+    return jobs
+
+def load_cache() -> dict:
+    if not CACHE_PATH.exists():
+        return {}
+    try:
+        return json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache: dict) -> None:
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + ".tmp")
+    tmp.write_text(json.dumps(cache, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, CACHE_PATH)
+
+def collect_sources() -> list[Path]:
+    sources = []
+    for proj in list_project_folders(PROJECTS_DIR):
+        img_dir = proj / "img"
+        if not img_dir.is_dir():
+            continue
+        for p in img_dir.rglob("*"):
+            if p.is_file() and p.suffix.lower() in SOURCE_EXTS and not p.name.startswith("."):
+                sources.append(p)
+    sources.sort()
+    return sources
+
+def outputs_exist(entry: dict) -> bool:
+    return all((ROOT / rel).exists() for items in entry["outputs"].values() for _w, rel in items)
+
+def build(sources: list[Path], formats: list[str], widths: tuple[int, ...], quality: int, jobs: int) -> dict:
+    """Encode what changed; return the updated cache (rel source -> entry)."""
+    cache = load_cache()
+    settings = {"formats": formats, "widths": list(widths), "quality": quality}
+    fresh = {}
+    todo = []
+    skipped = 0
+
+    catalogue = Catalogue()
+    for src in sources:
+        rel = src.relative_to(ROOT).as_posix()
+        st = src.stat()
+        entry = cache.get(rel)
+        if entry and entry.get("settings") == settings and outputs_exist(entry):
+            # 先比 size/mtime，对不上再比哈希（touch 过但内容没变的也不用重编码）
+            if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                fresh[rel] = entry
+                skipped += 1
+                continue
+        info = catalogue.get(src)
+        if info is None:
+            continue
+        digest = info["sha256"]
+        if entry and entry.get("settings") == settings and outputs_exist(entry) and digest == entry["sha256"]:
+            fresh[rel] = dict(entry, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            skipped += 1
+            continue
+
+        if not info["width"]:
+            print(f"⚠️ Skip (cannot read size): {rel}")
+            continue
+        if (info.get("orientation") or 1) > 1 and not pillow_can_save("webp"):
+            # cwebp 不认 EXIF 方向，编出来会是躺着/镜像的
+            print(f"⚠️ Skip (EXIF orientation {info['orientation']} needs Pillow): {rel}")
+            continue
+        # 编码时会按 EXIF 方向转正，所以宽度要用显示尺寸
+        size = display_size(info)
+        outputs = {}
+        work = []
+        for fmt in formats:
+            outputs[fmt] = []
+            for w in plan_widths(size[0], widths):
+                out_rel = src.with_name(rendition_name(src.name, w, fmt)).relative_to(ROOT).as_posix()
+                outputs[fmt].append([w, out_rel])
+                work.append((fmt, w, str(ROOT / out_rel)))
+        fresh[rel] = {
+            "sha256": digest,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "settings": settings,
+            "outputs": outputs,
+        }
+        todo.append((str(src), work, rel))
+    catalogue.close()
+
+    print(f"Sources: {len(sources)} | cached: {skipped} | to encode: {len(todo)}")
+    if todo:
+        done = 0
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            futures = {ex.submit(encode, src, work, quality): rel for src, work, rel in todo}
+            for fut in as_completed(futures):
+                rel = futures[fut]
+                try:
+                    fut.result()
+                    done += 1
+                except Exception as e:
+                    print(f"❌ Encode failed: {rel}: {e}")
+                    fresh.pop(rel, None)
+        print(f"✅ Encoded {done} source image(s)")
+
+    save_cache(fresh)
+    return fresh
+
+def source_tags(src: str, renditions: dict) -> dict[str, str]:
+    """MIME type -> generated <source> tag, in FORMAT_ORDER."""
+    prefix = src.rsplit("/", 1)[0] + "/" if "/" in src else ""
+    stem = src.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    sizes = HERO_SIZES if stem.lower() == "hero" else DEFAULT_SIZES
+    tags = {}
+    for fmt in FORMAT_ORDER:
+        items = renditions.get(fmt)
+        if not items:
+            continue
+        srcset = ", ".join(f"{prefix}{Path(rel).name} {w}w" for w, rel in items)
+        tags[MIME[fmt]] = f'<source type="{MIME[fmt]}" srcset="{srcset}" sizes="{sizes}">'
+    return tags
+
+def picture_html(img_tag: str, src: str, renditions: dict, indent: str) -> str:
+    lines = [f"{indent}<picture>"]
+    lines.extend(f"{indent}  {tag}" for tag in source_tags(src, renditions).values())
+    lines.append(f"{indent}  {img_tag}")
+    lines.append(f"{indent}</picture>")
+    return "\n".join(lines).lstrip()
+
+def merge_picture(block: str, src: str, renditions: dict) -> str:
+    """Update an existing <picture>: our <source>s are regenerated, everything else is kept as written."""
+    tags = source_tags(src, renditions)
+    ours = [m for m in SOURCE_TAG.finditer(block)
+            if (t := TYPE_ATTR.search(m.group(0))) and t.group(1).lower() in tags and not MEDIA_ATTR.search(m.group(0))]
+    # 带 media 的是手写的美术指导，原样保留；生成的那组放在原来第一个的位置（没有就放在 <img> 前）
+    at = ours[0].start() if ours else IMG_TAG.search(block).start()
+    pad = block[block.rfind("\n", 0, at) + 1:at]
+    sep = "\n" + pad if "\n" in block[:at] and not pad.strip() else " "
+    for m in reversed(ours):
+        tail = re.match(r"\s*", block[m.end():]).end()
+        block = block[:m.start()] + block[m.end() + tail:]
+    return block[:at] + "".join(tag + sep for tag in tags.values()) + block[at:]
+
+def rewrite_page(html: str, page_dir: Path, cache: dict) -> tuple[str, int]:
+    count = 0
+
+    def repl(m: re.Match) -> str:
+        nonlocal count
+        block = m.group(0)
+        img = IMG_TAG.search(block)
+        if not img:
+            return block
+        src_m = SRC_ATTR.search(img.group(0))
+        if not src_m or "://" in src_m.group(1):
+            return block
+        src = src_m.group(1)
+        rel = (page_dir / src).resolve()
+        try:
+            rel = rel.relative_to(ROOT).as_posix()
+        except ValueError:
+            return block
+        entry = cache.get(rel)
+        if not entry:
+            return block
+        if block[:8].lower() == "<picture":
+            new_block = merge_picture(block, src, entry["outputs"])
+        else:
+            line_start = html.rfind("\n", 0, m.start()) + 1
+            indent = re.match(r"[ \t]*", html[line_start:m.start()]).group(0)
+            new_block = picture_html(img.group(0), src, entry["outputs"], indent)
+        if new_block != block:
+            count += 1
+        return new_block
+
+    return PICTURE_OR_IMG.sub(repl, html), count
+
+def rewrite_pages(cache: dict) -> None:
+    updated = 0
+    with Batch("build_derivatives") as batch:
+        for proj in list_project_folders(PROJECTS_DIR):
+            index_html = proj / "index.html"
+            if not index_html.exists():
+                continue
+            html = index_html.read_text(encoding="utf-8")
+            new_html, count = rewrite_page(html, proj, cache)
+            if new_html != html:
+                batch.write_text(index_html, new_html)
+                updated += 1
+                print(f"   ✅ {proj.name}: {count} <picture> block(s)")
+    print(f"- Project pages updated: {updated}")
+    if batch.id:
+        print(f"- Undo: python3 site_journal.py undo {batch.id}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Build WebP/AVIF srcset renditions for project images and rewrite <img> into <picture>.")
+    ap.add_argument("--widths", default=",".join(map(str, WIDTHS)), help=f"Comma-separated widths (default: {','.join(map(str, WIDTHS))})")
+    ap.add_argument("--quality", type=int, default=QUALITY, help=f"Encoder quality 0-100 (default: {QUALITY})")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (default: 0 = one per CPU)")
+    ap.add_argument("--formats", help="Comma-separated subset of avif,webp (default: everything available)")
+    ap.add_argument("--skip-html", action="store_true", help="Only build renditions, leave index.html files alone")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "build_derivatives")
+
+    if not PROJECTS_DIR.exists():
+        print("❌ works/projects not found.")
+        return
+
+    formats = available_formats()
+    if args.formats:
+        wanted = [f.strip() for f in args.formats.split(",") if f.strip()]
+        missing = [f for f in wanted if f not in formats]
+        if missing:
+            print(f"⚠️ Encoder not available for: {', '.join(missing)}")
+        formats = [f for f in wanted if f in formats]
+    if not formats:
+        print("❌ No encoder available. Install Pillow (pip install Pillow) or cwebp (brew install webp).")
+        return
+    if Image is None and "avif" not in formats:
+        print("ℹ️  Pillow not installed: WebP via cwebp only, no AVIF.")
+
+    widths = tuple(sorted({int(w) for w in args.widths.split(",") if w.strip()}))
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    cache = build(collect_sources(), formats, widths, args.quality, jobs)
+    if not args.skip_html:
+        rewrite_pages(cache)
+    print("\nDone.")
+
+if __name__ == "__main__":
+    main()
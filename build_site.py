@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Render index.html, work.html and generated project pages from projects.csv + templates/.
+
+Every output has a dependency signature (template contents, the CSV rows it
+shows, the thumbnails / gallery files it points at). inbox/build_manifest.json
+keeps the last signature per output, so only pages whose inputs changed are
+rendered and written. Pages are assembled from lists and joined once.
+
+index.html and work.html get their critical CSS inlined and are minified
+(critical_css.py); style.css and script.js are part of their signature.
+Every <img> gets its intrinsic width/height (inject_dimensions.py, via the
+media catalogue); the sizes are part of the signature too.
+Lazy gallery images carry a tiny blurred placeholder as their background
+(lqip.py, cached per content hash), also part of the signature.
+
+Project pages: a missing works/projects/<slug>/index.html is generated from
+templates/project.html. Hand-written pages (no generated marker on line 2)
+are never touched.
+
+Galleries are grouped by folder: the numbered files in img/, then every folder
+below it (img/dates/2023-05, ...). A generated page shows the first
+INLINE_LIMIT images; the rest go to JSON shards (gallery/manifest.json +
+gallery/<group>.json) that gallery.js appends as the visitor scrolls, so the
+page stays the same size however many folders the project collects.
+Hand-written pages get the shards too once they contain a
+<div class="gallery-shards"> container (see gallery.js). Without JavaScript the
+shards are out of reach, so every group also gets a plain page
+(gallery/<group>.html, templates/gallery_group.html) that a <noscript> in the
+container links to. Shard images get the same "<title> <group> <number>" alt
+text as the page's own; a hand-written page's title is taken from its markup.
+"""
+
+from pathlib import Path
+import argparse
+import csv
+import hashlib
+import html
+import json
+import os
+import posixpath
+import re
+from string import Template
+
+import critical_css
+from inject_dimensions import size_attrs, sizes_for
+from lqip import page_placeholders, placeholders_for, style_attr
+from media_catalogue import Catalogue
+import profiling
+from site_index import skip_dir
+from site_journal import Batch, atomic_write_bytes
+
+ROOT = Path(".").resolve()
+CSV_PATH = ROOT / "projects.csv"
+PROJECTS_DIR = ROOT / "works" / "projects"
+TEMPLATES_DIR = ROOT / "templates"
+MANIFEST_PATH = ROOT / "inbox" / "build_manifest.json"
+MANIFEST_VERSION = 1
+
+# Home 页 Recent Projects（按这个顺序）
+RECENT_SLUGS = [
+    "p-2024-001-the-awarded",
+    "p-2024-002-the-alienated",
+    "p-2022-001-columbarium-of-the-days",
+]
+
+# 缩略图按顺序找第一个存在的：首页用 v2 裁切图，Work 页用 thumb.jpg
+HOME_THUMBS = ("thumb-v2.jpg", "thumb.jpg")
+WORK_THUMBS = ("thumb.jpg",)
+GENERATED_MARKER = "<!-- generated by build_site.py"
+GALLERY_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+# 大画廊：页面里只直接写前 INLINE_LIMIT 张，其余按文件夹分组写成 JSON 分片，由 gallery.js 滚动加载
+INLINE_LIMIT = 24
+SHARD_SIZE = 32
+GALLERY_MANIFEST = "gallery/manifest.json"
+GALLERY_VERSION = 1
+RENDITION_RE = re.compile(r"-\d+w\.(webp|avif)$", re.I)  # build_derivatives.py 的输出
+IMG_ALT_RE = re.compile(r'<img\b[^>]*?\bsrc="img/([^"]+)"[^>]*?\balt="([^"]*)"', re.I)
+
+def read_projects(csv_path: Path) -> list[dict]:
+    if not csv_path.exists():
+        raise FileNotFoundError("projects.csv not found.")
+    rows = []
+    with profiling.span("csv"), csv_path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        for r in reader:
+            slug = (r.get("project_slug") or "").strip()
+            title = (r.get("title") or "").strip()
+            year = (r.get("year") or "").strip()
+            if slug:
+                rows.append({"slug": slug, "title": title, "year": year})
+    return rows
+
+class Templates:
+    """Loads each template once per run and remembers its content hash (a dependency)."""
+
+    def __init__(self, templates_dir: Path):
+        self.dir = templates_dir
+        self._cache: dict[str, tuple[Template, str]] = {}
+
+    def get(self, name: str) -> tuple[Template, str]:
+        if name not in self._cache:
+            text = (self.dir / name).read_text(encoding="utf-8")
+            self._cache[name] = (Template(text), hashlib.sha256(text.encode("utf-8")).hexdigest())
+        return self._cache[name]
+
+    def render(self, name: str, **values) -> str:
+        return self.get(name)[0].substitute(values)
+
+    def digest(self, *names: str) -> list[str]:
+        return [self.get(n)[1] for n in names]
+
+def find_thumb(slug: str, candidates: tuple[str, ...]) -> str:
+    if len(candidates) == 1:
+        return candidates[0]
+    img_dir = PROJECTS_DIR / slug / "img"
+    for name in candidates:
+        if (img_dir / name).exists():
+            return name
+    return candidates[-1]
+
+def gallery_files(slug: str) -> list[str]:
+    img_dir = PROJECTS_DIR / slug / "img"
+    if not img_dir.is_dir():
+        return []
+    names = []
+    with os.scandir(img_dir) as it:
+        for e in it:
+            stem, dot, ext = e.name.rpartition(".")
+            if e.is_file() and dot and stem.isdigit() and f".{ext.lower()}" in GALLERY_EXTS:
+                names.append(e.name)
+    return sorted(names)
+
+def gallery_groups(slug: str) -> list[tuple[str, list[tuple[str, str | None]]]]:
+    """
+    [(key, [(image, webp alternative or None)])], paths under img/: the numbered
+    files directly in img/ (key ""), then every folder below img/ that holds
+    images, in path order (e.g. "dates/2023-05"). Empty groups are left out.
+    """
+    img_dir = PROJECTS_DIR / slug / "img"
+    groups = [("", [(name, None) for name in gallery_files(slug)])]
+    folders = []
+    for current, dirs, files in os.walk(img_dir):
+        dirs[:] = [d for d in dirs if not skip_dir(d)]
+        if Path(current) != img_dir:
+            folders.append((Path(current).relative_to(img_dir).as_posix(), files))
+    for key, files in sorted(folders):
+        names = [
+            f for f in files
+            if not f.startswith("._") and os.path.splitext(f)[1].lower() in GALLERY_EXTS and not RENDITION_RE.search(f)
+        ]
+        # 同名的 .webp 是 .jpg/.png 的替代格式，不算单独一张
+        stems = {os.path.splitext(f)[0] for f in names if not f.lower().endswith(".webp")}
+        items = []
+        for f in sorted(names):
+            stem, ext = os.path.splitext(f)
+            if ext.lower() == ".webp" and stem in stems:
+                continue
+            webp = f"{stem}.webp" if stem in stems and f"{stem}.webp" in files else None
+            items.append((f"{key}/{f}", f"{key}/{webp}" if webp else None))
+        groups.append((key, items))
+    return [(key, items) for key, items in groups if items]
+
+def shard_name(key: str, n: int) -> str:
+    base = re.sub(r"[^A-Za-z0-9._-]", "_", key.replace("/", "-")) or "main"
+    return f"gallery/{base}{f'-{n + 1}' if n else ''}.json"
+
+def group_page(key: str) -> str:
+    """No-JavaScript page of one gallery group, next to its shards."""
+    return shard_name(key, 0)[:-len(".json")] + ".html"
+
+def uses_shards(page: Path) -> bool:
+    """Hand-written pages opt in by containing the loader container."""
+    try:
+        return 'class="gallery-shards"' in page.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return False
+
+def card_values(project: dict, thumb: str, size: tuple[int, int] | None = None) -> dict:
+    title = html.escape(project["title"] or project["slug"])
+    year = html.escape(project["year"])
+    return {
+        "slug": project["slug"],
+        "title": title,
+        "year": year,
+        "year_suffix": f' <span class="work-year">({year})</span>' if year else "",
+        "thumb": thumb,
+        "dims": size_attrs(size),
+    }
+
+def signature(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+class Output:
+    """
+    One page to (maybe) build: where it goes, what it depends on, how to render it.
+    render None: a hand-written page the build only keeps track of.
+    """
+
+    def __init__(self, rel: str, deps: str | None, render):
+        self.rel = rel
+        self.path = ROOT / rel
+        self.deps = deps
+        self.render = render
+
+def image_rel(slug: str, name: str) -> str:
+    return f"works/projects/{slug}/img/{name}"
+
+def plan_home(projects: list[dict], tpl: Templates, cat: Catalogue) -> Output:
+    by_slug = {p["slug"]: p for p in projects}
+    recent = []
+    for s in RECENT_SLUGS:
+        if s in by_slug:
+            recent.append((by_slug[s], find_thumb(s, HOME_THUMBS)))
+        else:
+            print(f"⚠️ Recent slug not found in projects.csv: {s}")
+    sizes = sizes_for([image_rel(p["slug"], t) for p, t in recent], catalogue=cat)
+
+    def render() -> str:
+        cards = [
+            tpl.render("card_selected.html", **card_values(p, thumb, sizes.get(image_rel(p["slug"], thumb))))
+            for p, thumb in recent
+        ]
+        return critical_css.optimise(tpl.render("index.html", selected_works="".join(cards)), "index.html")[0]
+
+    deps = signature(tpl.digest("index.html", "card_selected.html"), [(p, t) for p, t in recent], sorted(sizes.items()), critical_css.inputs_digest())
+    return Output("index.html", deps, render)
+
+def plan_work(projects: list[dict], tpl: Templates, cat: Catalogue) -> Output:
+    # Work 页：展示全部（按 projects.csv 的顺序）
+    rows = [(p, find_thumb(p["slug"], WORK_THUMBS)) for p in projects]
+    sizes = sizes_for([image_rel(p["slug"], t) for p, t in rows], catalogue=cat)
+
+    def render() -> str:
+        cards = [
+            tpl.render("card_work.html", **card_values(p, thumb, sizes.get(image_rel(p["slug"], thumb))))
+            for p, thumb in rows
+        ]
+        return critical_css.optimise(tpl.render("work.html", work_rows="".join(cards)), "work.html")[0]
+
+    deps = signature(tpl.digest("work.html", "card_work.html"), rows, sorted(sizes.items()), critical_css.inputs_digest())
+    return Output("work.html", deps, render)
+
+def gallery_item(slug: str, image: str, webp: str | None, alt: str, sizes: dict, placeholders: dict, indent: str,
+                 prefix: str = "img/") -> str:
+    rel = image_rel(slug, image)
+    dims = size_attrs(sizes.get(rel))
+    img = f'<img src="{prefix}{image}" alt="{alt}"{dims} loading="lazy" decoding="async"{style_attr(placeholders.get(rel))} />'
+    if webp is None:
+        return f"{indent}{img}\n"
+    return (
+        f"{indent}<picture>\n"
+        f'{indent}  <source srcset="{prefix}{webp}" type="image/webp"{dims}>\n'
+        f"{indent}  {img}\n"
+        f"{indent}</picture>\n"
+    )
+
+def item_alt(title: str, key: str, image: str) -> str:
+    """'<title> <group> <number>', the number without the file's prefix (img-001 -> 001)."""
+    stem = os.path.splitext(image.rsplit("/", 1)[-1])[0]
+    number = re.search(r"\d+$", stem)
+    return f"{title} {key.rsplit('/', 1)[-1] if key else 'image'} {number.group(0) if number else stem}"
+
+def page_alt_title(text: str) -> str | None:
+    """The title a hand-written page's gallery alt texts start with (the most common one), if they follow item_alt."""
+    counts: dict[str, int] = {}
+    for image, alt in IMG_ALT_RE.findall(text):
+        tail = item_alt("", posixpath.dirname(image), image)
+        alt = html.unescape(alt)
+        if alt.endswith(tail) and len(alt) > len(tail):
+            title = alt[:-len(tail)].strip()
+            counts[title] = counts.get(title, 0) + 1
+    return max(counts, key=counts.get) if counts else None
+
+def group_label(key: str) -> str:
+    return key.rsplit("/", 1)[-1] if key else "gallery"
+
+def plan_gallery(slug: str, project: dict, alt_title: str, groups: list, sizes: dict, placeholders: dict,
+                 tpl: Templates) -> list[Output]:
+    """
+    JSON shards (SHARD_SIZE images each, never spanning two groups) + the manifest
+    listing them, and one plain page per group for visitors without JavaScript.
+    """
+    outputs = []
+    entries = []
+    title = html.escape(project["title"] or slug)
+    for key, items in groups:
+        shards = []
+        for n, i in enumerate(range(0, len(items), SHARD_SIZE)):
+            rows = []
+            for image, webp in items[i:i + SHARD_SIZE]:
+                rel = image_rel(slug, image)
+                row = {"src": f"img/{image}", "alt": item_alt(alt_title, key, image)}
+                if webp:
+                    row["webp"] = f"img/{webp}"
+                if rel in sizes:
+                    row["width"], row["height"] = sizes[rel]
+                if placeholders.get(rel):
+                    row["lqip"] = placeholders[rel]
+                rows.append(row)
+            name = shard_name(key, n)
+            shards.append(name)
+            text = json.dumps({"version": GALLERY_VERSION, "group": key, "items": rows}, ensure_ascii=False, separators=(",", ":"))
+            outputs.append(Output(f"works/projects/{slug}/{name}", signature(text), lambda text=text: text))
+        entries.append({"key": key, "title": key.rsplit("/", 1)[-1], "count": len(items), "shards": shards})
+        lines = [gallery_item(slug, image, webp, html.escape(item_alt(alt_title, key, image)), sizes, placeholders, "        ", "../img/")
+                 for image, webp in items]
+        text = tpl.render(
+            "gallery_group.html",
+            title=f"{title} · {html.escape(group_label(key))}",
+            midtitle=f"{title} · {html.escape(group_label(key))}",
+            project=title,
+            gallery="".join(lines),
+        )
+        outputs.append(Output(f"works/projects/{slug}/{group_page(key)}", signature(text), lambda text=text: text))
+    text = json.dumps({"version": GALLERY_VERSION, "shard_size": SHARD_SIZE, "groups": entries}, ensure_ascii=False, indent=1)
+    outputs.append(Output(f"works/projects/{slug}/{GALLERY_MANIFEST}", signature(text), lambda: text))
+    return outputs
+
+def previous_placeholders(slug: str) -> dict[str, str]:
+    """Placeholders the project's current page and gallery shards already carry (site-relative image path -> URI)."""
+    base = PROJECTS_DIR / slug
+    try:
+        found = page_placeholders((base / "index.html").read_text(encoding="utf-8"), f"works/projects/{slug}/index.html")
+    except FileNotFoundError:
+        found = {}
+    try:
+        manifest = json.loads((base / GALLERY_MANIFEST).read_text(encoding="utf-8"))
+        for group in manifest["groups"]:
+            for name in group["shards"]:
+                for row in json.loads((base / name).read_text(encoding="utf-8"))["items"]:
+                    if row.get("lqip"):
+                        found[f"works/projects/{slug}/{row['src']}"] = row["lqip"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # 没有分片，或者格式不对：只用页面里的
+    return found
+
+def plan_project(project: dict, tpl: Templates, cat: Catalogue) -> list[Output]:
+    """The project page plus, for a long gallery, its JSON shards."""
+    slug = project["slug"]
+    page = PROJECTS_DIR / slug / "index.html"
+    generated = is_generated_page(page)
+    hand_sharded = not generated and uses_shards(page)
+    # 手写页面的 alt 文字用它自己的标题写法，分片里的图片才和页面里的一致
+    alt_title = (hand_sharded and page_alt_title(page.read_text(encoding="utf-8"))) or project["title"] or slug
+    if not generated and not hand_sharded:
+        # 手写页面 build 不会碰，尺寸、占位图、旧分片都不用看
+        return [Output(f"works/projects/{slug}/index.html", None, None)]
+    groups = gallery_groups(slug)
+    has_hero = (PROJECTS_DIR / slug / "img" / "hero.jpg").exists()
+    images = [image for _key, items in groups for image, _webp in items]
+    sizes = sizes_for([image_rel(slug, name) for name in images + (["hero.jpg"] if has_hero else [])], catalogue=cat)
+    image_rels = [image_rel(slug, name) for name in images]
+    placeholders = placeholders_for(image_rels, cat)
+    # 这里算不出来的（没有 Pillow、缓存在 inbox/ 里没提交）沿用已提交的，构建结果不随机器而变
+    previous = previous_placeholders(slug)
+    for rel in image_rels:
+        if rel in previous:
+            placeholders.setdefault(rel, previous[rel])
+    raw_title = project["title"] or slug
+    title = html.escape(raw_title)
+    outputs = []
+    if len(images) > INLINE_LIMIT or hand_sharded:
+        outputs = plan_gallery(slug, project, alt_title, groups, sizes, placeholders, tpl)
+
+    def render() -> str:
+        year = html.escape(project["year"])
+        hero = ""
+        if has_hero:
+            hero = (
+                '    <figure class="project-hero">\n'
+                f'      <img src="img/hero.jpg" alt="{title} hero"{size_attrs(sizes.get(image_rel(slug, "hero.jpg")))} />\n'
+                "    </figure>\n"
+            )
+        gallery = []
+        more = []
+        budget = INLINE_LIMIT
+        open_grid = ""  # 只写了一部分的那一组：gallery.js 接着往这个网格里加
+        for key, items in groups:
+            if budget <= 0:
+                break
+            shown = items[:budget]
+            budget -= len(shown)
+            indent = "          " if key else "        "
+            lines = [gallery_item(slug, image, webp, html.escape(item_alt(raw_title, key, image)), sizes, placeholders, indent)
+                     for image, webp in shown]
+            partial = len(shown) < len(items)
+            if not key:
+                gallery += lines
+                open_grid = ".project-gallery > .project-grid" if partial else ""
+                continue
+            open_grid = "#gallery-open" if partial else ""
+            grid_id = ' id="gallery-open"' if partial else ""
+            more += [
+                '      <div class="gallery-group">\n',
+                f'        <h3 class="gallery-group-title">{html.escape(key.rsplit("/", 1)[-1])}</h3>\n',
+                f'        <div class="project-grid"{grid_id}>\n',
+                *lines,
+                "        </div>\n",
+                "      </div>\n",
+            ]
+        if len(images) > INLINE_LIMIT:
+            # 没有整组写进页面的那些组：不开 JavaScript 时点进各组自己的页面
+            hidden = []
+            left = INLINE_LIMIT
+            for key, items in groups:
+                if len(items) > left:
+                    hidden.append(key)
+                left = max(0, left - len(items))
+            links = " · ".join(f'<a href="{group_page(key)}">{html.escape(group_label(key))}</a>' for key in hidden)
+            more += [
+                f'      <div class="gallery-shards" data-manifest="{GALLERY_MANIFEST}" data-skip="{INLINE_LIMIT}"'
+                + (f' data-continue="{open_grid}"' if open_grid else "") + ">\n",
+                f"        <noscript><p>More images: {links}</p></noscript>\n",
+                '        <template><div class="gallery-group"><h3 class="gallery-group-title" data-title></h3>'
+                '<div class="project-grid" data-grid></div></div></template>\n',
+                "      </div>\n",
+                '      <script src="../../../gallery.js" defer></script>\n',
+            ]
+        return tpl.render(
+            "project.html",
+            title=title,
+            midtitle=f"{title} · {year}" if year else title,
+            hero=hero,
+            gallery="".join(gallery),
+            groups="".join(more),
+        )
+
+    deps = signature(tpl.digest("project.html"), project, has_hero, groups, sorted(sizes.items()), sorted(placeholders.items()),
+                     INLINE_LIMIT)
+    return [Output(f"works/projects/{slug}/index.html", deps, render)] + outputs
+
+def load_manifest() -> dict:
+    if not MANIFEST_PATH.exists():
+        return {}
+    try:
+        data = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("outputs", {})
+
+def save_manifest(outputs: dict) -> None:
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    data = {"version": MANIFEST_VERSION, "outputs": outputs}
+    atomic_write_bytes(MANIFEST_PATH, json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8"))
+
+def file_state(path: Path) -> list[int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+def is_generated_page(path: Path) -> bool:
+    if not path.exists():
+        return True
+    with path.open("r", encoding="utf-8", errors="replace") as f:
+        head = f.readline() + f.readline()
+    return GENERATED_MARKER in head
+
+def build(only: set[str] | None = None, force: bool = False, projects: list[dict] | None = None,
+          slugs: set[str] | None = None) -> dict:
+    """
+    Build what changed. only: limit to these outputs ("index.html", "work.html",
+    "projects" for generated project pages). projects: read_projects() rows the
+    caller already has (site_pipeline.py). slugs: only plan these projects' pages
+    (watch_site.py knows which ones changed). Returns counts.
+    """
+    if projects is None:
+        projects = read_projects(CSV_PATH)
+    tpl = Templates(TEMPLATES_DIR)
+    manifest = load_manifest()
+
+    outputs = []
+    with profiling.span("plan"), Catalogue() as cat:
+        if only is None or "index.html" in only:
+            outputs.append(plan_home(projects, tpl, cat))
+        if only is None or "work.html" in only:
+            outputs.append(plan_work(projects, tpl, cat))
+        if only is None or "projects" in only:
+            for p in projects:
+                if (slugs is None or p["slug"] in slugs) and (PROJECTS_DIR / p["slug"]).is_dir():
+                    outputs.extend(plan_project(p, tpl, cat))
+
+    stats = {"written": 0, "unchanged": 0, "hand_written": 0}
+    with Batch("build_site") as batch:
+        for out in outputs:
+            prev = manifest.get(out.rel)
+            state = file_state(out.path)
+            if prev and prev.get("hand_written"):
+                if prev.get("state") == state:
+                    stats["hand_written"] += 1
+                    continue
+            elif not force and prev and prev.get("deps") == out.deps and prev.get("state") == state and state:
+                stats["unchanged"] += 1
+                continue
+
+            if out.render is None or (out.rel.startswith("works/") and out.rel.endswith(".html") and not is_generated_page(out.path)):
+                manifest[out.rel] = {"hand_written": True, "state": state}
+                stats["hand_written"] += 1
+                continue
+
+            with profiling.span("render", output=out.rel):
+                text = out.render()
+            if state is None or out.path.read_text(encoding="utf-8") != text:
+                batch.write_text(out.path, text)
+                stats["written"] += 1
+                print(f"✅ Built {out.rel}")
+            else:
+                stats["unchanged"] += 1
+            manifest[out.rel] = {"deps": out.deps, "state": file_state(out.path)}
+
+    save_manifest(manifest)
+    print(f"Pages written: {stats['written']} | up to date: {stats['unchanged']} | hand-written (skipped): {stats['hand_written']}")
+    if batch.id:
+        print(f"Undo: python3 site_journal.py undo {batch.id}")
+    return stats
+
+def main():
+    ap = argparse.ArgumentParser(description="Build index.html, work.html and generated project pages from projects.csv + templates/.")
+    ap.add_argument("--only", nargs="+", choices=["index.html", "work.html", "projects"],
+                    help="Only build these outputs (default: everything)")
+    ap.add_argument("--force", action="store_true", help="Re-render even when no dependency changed")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "build_site")
+    build(set(args.only) if args.only else None, args.force)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Check every local reference on every page against the files that really exist.
+
+Pages: all *.html in the site (templates/ excluded). References: href, src,
+srcset, poster, data and <source> entries, plus url(...) inside style="".
+Each is resolved relative to its page (../../../style.css, /abs/path,
+folder/ -> folder/index.html) and looked up in one SiteIndex scan, with exact
+case. The site is served from a case-sensitive Linux host, so img/Hero.jpg
+next to img/hero.jpg is reported as broken, with the real name as a hint.
+
+Pages are parsed in parallel with html.parser (a streaming tokenizer); each
+worker gets the index once at start-up.
+
+Exit status 1 when anything is broken, so it can gate a deploy.
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import posixpath
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import unquote
+
+import profiling
+from site_index import SiteIndex
+
+ROOT = Path(".").resolve()
+PAGE_SKIP_PREFIXES = ("templates/",)
+
+URL_ATTRS = {"href", "src", "poster", "data"}
+SRCSET_ATTRS = {"srcset"}
+EXTERNAL_RE = re.compile(r"^(?:[a-z][a-z0-9+.-]*:|//)", re.I)  # http:, mailto:, data:, //cdn...
+CSS_URL_RE = re.compile(r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)", re.I)
+
+class RefCollector(HTMLParser):
+    """Streams a page and collects (line, tag, attr, url) for every local reference."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.refs: list[tuple[int, str, str, str]] = []
+
+    def _add(self, tag: str, attr: str, url: str) -> None:
+        url = url.strip()
+        if url and not url.startswith("#") and not EXTERNAL_RE.match(url):
+            self.refs.append((self.getpos()[0], tag, attr, url))
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if not value:
+                continue
+            if name in URL_ATTRS:
+                self._add(tag, name, value)
+            elif name in SRCSET_ATTRS:
+                # "a.jpg 480w, b.jpg 800w"：每一项取第一个空白前的 URL
+                for item in value.split(","):
+                    parts = item.split()
+                    if parts:
+                        self._add(tag, name, parts[0])
+            elif name == "style":
+                for m in CSS_URL_RE.finditer(value):
+                    self._add(tag, "style", m.group(1))
+
+    handle_startendtag = handle_starttag
+
+def resolve(page_rel: str, url: str) -> str | None:
+    """Site-relative posix path the URL points at, or None if it leaves the site root."""
+    path = unquote(url.split("#", 1)[0].split("?", 1)[0])
+    if not path:
+        return page_rel  # "?v=1" / "#top" 指向页面自己
+    if path.startswith("/"):
+        joined = path.lstrip("/")
+    else:
+        joined = posixpath.join(posixpath.dirname(page_rel), path)
+    trailing = path.endswith("/")
+    norm = posixpath.normpath(joined) if joined else "."
+    if norm == ".." or norm.startswith("../"):
+        return None
+    if norm == ".":
+        norm = ""
+    return norm + "/" if trailing and norm else norm
+
+# ---------- worker side ----------
+_FILES: set[str] = set()
+_DIRS: set[str] = set()
+_LOWER: dict[str, str] = {}
+
+def _init_worker(files: set[str], dirs: set[str]) -> None:
+    global _FILES, _DIRS, _LOWER
+    _FILES, _DIRS = files, dirs
+    _LOWER = {p.lower(): p for p in files | dirs}
+
+def check_target(target: str) -> tuple[bool, str | None]:
+    """(ok, hint). Folders need an index.html; a case-only mismatch gets the real name as hint."""
+    if target.endswith("/") or target == "" or target in _DIRS:
+        folder = target.rstrip("/")
+        index = f"{folder}/index.html" if folder else "index.html"
+        if index in _FILES:
+            return True, None
+        real = _LOWER.get(index.lower())
+        return False, (f"case differs: {real}" if real else "folder has no index.html")
+    if target in _FILES:
+        return True, None
+    real = _LOWER.get(target.lower())
+    return False, (f"case differs: {real}" if real else None)
+
+def check_page(page_rel: str) -> tuple[str, int, list[dict]]:
+    """Worker: parse one page and return (page, refs checked, problems)."""
+    parser = RefCollector()
+    with (ROOT / page_rel).open("r", encoding="utf-8", errors="replace") as f:
+        for chunk in iter(lambda: f.read(1 << 16), ""):
+            parser.feed(chunk)
+    parser.close()
+
+    problems = []
+    for line, tag, attr, url in parser.refs:
+        target = resolve(page_rel, url)
+        if target is None:
+            problems.append({"line": line, "tag": tag, "attr": attr, "url": url, "hint": "points outside the site root"})
+            continue
+        ok, hint = check_target(target)
+        if not ok:
+            problems.append({"line": line, "tag": tag, "attr": attr, "url": url, "target": target, "hint": hint})
+    return page_rel, len(parser.refs), problems
+
+# ---------- driver ----------
+
+def run_check(index: SiteIndex | None = None, jobs: int = 1) -> tuple[int, int, list[tuple[str, list[dict]]]]:
+    """Check all pages. Returns (pages, refs, [(page, problems)]) for pages with problems, in path order."""
+    if index is None:
+        index = SiteIndex(ROOT)
+        index.scan()
+    files = {k for k, e in index.entries.items() if not e.is_dir}
+    dirs = {k for k, e in index.entries.items() if e.is_dir}
+    pages = sorted(
+        k for k in files
+        if k.lower().endswith(".html") and not k.startswith(PAGE_SKIP_PREFIXES)
+    )
+
+    refs = 0
+    broken = []
+    if jobs <= 1:
+        _init_worker(files, dirs)
+        results = map(check_page, pages)
+        for page, n, problems in results:
+            refs += n
+            if problems:
+                broken.append((page, problems))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(files, dirs)) as ex:
+            for page, n, problems in ex.map(check_page, pages, chunksize=32):
+                refs += n
+                if problems:
+                    broken.append((page, problems))
+    return len(pages), refs, broken
+
+def main():
+    ap = argparse.ArgumentParser(description="Check href/src/srcset references on every page against the files on disk (exact case).")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (default: 0 = one per CPU)")
+    ap.add_argument("--json", action="store_true", help="One JSON object per broken reference instead of text")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "check_links")
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    pages, refs, broken = run_check(jobs=jobs)
+    count = sum(len(p) for _page, p in broken)
+
+    for page, problems in broken:
+        if args.json:
+            for p in problems:
+                print(json.dumps({"page": page, **p}, ensure_ascii=False))
+            continue
+        print(f"\n❌ {page}")
+        for p in problems:
+            hint = f"  ({p['hint']})" if p.get("hint") else ""
+            print(f"   line {p['line']:>4}  <{p['tag']} {p['attr']}> {p['url']}{hint}")
+
+    if not args.json:
+        print(f"\nPages: {pages} | references: {refs} | broken: {count}")
+        print("✅ All references resolve." if not count else f"⚠️ {count} broken reference(s) on {len(broken)} page(s)")
+    sys.exit(1 if count else 0)
+
+if __name__ == "__main__":
+    main()
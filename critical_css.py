@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Critical CSS + minification for pages that should paint fast on mobile.
+
+For a page:
+  - every class, id and tag it uses is collected (plus string literals in the
+    scripts it loads, since those add classes at runtime)
+  - the stylesheet is cut down to the rules whose selectors can match that page
+    (@media blocks are kept when something inside them survives; :hover and other
+    pseudo-classes don't count against a selector)
+  - that subset is inlined as <style> in <head>, and the full stylesheet is loaded
+    without blocking render (rel=preload + onload, <noscript> fallback)
+  - ?v= becomes a hash of the stylesheet, so "immutable" caching is always safe
+  - the HTML is minified: comments dropped, whitespace collapsed (never inside
+    <pre>/<textarea>/<script>), removed entirely only around block-level tags
+
+build_site.py runs this on index.html and work.html. The CLI reports what it
+would do for any page, or writes optimised copies with --out:
+
+  python3 critical_css.py [PAGE...] [--out DIR]
+"""
+
+from pathlib import Path
+import argparse
+import hashlib
+import posixpath
+import re
+from html.parser import HTMLParser
+
+import profiling
+
+ROOT = Path(".").resolve()
+# 这些文件变了，用到它们的生成页面就要重新生成
+INPUTS = ("style.css", "script.js")
+VERSION = 1  # 改了裁剪/压缩规则就加一，让 build_site 重新生成
+
+ALWAYS_USED_TAGS = {"html", "body", "*"}
+BLOCK_TAGS = (
+    "html|head|body|meta|link|title|base|style|script|noscript|header|footer|nav|main|section|"
+    "article|aside|div|h[1-6]|p|ul|ol|li|dl|dt|dd|figure|figcaption|table|thead|tbody|tr|td|th|"
+    "form|fieldset|hr|br|blockquote|video|audio|source|picture"
+)
+RAW_TAGS = ("pre", "textarea", "script", "style")
+JS_STRING_RE = re.compile(r"""(['"`])((?:(?!\1)[^\\\n])*)\1""")
+
+# ---------- what the page uses ----------
+
+class UsageCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tags: set[str] = set(ALWAYS_USED_TAGS)
+        self.classes: set[str] = set()
+        self.ids: set[str] = set()
+        self.scripts: list[str] = []
+        self.inline_js: list[str] = []
+        self._in_script = False
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.add(tag)
+        for name, value in attrs:
+            if name == "class" and value:
+                self.classes.update(value.split())
+            elif name == "id" and value:
+                self.ids.add(value)
+            elif name == "src" and tag == "script" and value:
+                self.scripts.append(value)
+        self._in_script = tag == "script"
+
+    def handle_endtag(self, tag):
+        if tag == "script":
+            self._in_script = False
+
+    def handle_data(self, data):
+        if self._in_script:
+            self.inline_js.append(data)
+
+def page_usage(html: str, page_rel: str) -> UsageCollector:
+    usage = UsageCollector()
+    usage.feed(html)
+    usage.close()
+    sources = list(usage.inline_js)
+    for src in usage.scripts:
+        path = local_asset(src, page_rel)
+        if path is not None:
+            sources.append(path.read_text(encoding="utf-8", errors="replace"))
+    # JS 里的字符串都当作可能用到的 class/id（classList.add('active') 之类）
+    for js in sources:
+        for m in JS_STRING_RE.finditer(js):
+            for word in m.group(2).replace(".", " ").replace("#", " ").split():
+                usage.classes.add(word)
+                usage.ids.add(word)
+    return usage
+
+def local_asset(url: str, page_rel: str) -> Path | None:
+    if re.match(r"^[a-z][a-z0-9+.-]*:|^//", url, re.I):
+        return None
+    path = url.split("#", 1)[0].split("?", 1)[0]
+    rel = posixpath.normpath(posixpath.join(posixpath.dirname(page_rel), path))
+    target = ROOT / rel
+    return target if not rel.startswith("..") and target.is_file() else None
+
+# ---------- CSS ----------
+
+def split_top(text: str, sep: str) -> list[str]:
+    """Split on sep outside quotes, parentheses and brackets."""
+    parts, depth, quote, start = [], 0, "", 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote and text[i - 1] != "\\":
+                quote = ""
+        elif ch in "\"'":
+            quote = ch
+        elif ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+def parse_css(css: str) -> list[tuple[str, str | list]]:
+    """[(prelude, declarations | nested rules)]; @-rules without a block keep their text as the prelude."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    rules, _ = _parse_block(css, 0)
+    return rules
+
+def _parse_block(css: str, pos: int) -> tuple[list, int]:
+    rules = []
+    start = pos
+    while pos < len(css):
+        ch = css[pos]
+        if ch in "\"'":
+            pos = css.index(ch, pos + 1) + 1
+            continue
+        if ch == ";" and css[start:pos].strip().startswith("@"):
+            rules.append((css[start:pos].strip() + ";", ""))  # @import / @charset
+            start = pos = pos + 1
+            continue
+        if ch == "{":
+            prelude = css[start:pos].strip()
+            if prelude.startswith("@") and prelude.split()[0] in ("@media", "@supports", "@layer", "@container"):
+                body, pos = _parse_block(css, pos + 1)
+            else:
+                end = pos + 1
+                depth = 1
+                while depth:
+                    c = css[end]
+                    depth += (c == "{") - (c == "}")
+                    end += 1
+                body = css[pos + 1:end - 1]
+                pos = end - 1
+            rules.append((prelude, body))
+            start = pos = pos + 1
+            continue
+        if ch == "}":
+            return rules, pos
+        pos += 1
+    return rules, pos
+
+PSEUDO_RE = re.compile(r"::?[\w-]+(?:\((?:[^()]|\([^()]*\))*\))?")
+ATTR_RE = re.compile(r"\[[^\]]*\]")
+CLASS_RE = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+ID_RE = re.compile(r"#(-?[_a-zA-Z][\w-]*)")
+TYPE_RE = re.compile(r"(?:^|[\s>+~])([a-zA-Z][\w-]*)")
+
+def selector_matches(selector: str, usage: UsageCollector) -> bool:
+    """Could this selector match something on the page? (pseudo-classes and attributes are ignored)"""
+    core = ATTR_RE.sub("", PSEUDO_RE.sub("", selector))
+    return (
+        all(c in usage.classes for c in CLASS_RE.findall(core))
+        and all(i in usage.ids for i in ID_RE.findall(core))
+        and all(t.lower() in usage.tags for t in TYPE_RE.findall(core))
+    )
+
+def prune(rules: list, usage: UsageCollector) -> list:
+    kept = []
+    for prelude, body in rules:
+        if prelude.startswith("@"):
+            if isinstance(body, list):
+                inner = prune(body, usage)
+                if inner:
+                    kept.append((prelude, inner))
+            else:
+                kept.append((prelude, body))  # @font-face / @keyframes / @import：原样保留
+            continue
+        selectors = [s.strip() for s in split_top(prelude, ",") if s.strip()]
+        matching = [s for s in selectors if selector_matches(s, usage)]
+        if matching:
+            kept.append((", ".join(matching), body))
+    return kept
+
+def minify_selector(selector: str) -> str:
+    selector = re.sub(r"\s+", " ", selector.strip())
+    return re.sub(r"\s*([>+~,])\s*", r"\1", selector)
+
+def minify_declarations(body: str) -> str:
+    out = []
+    for decl in split_top(body, ";"):
+        decl = re.sub(r"\s+", " ", decl.strip())
+        if not decl:
+            continue
+        name, colon, value = decl.partition(":")
+        if not colon:
+            out.append(decl)
+            continue
+        value = re.sub(r"\s*,\s*", ",", value.strip())
+        value = re.sub(r"\s*!\s*important$", "!important", value)
+        out.append(f"{name.strip()}:{value}")
+    return ";".join(out)
+
+def serialise(rules: list) -> str:
+    out = []
+    for prelude, body in rules:
+        head = re.sub(r"\s+", " ", prelude)
+        if isinstance(body, list):
+            out.append(head + "{" + serialise(body) + "}")
+        elif prelude.startswith("@") and prelude.endswith(";"):
+            out.append(head)
+        elif prelude.startswith("@"):
+            # @keyframes / @font-face：里面的段落只压空白
+            out.append(head + "{" + re.sub(r"\s*([{};:,])\s*", r"\1", body.strip()) + "}")
+        else:
+            out.append(minify_selector(prelude) + "{" + minify_declarations(body) + "}")
+    return "".join(out)
+
+def minify_css(css: str) -> str:
+    return serialise(parse_css(css))
+
+def count_rules(rules: list) -> int:
+    return sum(count_rules(b) if isinstance(b, list) else 1 for _p, b in rules)
+
+# ---------- HTML ----------
+
+LINK_RE = re.compile(r"<link\b[^>]*\brel=[\"']?stylesheet[\"']?[^>]*>", re.I)
+HREF_RE = re.compile(r"\bhref=([\"'])(.*?)\1", re.I)
+COMMENT_RE = re.compile(r"<!--(?!\[if|\s*generated by).*?-->", re.S)
+RAW_RE = re.compile(rf"(<({'|'.join(RAW_TAGS)})\b[^>]*>)(.*?)(</\2\s*>)", re.S | re.I)
+BLOCK_SPACE_RE = re.compile(rf"\s*(</?(?:{BLOCK_TAGS})\b[^>]*>)\s*", re.I)
+
+def minify_html(html: str) -> str:
+    html = COMMENT_RE.sub("", html)
+    raw: list[str] = []
+
+    def stash(m: re.Match) -> str:
+        body = m.group(3)
+        if m.group(2).lower() == "style":
+            body = minify_css(body)
+        raw.append(m.group(1) + body + m.group(4))
+        return f"\0{len(raw) - 1}\0"
+
+    html = RAW_RE.sub(stash, html)
+    html = re.sub(r"\s+", " ", html)
+    html = BLOCK_SPACE_RE.sub(r"\1", html)
+    # doctype 和生成标记各占一行（build_site 按第二行认生成页面）
+    html = re.sub(r"^\s*(<!DOCTYPE[^>]*>)\s*(<!--\s*generated by.*?-->)?\s*",
+                  lambda m: m.group(1) + "\n" + (m.group(2) + "\n" if m.group(2) else ""), html, flags=re.I)
+    html = re.sub(r"\0(\d+)\0", lambda m: raw[int(m.group(1))], html)
+    return html.strip() + "\n"
+
+def versioned(url: str, digest: str) -> str:
+    base, _, _query = url.partition("?")
+    return f"{base}?v={digest}"
+
+def optimise(html: str, page_rel: str, minify: bool = True) -> tuple[str, dict]:
+    """(new html, report). Only local stylesheets are inlined; anything else is left as it is."""
+    usage = page_usage(html, page_rel)
+    report = {"page": page_rel, "stylesheets": []}
+
+    def replace(m: re.Match) -> str:
+        tag = m.group(0)
+        href = HREF_RE.search(tag)
+        path = local_asset(href.group(2), page_rel) if href else None
+        if path is None or "media=" in tag.lower():
+            return tag
+        css = path.read_text(encoding="utf-8")
+        rules = parse_css(css)
+        kept = prune(rules, usage)
+        critical = serialise(kept)
+        digest = hashlib.sha256(css.encode("utf-8")).hexdigest()[:10]
+        url = versioned(href.group(2), digest)
+        report["stylesheets"].append({
+            "href": href.group(2), "bytes": len(css.encode("utf-8")), "critical_bytes": len(critical.encode("utf-8")),
+            "rules": count_rules(rules), "critical_rules": count_rules(kept),
+        })
+        return (
+            f"<style>{critical}</style>\n"
+            f'<link rel="preload" href="{url}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+            f'<noscript><link rel="stylesheet" href="{url}"></noscript>'
+        )
+
+    out = LINK_RE.sub(replace, html)
+    if minify:
+        out = minify_html(out)
+    report["html_bytes"] = len(html.encode("utf-8"))
+    report["out_bytes"] = len(out.encode("utf-8"))
+    return out, report
+
+def inputs_digest() -> str:
+    """Signature of the stylesheet/scripts the optimised pages depend on (for build_site's manifest)."""
+    h = hashlib.sha256(f"critical-v{VERSION}".encode())
+    for name in INPUTS:
+        path = ROOT / name
+        h.update(name.encode() + b"\0" + (path.read_bytes() if path.exists() else b"") + b"\0")
+    return h.hexdigest()
+
+def main():
+    ap = argparse.ArgumentParser(description="Inline critical CSS and minify pages (report only unless --out is given).")
+    ap.add_argument("pages", nargs="*", default=["index.html", "work.html"], help="Pages relative to the site root (default: index.html work.html)")
+    ap.add_argument("--out", help="Write optimised copies under this folder (same relative paths)")
+    ap.add_argument("--no-minify", action="store_true", help="Inline critical CSS but keep the HTML as it is")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "critical_css")
+
+    for rel in args.pages:
+        path = ROOT / rel
+        if not path.is_file():
+            print(f"❌ Not found: {rel}")
+            continue
+        out, report = optimise(path.read_text(encoding="utf-8"), rel, minify=not args.no_minify)
+        print(f"\n{rel}: {report['html_bytes'] / 1024:.1f} KB -> {report['out_bytes'] / 1024:.1f} KB")
+        for s in report["stylesheets"]:
+            print(f"  {s['href']}: {s['critical_rules']}/{s['rules']} rule(s) inlined, "
+                  f"{s['critical_bytes'] / 1024:.1f} KB of {s['bytes'] / 1024:.1f} KB")
+        if not report["stylesheets"]:
+            print("  ℹ️  no local render-blocking stylesheet (already optimised?)")
+        if args.out:
+            dst = Path(args.out) / rel
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_text(out, encoding="utf-8")
+            print(f"  ✅ Wrote {dst}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Find the same photo saved under different names / sizes / formats.
+
+Every image in the media catalogue (images/, inbox/, works/projects) gets three
+64-bit perceptual hashes: aHash (mean), dHash (gradient), pHash (DCT). Hashes
+are computed on a process pool and stored per content sha256 in the catalogue
+database, so a file is only decoded once. JPEGs are decoded at 1/8 scale
+(draft mode), which is all a 32x32 hash needs.
+
+Matching never compares all pairs: distinct hash values go into a BK-tree
+(a metric tree over Hamming distance). Clusters are grown around a leader,
+largest image first: a leader takes every not-yet-clustered image within the
+threshold of itself, so a chain of small differences can't pull unrelated
+photos into one cluster. "keep" (the leader) is only suggested when every
+pair in the cluster is within the threshold.
+
+Generated renditions (name-480w.webp etc. from build_derivatives.py) are
+left out; they are near-duplicates of their source by design.
+
+Requires Pillow (pip install Pillow).
+"""
+
+from pathlib import Path
+import argparse
+import json
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from image_headers import display_size
+from media_catalogue import Catalogue
+import profiling
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 是可选依赖
+    Image = None
+
+ROOT = Path(".").resolve()
+REPORT_PATH = ROOT / "inbox" / "near_duplicates.json"
+HASH_KINDS = ("ahash", "dhash", "phash")
+DEFAULT_THRESHOLD = 10  # 64 位里最多差几位算“同一张”
+RENDITION_RE = re.compile(r"-\d+w\.(webp|avif)$", re.I)
+
+HASH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS perceptual (
+    sha256 TEXT PRIMARY KEY,
+    ahash  TEXT NOT NULL,   -- 16 位十六进制
+    dhash  TEXT NOT NULL,
+    phash  TEXT NOT NULL
+);
+"""
+
+# pHash：32x32 灰度图做 DCT，只要左上角 8x8 低频系数
+DCT_N = 32
+DCT_K = 8
+COS = [[math.cos((2 * x + 1) * u * math.pi / (2 * DCT_N)) for x in range(DCT_N)] for u in range(DCT_K)]
+
+def bits_to_int(bits) -> int:
+    v = 0
+    for b in bits:
+        v = (v << 1) | (1 if b else 0)
+    return v
+
+def load_gray(path: str, size: int):
+    with Image.open(path) as im:
+        im.draft("L", (size * 4, size * 4))  # JPEG：直接按 1/2、1/4、1/8 解码
+        im = ImageOps.exif_transpose(im)
+        return im.convert("L")
+
+def compute_hashes(path: str) -> tuple[str, str, str]:
+    """Worker: (ahash, dhash, phash) as 16-char hex. Runs in a child process."""
+    gray = load_gray(path, DCT_N)
+
+    small = gray.resize((8, 8), Image.BILINEAR).tobytes()
+    mean = sum(small) / 64
+    ahash = bits_to_int(p > mean for p in small)
+
+    wide = gray.resize((9, 8), Image.BILINEAR).tobytes()
+    dhash = bits_to_int(wide[r * 9 + c] < wide[r * 9 + c + 1] for r in range(8) for c in range(8))
+
+    px = gray.resize((DCT_N, DCT_N), Image.BILINEAR).tobytes()
+    # 可分离的 2D DCT：先沿 x，再沿 y，都只算前 8 个频率
+    rows = [[sum(COS[u][x] * px[y * DCT_N + x] for x in range(DCT_N)) for u in range(DCT_K)] for y in range(DCT_N)]
+    coeffs = [sum(COS[v][y] * rows[y][u] for y in range(DCT_N)) for v in range(DCT_K) for u in range(DCT_K)]
+    ac = coeffs[1:]  # 去掉直流分量再取中位数
+    median = sorted(ac)[len(ac) // 2]
+    phash = bits_to_int(c > median for c in coeffs)
+
+    return f"{ahash:016x}", f"{dhash:016x}", f"{phash:016x}"
+
+def _safe_compute(path: str):
+    try:
+        return compute_hashes(path)
+    except Exception as e:  # 损坏/不支持的文件：报告后跳过
+        return e
+
+class BKTree:
+    """Metric tree over Hamming distance. Nodes: [value, {distance: child}]."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [value, {}]
+            return
+        node = self.root
+        while True:
+            d = (value ^ node[0]).bit_count()
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [value, {}]
+                return
+            node = child
+
+    def query(self, value: int, radius: int) -> list[tuple[int, int]]:
+        """[(distance, value)] within radius. Triangle inequality prunes subtrees outside [d-r, d+r]."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = (value ^ node[0]).bit_count()
+            if d <= radius:
+                found.append((d, node[0]))
+            lo, hi = d - radius, d + radius
+            for dist, child in node[1].items():
+                if lo <= dist <= hi:
+                    stack.append(child)
+        return found
+
+def ensure_hashes(cat: Catalogue, rows: list[dict], jobs: int) -> dict[str, dict]:
+    """sha256 -> {'ahash','dhash','phash'} for every row, computing the missing ones."""
+    cat.db.executescript(HASH_SCHEMA)
+    wanted = {r["sha256"]: r["path"] for r in rows}
+    known = {}
+    for r in cat.db.execute("SELECT * FROM perceptual"):
+        if r["sha256"] in wanted:
+            known[r["sha256"]] = {k: r[k] for k in HASH_KINDS}
+    todo = [(sha, path) for sha, path in wanted.items() if sha not in known]
+    print(f"Images: {len(rows)} | distinct contents: {len(wanted)} | cached hashes: {len(known)} | to hash: {len(todo)}")
+    if not todo:
+        return known
+
+    new_rows = []
+    with ProcessPoolExecutor(max_workers=jobs) as ex:
+        paths = [str(ROOT / path) for _sha, path in todo]
+        for (sha, path), result in zip(todo, ex.map(_safe_compute, paths, chunksize=8)):
+            if isinstance(result, Exception):
+                print(f"⚠️ Skip (cannot decode): {path}: {result}")
+                continue
+            known[sha] = dict(zip(HASH_KINDS, result))
+            new_rows.append((sha, *result))
+    with cat.db:
+        cat.db.executemany("INSERT OR REPLACE INTO perceptual (sha256, ahash, dhash, phash) VALUES (?, ?, ?, ?)", new_rows)
+    return known
+
+def find_clusters(rows: list[dict], hashes: dict[str, dict], kind: str, threshold: int,
+                  confirm: str | None, confirm_threshold: int) -> list[list[dict]]:
+    # 同一个哈希值的图片先归到一起，树里只放不重复的值
+    by_value: dict[int, list[dict]] = {}
+    for r in rows:
+        h = hashes.get(r["sha256"])
+        if h:
+            by_value.setdefault(int(h[kind], 16), []).append(r)
+
+    tree = BKTree()
+    for value in by_value:
+        tree.add(value)
+
+    def rank(r: dict):
+        # 像素最多的排第一：建议保留它
+        return -(r["width"] or 0) * (r["height"] or 0), r["path"]
+
+    # 以图找簇：按最大的那张排序，每个领头只收离它自己够近、还没归簇的值（不会一路串下去）
+    assigned = set()
+    result = []
+    for value in sorted(by_value, key=lambda v: min(rank(r) for r in by_value[v])):
+        if value in assigned:
+            continue
+        assigned.add(value)
+        leader = by_value[value][0]
+        members = [value]
+        for _d, hit in sorted(tree.query(value, threshold)):
+            if hit in assigned:
+                continue
+            if confirm and hash_distance(hashes, leader, by_value[hit][0], confirm) > confirm_threshold:
+                continue
+            assigned.add(hit)
+            members.append(hit)
+        cluster = sorted((r for v in members for r in by_value[v]), key=rank)
+        if len(cluster) > 1:
+            result.append(cluster)
+    result.sort(key=lambda c: c[0]["path"])
+    return result
+
+def hash_distance(hashes: dict[str, dict], a: dict, b: dict, kind: str) -> int:
+    return (int(hashes[a["sha256"]][kind], 16) ^ int(hashes[b["sha256"]][kind], 16)).bit_count()
+
+def spread(cluster: list[dict], hashes: dict[str, dict], kind: str) -> int:
+    """Largest distance between two images of the cluster (at most twice the threshold)."""
+    return max((hash_distance(hashes, a, b, kind) for i, a in enumerate(cluster) for b in cluster[i + 1:]), default=0)
+
+def main():
+    ap = argparse.ArgumentParser(description="Find near-duplicate images with perceptual hashes.")
+    ap.add_argument("--hash", choices=HASH_KINDS, default="phash", help="Hash used for matching (default: phash)")
+    ap.add_argument("--threshold", "-t", type=int, default=DEFAULT_THRESHOLD,
+                    help=f"Max Hamming distance out of 64 bits (default: {DEFAULT_THRESHOLD})")
+    ap.add_argument("--confirm", choices=HASH_KINDS, help="Also require this second hash to be within --confirm-threshold")
+    ap.add_argument("--confirm-threshold", type=int, default=DEFAULT_THRESHOLD)
+    ap.add_argument("--under", help="Only images under this path prefix")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (default: 0 = one per CPU)")
+    ap.add_argument("--json", action="store_true", help=f"Also write clusters to {REPORT_PATH.relative_to(ROOT)}")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "find_near_duplicates")
+
+    if Image is None:
+        print("❌ Pillow is required: pip install Pillow")
+        return
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    with Catalogue() as cat:
+        cat.update(jobs=jobs)
+        rows = [r for r in cat.query(under=args.under) if r["format"] and not RENDITION_RE.search(r["path"])]
+        hashes = ensure_hashes(cat, rows, jobs)
+
+    clusters = find_clusters(rows, hashes, args.hash, args.threshold, args.confirm, args.confirm_threshold)
+    for i, c in enumerate(clusters, 1):
+        widest = spread(c, hashes, args.hash)
+        tight = widest <= args.threshold and (not args.confirm or spread(c, hashes, args.confirm) <= args.confirm_threshold)
+        note = "" if tight else f"  (some pairs {widest} apart: check by hand, no keep suggested)"
+        print(f"\n[{i}] {len(c)} image(s){note}")
+        for n, r in enumerate(c):
+            w, h = display_size(r) if r["width"] else (0, 0)
+            mark = "keep" if n == 0 and tight else "    "
+            print(f"  {mark} {r['path']}  ({w}x{h}, {r['size'] / 1e3:.0f} KB)")
+    print(f"\n✅ {len(clusters)} cluster(s), {sum(len(c) for c in clusters)} image(s) ({args.hash} ≤ {args.threshold})")
+
+    if args.json:
+        REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+        data = [[{"path": r["path"], "sha256": r["sha256"], "width": r["width"], "height": r["height"]} for r in c] for c in clusters]
+        REPORT_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        print(f"✅ Report: {REPORT_PATH}")
+
+if __name__ == "__main__":
+    main()
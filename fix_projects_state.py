@@ -2,10 +2,16 @@
 # -*- coding: utf-8 -*-
 
 from pathlib import Path
+import argparse
 import re
 import csv
+import io
 from datetime import datetime
 
+import profiling
+from site_index import SiteIndex
+from site_journal import Batch
+
 ROOT = Path(".").resolve()
 PROJECTS_DIR = ROOT / "works" / "projects"
 CSV_PATH = ROOT / "projects.csv"
@@ -87,7 +93,11 @@ def read_existing_csv(csv_path: Path) -> dict:
             )
     return data
 
-def main():
+def fix_projects(index: SiteIndex | None = None, projects: list[dict] | None = None) -> None:
+    """
+    main() without the CLI. site_pipeline.py passes its SiteIndex (folders and
+    existing pages are looked up there) and the parsed projects.csv rows.
+    """
     if not PROJECTS_DIR.exists():
         print("❌ works/projects not found.")
         return
@@ -95,7 +105,6 @@ def main():
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
     trash_dir_name = f"_trash_invalid_{ts}"
     trash_dir = PROJECTS_DIR / trash_dir_name
-    trash_dir.mkdir(parents=True, exist_ok=True)
 
     template_index = PROJECTS_DIR / "_template-project" / "index.html"
     template_html = template_index.read_text(encoding="utf-8") if template_index.exists() else None
@@ -103,9 +112,12 @@ def main():
     # 1) classify folders
     invalid = []
     valid = []
-    for p in sorted(PROJECTS_DIR.iterdir()):
-        if not p.is_dir():
-            continue
+    if index is not None:
+        listing = index.listdir(PROJECTS_DIR.relative_to(ROOT).as_posix())
+        folders = [PROJECTS_DIR / name for name, e in sorted(listing.items()) if e.is_dir]
+    else:
+        folders = [p for p in sorted(PROJECTS_DIR.iterdir()) if p.is_dir()]
+    for p in folders:
         name = p.name
         if name in IGNORE:
             continue
@@ -120,75 +132,88 @@ def main():
         else:
             invalid.append(p)
 
-    # 2) move invalid to trash
-    moved = 0
-    for p in invalid:
-        target = trash_dir / p.name
-        p.rename(target)
-        moved += 1
-
-    # 3) ensure index.html
-    created = 0
-    skipped = 0
-    for p in valid:
-        out = p / "index.html"
-        if out.exists():
-            skipped += 1
-            continue
-        title = slug_to_title(p.name)
-        if template_html is not None:
-            out.write_text(template_html, encoding="utf-8")
+    # 移动、建页、改 CSV 都记在同一个 batch 里：中途出错整体回滚，事后可 undo
+    with Batch("fix_projects_state") as batch:
+        # 2) move invalid to trash
+        moved = 0
+        for p in invalid:
+            batch.move(p, trash_dir / p.name)
+            moved += 1
+
+        # 3) ensure index.html
+        created = 0
+        skipped = 0
+        for p in valid:
+            out = p / "index.html"
+            out_rel = out.relative_to(ROOT).as_posix()
+            exists = out_rel in index.entries if index is not None else out.exists()
+            if exists:
+                skipped += 1
+                continue
+            title = slug_to_title(p.name)
+            page = template_html if template_html is not None else MINIMAL_TEMPLATE.format(title=title)
+            # 已经有的图片带上宽高，避免加载时跳动；只有真要建页面时才加载（它会带进 media_catalogue 等）
+            from inject_dimensions import inject_page
+            page, _n = inject_page(page, out_rel)
+            batch.write_text(out, page)
+            created += 1
+
+        # 4) rewrite projects.csv
+        if projects is not None:
+            existing = {r["slug"]: (r["title"], r["year"]) for r in projects}
         else:
-            out.write_text(MINIMAL_TEMPLATE.format(title=title), encoding="utf-8")
-        created += 1
-
-    # 4) rewrite projects.csv (backup first)
-    existing = read_existing_csv(CSV_PATH)
-    csv_backup = None
-    if CSV_PATH.exists():
-        csv_backup = CSV_PATH.with_suffix(CSV_PATH.suffix + f".bak.{ts}")
-        csv_backup.write_text(CSV_PATH.read_text(encoding="utf-8"), encoding="utf-8")
-
-    rows = []
-    for p in valid:
-        slug = p.name
-        m = PATTERN.match(slug)
-        year = m.group(1) if m else ""
-        title = slug_to_title(slug)
-
-        if slug in existing:
-            old_title, old_year = existing[slug]
-            if old_title:
-                title = old_title
-            if old_year:
-                year = old_year
-
-        rows.append((slug, title, year))
-
-    def sort_key(row):
-        slug = row[0]
-        m = PATTERN.match(slug)
-        if not m:
-            return ("0000", "000")
-        return (m.group(1), m.group(2))
-
-    rows.sort(key=sort_key, reverse=True)
-
-    with CSV_PATH.open("w", encoding="utf-8", newline="") as f:
-        w = csv.writer(f)
+            existing = read_existing_csv(CSV_PATH)
+
+        rows = []
+        for p in valid:
+            slug = p.name
+            m = PATTERN.match(slug)
+            year = m.group(1) if m else ""
+            title = slug_to_title(slug)
+
+            if slug in existing:
+                old_title, old_year = existing[slug]
+                if old_title:
+                    title = old_title
+                if old_year:
+                    year = old_year
+
+            rows.append((slug, title, year))
+
+        def sort_key(row):
+            slug = row[0]
+            m = PATTERN.match(slug)
+            if not m:
+                return ("0000", "000")
+            return (m.group(1), m.group(2))
+
+        rows.sort(key=sort_key, reverse=True)
+
+        buf = io.StringIO()
+        w = csv.writer(buf)
         w.writerow(["project_slug", "title", "year"])
         for r in rows:
             w.writerow(r)
+        if not CSV_PATH.exists() or CSV_PATH.read_bytes() != buf.getvalue().encode("utf-8"):
+            batch.write_text(CSV_PATH, buf.getvalue())
 
     print("✅ Fix complete.")
-    print(f"- Trash folder: {trash_dir_name}")
+    if moved:
+        print(f"- Trash folder: {trash_dir_name}")
     print(f"- Moved invalid folders to trash: {moved}")
     print(f"- Created index.html for valid projects: {created} (skipped existing: {skipped})")
-    if csv_backup:
-        print(f"- Backed up projects.csv to: {csv_backup.name}")
     print(f"- Rewrote projects.csv with {len(rows)} valid projects.")
+    if batch.id:
+        print(f"- Undo everything above: python3 site_journal.py undo {batch.id}")
     if template_html is None:
         print("⚠️ _template-project/index.html not found. Used minimal placeholder pages.")
 
+def main():
+    ap = argparse.ArgumentParser(description="Move invalid project folders to a trash folder, add missing index.html pages, sync projects.csv.")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "fix_projects_state")
+    fix_projects()
+
 if __name__ == "__main__":
     main()
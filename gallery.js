@@ -0,0 +1,120 @@
+// Long galleries: load the images that aren't in the page from the JSON shards
+// build_site.py writes (gallery/manifest.json + gallery/<group>.json), one shard
+// at a time, as the visitor scrolls towards the end of what is already there.
+//
+//   <div class="gallery-shards" data-manifest="gallery/manifest.json"
+//        data-groups="dates/"          only groups whose folder starts with this (optional)
+//        data-skip="29"                images of those groups already in the page
+//        data-continue="#gallery-open" grid to finish if the last one shown is incomplete (optional)>
+//     <noscript>links to gallery/<group>.html, the same images without JavaScript</noscript>
+//     <template><div class="gallery-group"><h3 data-title></h3><div data-grid></div></div></template>
+//   </div>
+//   <script src="../../../gallery.js" defer></script>
+//
+// Each new group is a copy of the <template>; [data-title] gets the folder name,
+// images go into [data-grid].
+document.addEventListener('DOMContentLoaded', () => {
+    const MARGIN = 1200; // 离底部还有这么多像素就开始加载下一片
+
+    document.querySelectorAll('.gallery-shards').forEach((box) => {
+        const prefix = box.dataset.groups || '';
+        const template = box.querySelector('template');
+        let skip = parseInt(box.dataset.skip || '0', 10);
+        let grid = box.dataset.continue ? document.querySelector(box.dataset.continue) : null;
+        let queue = null;
+        let busy = false;
+
+        const sentinel = document.createElement('div');
+        box.appendChild(sentinel);
+
+        function plan(manifest) {
+            // 每一片是 {group, url, from}；from 是这一片里已经在页面上的张数
+            queue = [];
+            manifest.groups.filter((g) => g.key.startsWith(prefix)).forEach((g) => {
+                if (skip >= g.count) {
+                    skip -= g.count;
+                    return;
+                }
+                const first = Math.floor(skip / manifest.shard_size);
+                g.shards.slice(first).forEach((url, i) => {
+                    queue.push({ group: g, url, from: i === 0 ? skip % manifest.shard_size : 0, fresh: i === 0 && skip === 0 });
+                });
+                skip = 0;
+            });
+        }
+
+        function addGroup(group) {
+            const node = template.content.firstElementChild.cloneNode(true);
+            const title = node.querySelector('[data-title]');
+            if (title && group.title) {
+                title.textContent = group.title;
+            } else if (title) {
+                title.remove();
+            }
+            grid = node.querySelector('[data-grid]') || node;
+            box.insertBefore(node, sentinel);
+        }
+
+        function addItem(item) {
+            const img = document.createElement('img');
+            // 先设 loading 再设 src，否则图片会立刻开始下载
+            img.loading = 'lazy';
+            img.decoding = 'async';
+            if (item.width) {
+                img.width = item.width;
+                img.height = item.height;
+            }
+            if (item.lqip) {
+                img.style.background = `url(${item.lqip}) center/cover no-repeat`;
+            }
+            img.alt = item.alt;
+            img.src = item.src;
+            if (!item.webp) {
+                grid.appendChild(img);
+                return;
+            }
+            const picture = document.createElement('picture');
+            const source = document.createElement('source');
+            source.type = 'image/webp';
+            source.srcset = item.webp;
+            picture.append(source, img);
+            grid.appendChild(picture);
+        }
+
+        async function next() {
+            if (busy) return;
+            busy = true;
+            try {
+                if (!queue) {
+                    plan(await (await fetch(box.dataset.manifest)).json());
+                }
+                const job = queue.shift();
+                if (!job) {
+                    observer.disconnect();
+                    sentinel.remove();
+                    return;
+                }
+                const shard = await (await fetch(job.url)).json();
+                if (job.fresh || !grid) {
+                    addGroup(job.group);
+                }
+                shard.items.slice(job.from).forEach(addItem);
+            } catch (e) {
+                console.error('gallery.js:', e);
+                observer.disconnect();
+                return;
+            } finally {
+                busy = false;
+            }
+            // 这一片太短，哨兵还在加载范围内：接着加载
+            if (sentinel.getBoundingClientRect().top < window.innerHeight + MARGIN) {
+                next();
+            }
+        }
+
+        const observer = new IntersectionObserver((entries) => {
+            if (entries.some((e) => e.isIntersecting)) next();
+        }, { rootMargin: `0px 0px ${MARGIN}px 0px` });
+        observer.observe(sentinel);
+    });
+});
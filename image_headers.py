@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Header-only image facts (no pixel decoding): JPEG SOF, PNG IHDR, WebP VP8/VP8L/VP8X,
+plus EXIF orientation and capture date (JPEG APP1, WebP EXIF chunk, PNG eXIf).
+"""
+
+from pathlib import Path
+import struct
+
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG), CC (DAC) share the range but don't
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+EXIF_HEADER = b"Exif\x00\x00"
+
+TAG_ORIENTATION = 0x0112
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+# 只读 EXIF 前 64 KB：IFD0 和 Exif IFD 都在这里面
+EXIF_READ_LIMIT = 1 << 16
+
+def _ifd_entries(tiff: bytes, offset: int, endian: str):
+    count = struct.unpack_from(endian + "H", tiff, offset)[0]
+    for i in range(count):
+        pos = offset + 2 + 12 * i
+        if pos + 12 > len(tiff):
+            return
+        tag, typ, n = struct.unpack_from(endian + "HHI", tiff, pos)
+        yield tag, typ, n, pos + 8
+
+def _ascii_value(tiff: bytes, endian: str, n: int, value_pos: int) -> str | None:
+    if n <= 4:
+        raw = tiff[value_pos:value_pos + n]
+    else:
+        (off,) = struct.unpack_from(endian + "I", tiff, value_pos)
+        raw = tiff[off:off + n]
+    text = raw.split(b"\x00", 1)[0].decode("ascii", "replace").strip()
+    return text or None
+
+def _exif_date(text: str | None) -> str | None:
+    """'2023:05:01 14:03:22' -> '2023-05-01T14:03:22' (None for blank / zeroed dates)."""
+    if not text or len(text) < 19 or text.startswith("0000"):
+        return None
+    return f"{text[0:4]}-{text[5:7]}-{text[8:10]}T{text[11:19]}"
+
+def parse_exif(tiff: bytes) -> dict:
+    """TIFF-structured EXIF block -> {'orientation': int|None, 'taken': 'YYYY-MM-DDTHH:MM:SS'|None}."""
+    info = {"orientation": None, "taken": None}
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        return info
+    try:
+        (ifd0,) = struct.unpack_from(endian + "I", tiff, 4)
+        exif_ifd = None
+        fallback_date = None
+        for tag, typ, n, value_pos in _ifd_entries(tiff, ifd0, endian):
+            if tag == TAG_ORIENTATION and typ == 3:
+                info["orientation"] = struct.unpack_from(endian + "H", tiff, value_pos)[0]
+            elif tag == TAG_EXIF_IFD:
+                exif_ifd = struct.unpack_from(endian + "I", tiff, value_pos)[0]
+            elif tag == TAG_DATETIME and typ == 2:
+                fallback_date = _ascii_value(tiff, endian, n, value_pos)
+        if exif_ifd:
+            for tag, typ, n, value_pos in _ifd_entries(tiff, exif_ifd, endian):
+                if tag == TAG_DATETIME_ORIGINAL and typ == 2:
+                    info["taken"] = _exif_date(_ascii_value(tiff, endian, n, value_pos))
+                    break
+        if info["taken"] is None:
+            info["taken"] = _exif_date(fallback_date)
+    except struct.error:
+        pass
+    return info
+
+def _jpeg_size(f, exif: list | None = None) -> tuple[int, int] | None:
+    """Walk the markers up to SOF. APP1 Exif payloads met on the way are appended to exif."""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue  # standalone markers, no length
+        if marker == 0xD9 or marker == 0xDA:
+            return None  # EOI / SOS before any SOF
+        raw = f.read(2)
+        if len(raw) < 2:
+            return None
+        (length,) = struct.unpack(">H", raw)
+        if marker in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        if marker == 0xE1 and exif is not None and not exif:
+            payload = f.read(min(length - 2, EXIF_READ_LIMIT))
+            if payload.startswith(EXIF_HEADER):
+                exif.append(payload[len(EXIF_HEADER):])
+            f.seek(length - 2 - len(payload), 1)
+            continue
+        f.seek(length - 2, 1)
+
+def _png_size(head: bytes) -> tuple[int, int] | None:
+    if len(head) < 24 or head[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", head[16:24])
+
+def _webp_size(head: bytes) -> tuple[int, int] | None:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and len(head) >= 30:
+        w, h = struct.unpack("<HH", head[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L" and len(head) >= 25:
+        b = head[21:25]
+        w = 1 + (((b[1] & 0x3F) << 8) | b[0])
+        h = 1 + (((b[3] & 0x0F) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+        return w, h
+    if chunk == b"VP8X" and len(head) >= 30:
+        w = 1 + int.from_bytes(head[24:27], "little")
+        h = 1 + int.from_bytes(head[27:30], "little")
+        return w, h
+    return None
+
+def _png_exif(f) -> bytes | None:
+    f.seek(8)
+    while True:
+        raw = f.read(8)
+        if len(raw) < 8:
+            return None
+        length, kind = struct.unpack(">I4s", raw)
+        if kind == b"eXIf":
+            return f.read(min(length, EXIF_READ_LIMIT))
+        if kind in (b"IDAT", b"IEND"):
+            return None  # eXIf 必须在 IDAT 之前
+        f.seek(length + 4, 1)
+
+def _webp_exif(f) -> bytes | None:
+    f.seek(12)
+    while True:
+        raw = f.read(8)
+        if len(raw) < 8:
+            return None
+        kind, length = struct.unpack("<4sI", raw)
+        if kind == b"EXIF":
+            data = f.read(min(length, EXIF_READ_LIMIT))
+            return data[len(EXIF_HEADER):] if data.startswith(EXIF_HEADER) else data
+        f.seek(length + (length & 1), 1)
+
+def image_info(path: Path) -> dict | None:
+    """
+    {'format', 'width', 'height', 'orientation', 'taken'} from the headers only,
+    or None if the format isn't recognised. width/height are stored pixels;
+    orientation 5-8 means the image is displayed rotated (see display_size).
+    """
+    try:
+        with path.open("rb") as f:
+            head = f.read(32)
+            exif = None
+            if head[:2] == b"\xff\xd8":
+                fmt = "jpeg"
+                found = []
+                size = _jpeg_size(f, found)
+                exif = found[0] if found else None
+            elif head[:8] == PNG_SIGNATURE:
+                fmt = "png"
+                size = _png_size(head)
+                exif = _png_exif(f)
+            elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                fmt = "webp"
+                size = _webp_size(head)
+                if head[12:16] == b"VP8X" and head[20] & 0x08:  # VP8X 的 EXIF 标志位
+                    exif = _webp_exif(f)
+            else:
+                return None
+    except (OSError, struct.error, IndexError):
+        return None
+    if size is None:
+        return None
+    meta = parse_exif(exif) if exif else {"orientation": None, "taken": None}
+    return {"format": fmt, "width": size[0], "height": size[1], **meta}
+
+def display_size(info: dict) -> tuple[int, int]:
+    """(width, height) as shown after applying the EXIF orientation."""
+    if info.get("orientation") in (5, 6, 7, 8):
+        return info["height"], info["width"]
+    return info["width"], info["height"]
+
+def image_size(path: Path) -> tuple[int, int] | None:
+    """(width, height) in stored pixels, or None if the format isn't recognised."""
+    try:
+        with path.open("rb") as f:
+            head = f.read(32)
+            if head[:2] == b"\xff\xd8":
+                return _jpeg_size(f)
+            if head[:8] == PNG_SIGNATURE:
+                return _png_size(head)
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                return _webp_size(head)
+    except (OSError, struct.error):
+        return None
+    return None
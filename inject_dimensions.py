@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Give every <img> and <picture><source> its intrinsic width/height, so the
+browser reserves the space before the image arrives (no layout shift).
+
+Sizes come from the image headers (JPEG SOF, PNG IHDR, WebP VP8/VP8L/VP8X;
+no pixel decoding) with the EXIF orientation applied, through media_catalogue:
+a rerun only stats the files and reads one SQLite query.
+
+  - missing width/height are added
+  - existing ones are kept if they have the image's aspect ratio (deliberate
+    scaling), replaced if they don't (the image was swapped)
+  - <source> in <video>, remote URLs and files that don't exist are left alone
+
+build_site.py uses sizes_for()/size_attrs() for the pages it generates,
+fix_projects_state.py runs inject_page() on the pages it creates; the CLI
+rewrites hand-written pages through the site journal:
+
+  python3 inject_dimensions.py [PAGE...] [--dry-run] [-j N]
+"""
+
+from pathlib import Path
+import argparse
+import os
+import posixpath
+import re
+from urllib.parse import unquote
+
+from image_headers import display_size
+from media_catalogue import Catalogue
+import profiling
+from ref_rewriter import site_html_files
+from site_journal import Batch
+
+ROOT = Path(".").resolve()
+SCRIPT = "inject_dimensions"
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"}
+ASPECT_TOLERANCE = 0.01
+
+TAG_RE = re.compile(r"<(img|source)\b[^>]*>", re.I)
+VIDEO_RE = re.compile(r"<video\b.*?</video\s*>", re.S | re.I)
+
+def attr(tag: str, name: str) -> str | None:
+    m = re.search(rf"\s{name}\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))", tag, re.I)
+    if not m:
+        return None
+    return next(g for g in m.groups() if g is not None)
+
+def with_attrs(tag: str, values: dict[str, str]) -> str:
+    """Set (or add, before the closing > or />) each attribute, double-quoted."""
+    close = " />" if tag.endswith("/>") else ">"
+    body = tag[:-2].rstrip() if tag.endswith("/>") else tag[:-1]
+    for name, value in values.items():
+        pattern = re.compile(rf"(\s{name})\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s>]+)", re.I)
+        if pattern.search(body):
+            body = pattern.sub(lambda m: f'{m.group(1)}="{value}"', body, count=1)
+        else:
+            body += f' {name}="{value}"'
+    return body + close
+
+def tag_url(tag: str) -> str | None:
+    """The file whose size the tag should carry: <img src>, else the first srcset candidate."""
+    is_img = tag[1:4].lower() == "img"
+    if is_img and attr(tag, "src"):
+        return attr(tag, "src")
+    kind = attr(tag, "type")
+    if kind and not kind.lower().startswith("image/"):
+        return None
+    srcset = attr(tag, "srcset")
+    if srcset and srcset.strip():
+        return srcset.split(",")[0].split()[0]
+    return None if is_img else attr(tag, "src")
+
+def resolve(url: str, page_rel: str) -> str | None:
+    """Site-relative path of a local image URL, or None."""
+    if not url or re.match(r"^[a-z][a-z0-9+.-]*:|^//|^#", url, re.I):
+        return None
+    path = unquote(url.split("#", 1)[0].split("?", 1)[0])
+    base = "" if path.startswith("/") else posixpath.dirname(page_rel)
+    rel = posixpath.normpath(posixpath.join(base, path.lstrip("/")))
+    if rel.startswith("..") or os.path.splitext(rel)[1].lower() not in IMAGE_EXTS:
+        return None
+    return rel
+
+def image_tags(text: str):
+    """(match, url) for every <img>/<source> outside <video>."""
+    videos = [(m.start(), m.end()) for m in VIDEO_RE.finditer(text)]
+    for m in TAG_RE.finditer(text):
+        if any(a <= m.start() < b for a, b in videos):
+            continue
+        url = tag_url(m.group(0))
+        if url:
+            yield m, url
+
+def sizes_for(rels, jobs: int = 1, catalogue: Catalogue | None = None) -> dict[str, tuple[int, int]]:
+    """Site-relative image path -> (width, height) as displayed. Unreadable / missing files are left out."""
+    own = catalogue is None
+    cat = catalogue or Catalogue()
+    try:
+        infos = cat.get_many(sorted(set(rels)), jobs)
+    finally:
+        if own:
+            cat.close()
+    return {rel: display_size(info) for rel, info in infos.items() if info.get("width") and info.get("height")}
+
+def size_attrs(size: tuple[int, int] | None) -> str:
+    """' width="W" height="H"' for templates, or '' when the size is unknown."""
+    return f' width="{size[0]}" height="{size[1]}"' if size else ""
+
+def needs_update(tag: str, size: tuple[int, int]) -> bool:
+    w, h = attr(tag, "width"), attr(tag, "height")
+    if not (w and h and w.isdigit() and h.isdigit() and int(h)):
+        return True
+    return abs(int(w) / int(h) - size[0] / size[1]) > ASPECT_TOLERANCE * size[0] / size[1]
+
+def inject(text: str, page_rel: str, sizes: dict[str, tuple[int, int]]) -> tuple[str, int]:
+    """(new text, tags changed)."""
+    out = []
+    last = 0
+    count = 0
+    for m, url in image_tags(text):
+        size = sizes.get(resolve(url, page_rel))
+        if size is None or not needs_update(m.group(0), size):
+            continue
+        out.append(text[last:m.start()])
+        out.append(with_attrs(m.group(0), {"width": str(size[0]), "height": str(size[1])}))
+        last = m.end()
+        count += 1
+    out.append(text[last:])
+    return "".join(out), count
+
+def inject_page(text: str, page_rel: str, catalogue: Catalogue | None = None) -> tuple[str, int]:
+    """inject() for one page, looking up just the images it references."""
+    refs = {resolve(url, page_rel) for _m, url in image_tags(text)} - {None}
+    return inject(text, page_rel, sizes_for(refs, catalogue=catalogue))
+
+def main():
+    ap = argparse.ArgumentParser(description="Add intrinsic width/height to every <img> and <source> (header-only, cached).")
+    ap.add_argument("pages", nargs="*", help="Only these pages (default: every *.html in the site)")
+    ap.add_argument("--dry-run", action="store_true", help="Report, write nothing")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Threads for files not in the catalogue yet (default: 0 = one per CPU)")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "inject_dimensions")
+
+    pages = [(ROOT / p).resolve() for p in args.pages] if args.pages else site_html_files()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    texts = {}
+    wanted = set()
+    for page in pages:
+        rel = page.relative_to(ROOT).as_posix()
+        texts[rel] = page.read_text(encoding="utf-8")
+        for _m, url in image_tags(texts[rel]):
+            target = resolve(url, rel)
+            if target:
+                wanted.add(target)
+    sizes = sizes_for(wanted, jobs)
+    missing = sorted(wanted - sizes.keys())
+
+    changed = tags = 0
+    with Batch(SCRIPT) as batch:
+        for rel, text in texts.items():
+            new, count = inject(text, rel, sizes)
+            if not count:
+                continue
+            changed += 1
+            tags += count
+            if not args.dry_run:
+                batch.write_text(ROOT / rel, new)
+            print(f"{'(dry run) ' if args.dry_run else ''}✅ {rel}: {count} tag(s)")
+
+    for rel in missing[:20]:
+        print(f"⚠️  No size for {rel} (missing or unreadable)")
+    if len(missing) > 20:
+        print(f"⚠️  ... and {len(missing) - 20} more")
+    print(f"\nPages: {len(pages)} | images: {len(wanted)} | pages changed: {changed} | tags updated: {tags}")
+    if batch.id:
+        print(f"Undo: python3 site_journal.py undo {batch.id}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Low-quality image placeholders (LQIP) for lazy-loaded images.
+
+Every <img loading="lazy"> gets a copy of its image shrunk to at most 12 px,
+saved as a ~60-100 byte WebP and inlined as the element's background:
+
+  <img src="img/01.jpg" ... style="background:url(data:image/webp;base64,...) center/cover no-repeat" />
+
+The browser stretches (and smooths) it over the box that width/height already
+reserve (inject_dimensions.py), so scrolling on a slow connection shows a
+blurred preview instead of a blank hole, and the real image paints over it.
+Images with transparency get no placeholder (it would show through).
+
+Placeholders are stored per content sha256 in the media catalogue database,
+so each image is decoded once, whatever it is called and wherever it is used.
+JPEGs are decoded at 1/8 scale (draft mode), on a process pool.
+
+build_site.py embeds them in the galleries it generates; the CLI rewrites
+hand-written pages through the site journal:
+
+  python3 lqip.py [PAGE...] [--dry-run] [-j N]
+
+Requires Pillow with WebP support (pip install Pillow). Without it, cached
+placeholders are still used and nothing new is computed; placeholders
+already in a page are kept, because the cache (inbox/) isn't committed and
+a fresh clone can't tell whether they are still right.
+"""
+
+from pathlib import Path
+import argparse
+import base64
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from inject_dimensions import attr, image_tags, resolve, with_attrs
+from media_catalogue import Catalogue
+import profiling
+from ref_rewriter import site_html_files
+from site_index import SiteIndex
+from site_journal import Batch
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 是可选依赖
+    Image = None
+
+ROOT = Path(".").resolve()
+SCRIPT = "lqip"
+SIZE = 12       # 长边像素
+QUALITY = 30
+# 参数变了，旧的占位图就作废
+SETTINGS = f"webp-{SIZE}px-q{QUALITY}"
+
+LQIP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS placeholders (
+    sha256   TEXT PRIMARY KEY,
+    settings TEXT NOT NULL,
+    data     TEXT              -- data: URI；有透明通道的图片为 NULL
+);
+"""
+STYLE_RE = re.compile(r"background:url\((data:image/webp;base64,[A-Za-z0-9+/=]*)\) center/cover no-repeat")
+STYLE_ATTR_RE = re.compile(r"\sstyle\s*=\s*(?:\"[^\"]*\"|'[^']*')", re.I)
+
+def pillow_ready() -> bool:
+    if Image is None:
+        return False
+    Image.init()
+    return "WEBP" in Image.SAVE
+
+def make_placeholder(path: str) -> str | None:
+    """Worker: data: URI of the tiny WebP, or None if the image has transparency. Runs in a child process."""
+    with Image.open(path) as im:
+        if "A" in im.getbands() or "transparency" in im.info:
+            return None
+        im.draft("RGB", (SIZE * 8, SIZE * 8))  # JPEG：直接按 1/8 解码
+        im = ImageOps.exif_transpose(im).convert("RGB")
+    im.thumbnail((SIZE, SIZE), Image.BOX)
+    buf = io.BytesIO()
+    im.save(buf, "WEBP", quality=QUALITY, method=6)
+    return "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+def _safe_make(path: str):
+    try:
+        return make_placeholder(path)
+    except Exception as e:  # 损坏/不支持的文件：报告后跳过
+        return e
+
+def placeholders_for(rels, catalogue: Catalogue, jobs: int = 1) -> dict[str, str | None]:
+    """
+    Site-relative image path -> data: URI, or None when the image has transparency
+    (known: no placeholder). Images whose placeholder is neither cached nor computable
+    now (no Pillow, undecodable, missing) are left out: unknown, not "none".
+    """
+    infos = catalogue.get_many(sorted(set(rels)), jobs)
+    wanted: dict[str, str] = {}
+    for rel, info in infos.items():
+        if info.get("format"):
+            wanted.setdefault(info["sha256"], rel)
+    db = catalogue.db
+    db.executescript(LQIP_SCHEMA)
+    known: dict[str, str | None] = {}
+    shas = list(wanted)
+    for i in range(0, len(shas), 500):
+        chunk = shas[i:i + 500]
+        for r in db.execute(f"SELECT * FROM placeholders WHERE sha256 IN ({', '.join('?' * len(chunk))})", chunk):
+            if r["settings"] == SETTINGS:
+                known[r["sha256"]] = r["data"]
+
+    todo = [(sha, rel) for sha, rel in wanted.items() if sha not in known]
+    if todo and pillow_ready():
+        paths = [str(ROOT / rel) for _sha, rel in todo]
+        if jobs > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as ex:
+                results = list(ex.map(_safe_make, paths, chunksize=8))
+        else:
+            results = [_safe_make(p) for p in paths]
+        new_rows = []
+        for (sha, rel), result in zip(todo, results):
+            if isinstance(result, Exception):
+                print(f"⚠️ Skip (cannot decode): {rel}: {result}")
+                continue
+            known[sha] = result
+            new_rows.append((sha, SETTINGS, result))
+        with db:
+            db.executemany("INSERT OR REPLACE INTO placeholders (sha256, settings, data) VALUES (?, ?, ?)", new_rows)
+    return {rel: known[info["sha256"]] for rel, info in infos.items() if info.get("sha256") in known}
+
+def background(uri: str) -> str:
+    return f"background:url({uri}) center/cover no-repeat"
+
+def style_attr(uri: str | None) -> str:
+    """' style="background:..."' for templates, or '' when there is no placeholder."""
+    return f' style="{background(uri)}"' if uri else ""
+
+def lazy_images(text: str):
+    """(match, url) for every <img loading="lazy">."""
+    for m, url in image_tags(text):
+        tag = m.group(0)
+        if tag[1:4].lower() == "img" and (attr(tag, "loading") or "").lower() == "lazy":
+            yield m, url
+
+def page_placeholders(text: str, page_rel: str) -> dict[str, str]:
+    """Site-relative image path -> the placeholder this page already carries for it."""
+    found = {}
+    for m, url in lazy_images(text):
+        ours = STYLE_RE.fullmatch(attr(m.group(0), "style") or "")
+        rel = resolve(url, page_rel)
+        if ours and rel:
+            found[rel] = ours.group(1)
+    return found
+
+def apply(text: str, page_rel: str, placeholders: dict[str, str | None]) -> tuple[str, int]:
+    """
+    (new text, tags changed). A style attribute we didn't write is left alone;
+    ours is updated when the image changed and dropped when the image has
+    transparency. Images missing from placeholders (unknown) are not touched.
+    """
+    out = []
+    last = 0
+    count = 0
+    for m, url in lazy_images(text):
+        tag = m.group(0)
+        rel = resolve(url, page_rel)
+        if rel not in placeholders:
+            continue
+        uri = placeholders[rel]
+        style = attr(tag, "style")
+        if style is not None and not STYLE_RE.fullmatch(style):
+            continue
+        if uri:
+            if style == background(uri):
+                continue
+            new = with_attrs(tag, {"style": background(uri)})
+        elif style is not None:
+            new = STYLE_ATTR_RE.sub("", tag, count=1)
+        else:
+            continue
+        out.append(text[last:m.start()])
+        out.append(new)
+        last = m.end()
+        count += 1
+    out.append(text[last:])
+    return "".join(out), count
+
+def run_lqip(pages: list[Path] | None = None, jobs: int = 1, dry_run: bool = False, quiet: bool = False,
+             index: SiteIndex | None = None) -> dict:
+    """Add / refresh placeholders on pages (default: every page, listed from index if given). Returns counts."""
+    pages = pages if pages is not None else site_html_files(index)
+    texts = {}
+    wanted = set()
+    for page in pages:
+        rel = page.relative_to(ROOT).as_posix()
+        texts[rel] = page.read_text(encoding="utf-8")
+        for _m, url in lazy_images(texts[rel]):
+            target = resolve(url, rel)
+            if target:
+                wanted.add(target)
+    with Catalogue() as cat:
+        placeholders = placeholders_for(wanted, cat, jobs)
+
+    changed = tags = 0
+    with Batch(SCRIPT) as batch:
+        for rel, text in texts.items():
+            new, count = apply(text, rel, placeholders)
+            if not count:
+                continue
+            changed += 1
+            tags += count
+            if not dry_run:
+                batch.write_text(ROOT / rel, new)
+            if not quiet:
+                print(f"{'(dry run) ' if dry_run else ''}✅ {rel}: {count} tag(s)")
+    uris = [u for u in placeholders.values() if u]
+    return {
+        "pages": len(pages),
+        "images": len(wanted),
+        "placeholders": len(uris),
+        "bytes": sum(len(u) for u in uris),
+        "changed": changed,
+        "tags": tags,
+        "batch": batch.id,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Inline tiny blurred placeholders behind lazy-loaded images (cached per content hash).")
+    ap.add_argument("pages", nargs="*", help="Only these pages (default: every *.html in the site)")
+    ap.add_argument("--dry-run", action="store_true", help="Report, write nothing")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes for new placeholders (default: 0 = one per CPU)")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "lqip")
+
+    if not pillow_ready():
+        print("⚠️ Pillow with WebP support not found (pip install -r requirements.txt): only cached placeholders are used, existing ones are kept.")
+    pages = [(ROOT / p).resolve() for p in args.pages] if args.pages else None
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    s = run_lqip(pages, jobs, args.dry_run)
+
+    avg = s["bytes"] / s["placeholders"] if s["placeholders"] else 0
+    print(f"\nPages: {s['pages']} | lazy images: {s['images']} | placeholders: {s['placeholders']} (avg {avg:.0f} chars)"
+          f" | pages changed: {s['changed']} | tags updated: {s['tags']}")
+    if s["batch"]:
+        print(f"Undo: python3 site_journal.py undo {s['batch']}")
+
+if __name__ == "__main__":
+    main()
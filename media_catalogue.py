@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistent media catalogue (SQLite) for images/, inbox/ and works/projects.
+
+One row per image file: content hash, pixel size, EXIF orientation, capture
+date. Everything comes from the file headers (image_headers.py); pixels are
+never decoded. update() only re-reads files whose size or mtime changed and
+drops rows for files that are gone.
+
+Other scripts look facts up instead of reopening files:
+
+    with Catalogue() as cat:
+        info = cat.get(path)       # refreshed on the spot if the file changed
+        info["sha256"], info["width"], display_size(info)
+
+CLI:
+  python3 media_catalogue.py update [-j N]
+  python3 media_catalogue.py show PATH...
+  python3 media_catalogue.py query [--under DIR] [--format jpeg] [--min-width N] [--rotated]
+                                   [--taken-after DATE] [--taken-before DATE] [--no-date] [--json]
+  python3 media_catalogue.py dups
+  python3 media_catalogue.py stats
+"""
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from image_headers import image_info
+import profiling
+from site_index import skip_dir
+
+ROOT = Path(".").resolve()
+DB_PATH = ROOT / "inbox" / "media_catalogue.sqlite"
+SCAN_ROOTS = ("images", "inbox", "works/projects")
+SCHEMA_VERSION = 1
+
+MEDIA_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".tif", ".tiff", ".bmp", ".heic"}
+COLUMNS = ("path", "size", "mtime_ns", "sha256", "format", "width", "height", "orientation", "taken", "scanned")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path        TEXT PRIMARY KEY,   -- 相对站点根目录的 posix 路径
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    sha256      TEXT NOT NULL,
+    format      TEXT,               -- jpeg / png / webp；读不出头信息时为 NULL
+    width       INTEGER,            -- 存储像素（未按 orientation 旋转）
+    height      INTEGER,
+    orientation INTEGER,
+    taken       TEXT,               -- EXIF DateTimeOriginal, ISO 8601
+    scanned     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_sha256 ON media(sha256);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def walk_media(base: Path):
+    """Yield (rel, size, mtime_ns) for media files under base (one scandir per folder)."""
+    stack = [base]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        if not skip_dir(e.name):
+                            stack.append(Path(e.path))
+                    elif e.is_file() and not e.name.startswith("._"):
+                        if os.path.splitext(e.name)[1].lower() in MEDIA_EXTS:
+                            st = e.stat()
+                            yield Path(e.path).relative_to(ROOT).as_posix(), st.st_size, st.st_mtime_ns
+                except FileNotFoundError:
+                    continue
+
+def extract(rel: str, size: int, mtime_ns: int) -> tuple:
+    """Worker: hash + header facts for one file -> a media row. Runs on a thread (hashlib releases the GIL)."""
+    path = ROOT / rel
+    info = image_info(path) or {}
+    return (
+        rel,
+        size,
+        mtime_ns,
+        sha256_file(path),
+        info.get("format"),
+        info.get("width"),
+        info.get("height"),
+        info.get("orientation"),
+        info.get("taken"),
+        datetime.now().isoformat(timespec="seconds"),
+    )
+
+class Catalogue:
+    def __init__(self, db_path: Path = DB_PATH):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if row is None or int(row["value"]) != SCHEMA_VERSION:
+            # 表结构变了：清空重建（内容都能从文件重新算出来）
+            self.db.execute("DELETE FROM media")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(SCHEMA_VERSION),))
+            self.db.commit()
+
+    def __enter__(self) -> "Catalogue":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _upsert(self, rows: list[tuple]) -> None:
+        self.db.executemany(
+            f"INSERT OR REPLACE INTO media ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            rows,
+        )
+
+    def update(self, roots: tuple[str, ...] = SCAN_ROOTS, jobs: int = 1) -> dict:
+        """Bring the rows under roots in line with the disk. Returns counts."""
+        on_disk = {}
+        for r in roots:
+            for rel, size, mtime_ns in walk_media(ROOT / r):
+                on_disk[rel] = (size, mtime_ns)
+
+        known = {}
+        for r in roots:
+            for row in self.db.execute(
+                "SELECT path, size, mtime_ns FROM media WHERE path >= ? AND path < ?", (r + "/", r + "0")
+            ):
+                known[row["path"]] = (row["size"], row["mtime_ns"])
+
+        todo = [(rel, size, mtime_ns) for rel, (size, mtime_ns) in on_disk.items() if known.get(rel) != (size, mtime_ns)]
+        gone = [rel for rel in known if rel not in on_disk]
+
+        rows = []
+        if todo:
+            with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+                for row in ex.map(lambda t: extract(*t), todo):
+                    rows.append(row)
+        with self.db:
+            self._upsert(rows)
+            self.db.executemany("DELETE FROM media WHERE path = ?", [(rel,) for rel in gone])
+        return {"files": len(on_disk), "updated": len(rows), "removed": len(gone), "unchanged": len(on_disk) - len(rows)}
+
+    def get(self, path: Path | str) -> dict | None:
+        """Facts for one file (absolute or site-relative path); re-extracted if it changed since the last scan."""
+        path = Path(path)
+        rel = (path if path.is_absolute() else ROOT / path).resolve().relative_to(ROOT).as_posix()
+        try:
+            st = (ROOT / rel).stat()
+        except FileNotFoundError:
+            return None
+        row = self.db.execute("SELECT * FROM media WHERE path = ?", (rel,)).fetchone()
+        if row is not None and row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns:
+            return dict(row)
+        fresh = extract(rel, st.st_size, st.st_mtime_ns)
+        with self.db:
+            self._upsert([fresh])
+        return dict(zip(COLUMNS, fresh))
+
+    def get_many(self, rels: list[str], jobs: int = 1) -> dict[str, dict]:
+        """
+        get() for many site-relative paths: one stat each, one query per 500 paths,
+        changed files re-extracted on a thread pool, one commit. Missing files are left out.
+        """
+        state = {}
+        for rel in rels:
+            try:
+                st = (ROOT / rel).stat()
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            state[rel] = (st.st_size, st.st_mtime_ns)
+        found = {}
+        names = list(state)
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            for row in self.db.execute(f"SELECT * FROM media WHERE path IN ({', '.join('?' * len(chunk))})", chunk):
+                if state[row["path"]] == (row["size"], row["mtime_ns"]):
+                    found[row["path"]] = dict(row)
+        todo = [(rel, *state[rel]) for rel in names if rel not in found]
+        if todo:
+            with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+                rows = list(ex.map(lambda t: extract(*t), todo))
+            with self.db:
+                self._upsert(rows)
+            for row in rows:
+                found[row[0]] = dict(zip(COLUMNS, row))
+        return found
+
+    def by_hash(self, sha256: str) -> list[dict]:
+        return [dict(r) for r in self.db.execute("SELECT * FROM media WHERE sha256 = ? ORDER BY path", (sha256,))]
+
+    def query(self, under: str | None = None, fmt: str | None = None, min_width: int | None = None,
+              rotated: bool = False, taken_after: str | None = None, taken_before: str | None = None,
+              no_date: bool = False) -> list[dict]:
+        where, params = [], []
+        if under:
+            prefix = under.strip("/") + "/"
+            where.append("path >= ? AND path < ?")
+            params += [prefix, prefix[:-1] + "0"]
+        if fmt:
+            where.append("format = ?")
+            params.append(fmt)
+        if min_width:
+            where.append("width >= ?")
+            params.append(min_width)
+        if rotated:
+            where.append("orientation > 1")
+        if taken_after:
+            where.append("taken >= ?")
+            params.append(taken_after)
+        if taken_before:
+            where.append("taken < ?")
+            params.append(taken_before)
+        if no_date:
+            where.append("taken IS NULL")
+        sql = "SELECT * FROM media" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY path"
+        return [dict(r) for r in self.db.execute(sql, params)]
+
+    def duplicates(self) -> list[list[dict]]:
+        groups: dict[str, list[dict]] = {}
+        for r in self.db.execute(
+            "SELECT * FROM media WHERE sha256 IN (SELECT sha256 FROM media GROUP BY sha256 HAVING COUNT(*) > 1) "
+            "ORDER BY sha256, path"
+        ):
+            groups.setdefault(r["sha256"], []).append(dict(r))
+        return list(groups.values())
+
+    def stats(self) -> list[dict]:
+        return [dict(r) for r in self.db.execute(
+            "SELECT COALESCE(format, '?') AS format, COUNT(*) AS files, SUM(size) AS bytes, "
+            "TOTAL(COALESCE(orientation, 1) > 1) AS rotated, TOTAL(taken IS NOT NULL) AS dated FROM media GROUP BY format ORDER BY files DESC"
+        )]
+
+def format_row(r: dict) -> str:
+    size = f"{r['width']}x{r['height']}" if r["width"] else "?"
+    orient = f" o{r['orientation']}" if r["orientation"] and r["orientation"] > 1 else ""
+    return f"{r['path']}\t{r['format'] or '?'}\t{size}{orient}\t{r['taken'] or '-'}\t{r['sha256'][:12]}"
+
+def main():
+    ap = argparse.ArgumentParser(description="SQLite catalogue of site images (hash, size, orientation, capture date).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_update = sub.add_parser("update", help="Scan images/, inbox/, works/projects and refresh changed rows")
+    p_update.add_argument("--jobs", "-j", type=int, default=0, help="Hashing threads (default: 0 = one per CPU)")
+    p_show = sub.add_parser("show", help="Show the row for each path (refreshed if stale)")
+    p_show.add_argument("paths", nargs="+")
+    p_query = sub.add_parser("query", help="List rows matching filters")
+    p_query.add_argument("--under", help="Path prefix, e.g. works/projects/p-2024-001-the-awarded")
+    p_query.add_argument("--format", choices=["jpeg", "png", "webp"])
+    p_query.add_argument("--min-width", type=int)
+    p_query.add_argument("--rotated", action="store_true", help="Only files with EXIF orientation > 1")
+    p_query.add_argument("--taken-after", help="ISO date, e.g. 2023-01-01")
+    p_query.add_argument("--taken-before", help="ISO date")
+    p_query.add_argument("--no-date", action="store_true", help="Only files without a capture date")
+    p_query.add_argument("--json", action="store_true", help="JSON lines instead of tab-separated text")
+    sub.add_parser("dups", help="Files with identical content")
+    sub.add_parser("stats", help="Counts per format")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "media_catalogue")
+
+    with Catalogue() as cat:
+        if args.cmd == "update":
+            jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+            s = cat.update(jobs=jobs)
+            print(f"✅ Catalogue: {s['files']} file(s) | updated: {s['updated']} | removed: {s['removed']} | unchanged: {s['unchanged']}")
+        elif args.cmd == "show":
+            for p in args.paths:
+                r = cat.get(p)
+                print(json.dumps(r, ensure_ascii=False, indent=1) if r else f"❌ Not found: {p}")
+        elif args.cmd == "query":
+            rows = cat.query(args.under, args.format, args.min_width, args.rotated,
+                             args.taken_after, args.taken_before, args.no_date)
+            for r in rows:
+                print(json.dumps(r, ensure_ascii=False) if args.json else format_row(r))
+        elif args.cmd == "dups":
+            groups = cat.duplicates()
+            for g in groups:
+                print(f"{g[0]['sha256'][:12]}  {g[0]['size']} bytes")
+                for r in g:
+                    print(f"  - {r['path']}")
+            print(f"{len(groups)} group(s) of identical files")
+        elif args.cmd == "stats":
+            for r in cat.stats():
+                print(f"{r['format']:<6} {r['files']:>6} files {r['bytes'] / 1e6:>9.1f} MB  rotated: {r['rotated']:.0f}  dated: {r['dated']:.0f}")
+
+if __name__ == "__main__":
+    main()
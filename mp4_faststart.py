@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Make every project video start playing before it is fully downloaded.
+
+For each .mp4 / .m4v / .mov in the site:
+  - the box structure is parsed (only box headers and the moov box are read)
+  - if moov comes after mdat, the file is rewritten with moov first: the chunk
+    offsets in every stco/co64 are shifted, the media data is streamed across
+    with copy_file_range (never loaded into memory), and the result replaces
+    the original through the site journal (undo-able)
+  - duration, size, overall and per-track bitrate, codecs and display size are reported
+  - a poster frame (<name>-poster.jpg next to the video) is extracted with ffmpeg
+    when ffmpeg is installed and no poster exists yet; an existing poster is kept
+  - every <video> in the site that plays one of these files gets preload="metadata",
+    width/height (display size, rotation applied) and poster= when there is one
+
+  python3 mp4_faststart.py [--check] [--json] [--poster-at 1.0] [--no-posters]
+
+--check only reports (exit status 1 when a file isn't faststart).
+"""
+
+from pathlib import Path
+import argparse
+import bisect
+import contextlib
+import json
+import math
+import os
+import posixpath
+import re
+import shutil
+import struct
+import subprocess
+import sys
+
+import profiling
+from ref_rewriter import site_html_files
+from site_index import SiteIndex
+from site_journal import Batch
+
+ROOT = Path(".").resolve()
+SCRIPT = "mp4_faststart"
+VIDEO_EXTS = {".mp4", ".m4v", ".mov"}
+POSTER_SUFFIX = "-poster.jpg"
+POSTER_AT = 1.0  # 秒；视频更短就取中间一帧
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"mvex"}
+COPY_CHUNK = 8 << 20
+
+class Mp4Error(Exception):
+    pass
+
+# ---------- boxes ----------
+
+def iter_boxes(f, start: int, end: int):
+    """Yield (type, offset, size, header size) for the boxes between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        head = f.read(16)
+        size, kind = struct.unpack(">I4s", head[:8])
+        header = 8
+        if size == 1:
+            if len(head) < 16:
+                raise Mp4Error(f"truncated box header at {pos}")
+            size = struct.unpack(">Q", head[8:16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos  # 一直到文件尾
+        if size < header or pos + size > end:
+            raise Mp4Error(f"bad {kind.decode('latin-1')} box size {size} at {pos}")
+        yield kind, pos, size, header
+        pos += size
+
+def iter_buffer_boxes(buf: bytes | bytearray, start: int, end: int):
+    """Same as iter_boxes, over an in-memory box (the moov)."""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise Mp4Error(f"bad {kind.decode('latin-1')} box size {size} inside moov")
+        yield kind, pos, size, header
+        pos += size
+
+def walk_moov(moov: bytes | bytearray):
+    """Yield (path, payload offset, payload end) for every box in moov, depth first."""
+    def walk(start, end, path):
+        for kind, pos, size, header in iter_buffer_boxes(moov, start, end):
+            here = path + (kind,)
+            yield here, pos + header, pos + size
+            if kind in CONTAINERS:
+                yield from walk(pos + header, pos + size, here)
+    size, kind = struct.unpack_from(">I4s", moov, 0)
+    header = 16 if size == 1 else 8
+    yield (b"moov",), header, len(moov)
+    yield from walk(header, len(moov), (b"moov",))
+
+def fixed_16_16(value: int) -> float:
+    if value >= 1 << 31:
+        value -= 1 << 32
+    return value / 65536
+
+def parse_moov(moov: bytes) -> dict:
+    info = {"timescale": 0, "duration": 0.0, "tracks": []}
+    track = None
+    for path, start, end in walk_moov(moov):
+        kind = path[-1]
+        version = moov[start] if end > start else 0
+        if kind == b"mvhd":
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", moov, start + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", moov, start + 12)
+            info["timescale"] = timescale
+            info["duration"] = duration / timescale if timescale else 0.0
+        elif kind == b"trak":
+            track = {"handler": None, "codec": None, "width": 0, "height": 0, "rotation": 0,
+                     "duration": 0.0, "bytes": 0, "samples": 0}
+            info["tracks"].append(track)
+        elif track is None:
+            continue
+        elif kind == b"tkhd":
+            body = start + (36 if version == 1 else 24)
+            matrix = struct.unpack_from(">9i", moov, body + 16)
+            w, h = struct.unpack_from(">II", moov, body + 52)
+            track["width"], track["height"] = round(fixed_16_16(w)), round(fixed_16_16(h))
+            a, b = matrix[0] / 65536, matrix[1] / 65536
+            track["rotation"] = round(math.degrees(math.atan2(b, a))) % 360
+        elif kind == b"mdhd":
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", moov, start + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", moov, start + 12)
+            track["duration"] = duration / timescale if timescale else 0.0
+        elif kind == b"hdlr":
+            track["handler"] = moov[start + 8:start + 12].decode("latin-1")
+        elif kind == b"stsd":
+            if end - start >= 16:
+                track["codec"] = moov[start + 12:start + 16].decode("latin-1")
+        elif kind == b"stsz":
+            sample_size, count = struct.unpack_from(">II", moov, start + 4)
+            track["samples"] = count
+            if sample_size:
+                track["bytes"] = sample_size * count
+            else:
+                track["bytes"] = sum(struct.unpack_from(f">{count}I", moov, start + 12))
+    return info
+
+def chunk_offset_tables(moov: bytes | bytearray):
+    """Yield (kind, first entry offset, entry count) for every stco/co64 in moov."""
+    for path, start, _end in walk_moov(moov):
+        if path[-1] in (b"stco", b"co64"):
+            count = struct.unpack_from(">I", moov, start + 4)[0]
+            yield path[-1], start + 8, count
+
+# ---------- one file ----------
+
+def scan_file(path: Path) -> dict:
+    """Top-level layout + moov info. Reads box headers and the moov only."""
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        boxes = list(iter_boxes(f, 0, size))
+        moov = [b for b in boxes if b[0] == b"moov"]
+        if not moov:
+            raise Mp4Error("no moov box (not an MP4, or an incomplete upload)")
+        _kind, pos, msize, _header = moov[0]
+        f.seek(pos)
+        info = parse_moov(f.read(msize))
+    mdats = [b[1] for b in boxes if b[0] == b"mdat"]
+    info.update({
+        "path": path.relative_to(ROOT).as_posix(),
+        "size": size,
+        "boxes": [(k.decode("latin-1"), p, s) for k, p, s, _h in boxes],
+        "faststart": not mdats or pos < min(mdats),
+        "fragmented": any(b[0] == b"moof" for b in boxes),
+    })
+    d = info["duration"]
+    info["kbps"] = round(size * 8 / d / 1000) if d else None
+    for t in info["tracks"]:
+        td = t["duration"] or d
+        t["kbps"] = round(t["bytes"] * 8 / td / 1000) if td else None
+    video = next((t for t in info["tracks"] if t["handler"] == "vide"), None)
+    if video and video["width"]:
+        w, h = video["width"], video["height"]
+        info["display"] = (h, w) if video["rotation"] in (90, 270) else (w, h)
+    else:
+        info["display"] = None
+    return info
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, length: int) -> None:
+    os.lseek(dst_fd, 0, os.SEEK_END)
+    while length > 0:
+        try:
+            n = os.copy_file_range(src_fd, dst_fd, min(length, COPY_CHUNK), offset)
+        except (AttributeError, OSError):
+            # 跨文件系统或老内核：退回 pread + write
+            data = os.pread(src_fd, min(length, COPY_CHUNK), offset)
+            n = os.write(dst_fd, data)
+        if n <= 0:
+            raise Mp4Error("short copy while relocating")
+        offset += n
+        length -= n
+
+def relocate(path: Path, info: dict, tmp: Path) -> None:
+    """Write path's boxes to tmp with moov moved in front of the media data."""
+    boxes = info["boxes"]
+    moov_box = next(b for b in boxes if b[0] == "moov")
+    first_mdat = min(b[1] for b in boxes if b[0] == "mdat")
+    head = [b for b in boxes if b[1] < first_mdat and b[0] != "moov"]
+    tail = [b for b in boxes if b[1] >= first_mdat and b[0] != "moov"]
+    order = head + [moov_box] + tail
+
+    # 每个旧 box 的新位置：chunk offset 落在哪个 box 里就按那个 box 平移
+    new_start = {}
+    pos = 0
+    for kind, old, size in order:
+        new_start[old] = pos
+        pos += size
+    starts = sorted(b[1] for b in boxes)
+
+    def moved(offset: int) -> int:
+        i = bisect.bisect_right(starts, offset) - 1
+        if i < 0:
+            raise Mp4Error(f"chunk offset {offset} points before the first box")
+        return offset + new_start[starts[i]] - starts[i]
+
+    with path.open("rb") as f:
+        f.seek(moov_box[1])
+        moov = bytearray(f.read(moov_box[2]))
+    for kind, first, count in chunk_offset_tables(moov):
+        if kind == b"stco":
+            values = struct.unpack_from(f">{count}I", moov, first)
+            new = [moved(v) for v in values]
+            if new and max(new) > 0xFFFFFFFF:
+                raise Mp4Error("moving moov pushes offsets past 4 GB (needs co64); re-export with faststart")
+            struct.pack_into(f">{count}I", moov, first, *new)
+        else:
+            values = struct.unpack_from(f">{count}Q", moov, first)
+            struct.pack_into(f">{count}Q", moov, first, *(moved(v) for v in values))
+
+    src_fd = os.open(path, os.O_RDONLY)
+    dst_fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for kind, old, size in order:
+            if kind == "moov":
+                os.write(dst_fd, moov)
+            else:
+                copy_range(src_fd, dst_fd, old, size)
+    finally:
+        os.close(src_fd)
+        os.close(dst_fd)
+
+    check = scan_file(tmp)
+    if not check["faststart"] or check["size"] != info["size"]:
+        raise Mp4Error("relocated file failed verification")
+
+# ---------- posters + pages ----------
+
+def poster_path(video: Path) -> Path:
+    return video.with_name(video.stem + POSTER_SUFFIX)
+
+def extract_poster(batch: Batch, video: Path, duration: float, at: float) -> bool:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return False
+    when = at if duration > at else duration / 2
+    target = poster_path(video)
+    tmp = target.with_name(f".{target.name}.tmp.jpg")
+    r = subprocess.run(
+        [ffmpeg, "-v", "error", "-y", "-ss", f"{when:.3f}", "-i", str(video), "-frames:v", "1", "-q:v", "3", str(tmp)],
+        capture_output=True, text=True,
+    )
+    if r.returncode != 0 or not tmp.exists():
+        print(f"⚠️  ffmpeg could not extract a poster from {video.name}: {r.stderr.strip()[:200]}")
+        tmp.unlink(missing_ok=True)
+        return False
+    batch.write_from(target, tmp)
+    return True
+
+VIDEO_RE = re.compile(r"(<video\b[^>]*?)(\s*/?>)(.*?</video\s*>)", re.S | re.I)
+SOURCE_SRC_RE = re.compile(r"<source\b[^>]*\bsrc=([\"'])(.*?)\1", re.I)
+SRC_RE = re.compile(r"\bsrc=([\"'])(.*?)\1", re.I)
+
+def set_attr(tag: str, name: str, value: str) -> str:
+    pattern = re.compile(rf"(\s{name})(?:=([\"'])[^\"']*\2|=[^\s>]*)?(?=[\s/>]|$)", re.I)
+    if pattern.search(tag):
+        return pattern.sub(lambda m: f'{m.group(1)}="{value}"', tag, count=1)
+    return f'{tag} {name}="{value}"'
+
+def update_video_tags(text: str, page_rel: str, videos: dict[str, dict]) -> tuple[str, int]:
+    """Add preload/width/height/poster to <video> tags that play a known file."""
+    page_dir = posixpath.dirname(page_rel)
+    count = 0
+
+    def fix(m: re.Match) -> str:
+        nonlocal count
+        open_tag, close, rest = m.group(1), m.group(2), m.group(3)
+        src = SRC_RE.search(open_tag) or SOURCE_SRC_RE.search(rest)
+        if not src or re.match(r"^[a-z]+:|^//", src.group(2), re.I):
+            return m.group(0)
+        rel = posixpath.normpath(posixpath.join(page_dir, src.group(2).split("?")[0].split("#")[0]))
+        info = videos.get(rel)
+        if info is None:
+            return m.group(0)
+        tag = set_attr(open_tag, "preload", "metadata")
+        if info["display"]:
+            tag = set_attr(tag, "width", str(info["display"][0]))
+            tag = set_attr(tag, "height", str(info["display"][1]))
+        if info.get("poster"):
+            tag = set_attr(tag, "poster", posixpath.relpath(info["poster"], page_dir or "."))
+        if tag != open_tag:
+            count += 1
+        return tag + close + rest
+
+    return VIDEO_RE.sub(fix, text), count
+
+def print_report(info: dict) -> None:
+    mark = "✅" if info["faststart"] else "⚠️ "
+    mins, secs = divmod(info["duration"], 60)
+    disp = f"{info['display'][0]}x{info['display'][1]}" if info["display"] else "no video track"
+    print(f"{mark} {info['path']}: {int(mins)}:{secs:05.2f}, {info['size'] / 1e6:.1f} MB, "
+          f"{info['kbps'] or '?'} kbps, {disp}, moov {'first' if info['faststart'] else 'AFTER mdat'}")
+    for t in info["tracks"]:
+        extra = f" {t['width']}x{t['height']}" if t["handler"] == "vide" else ""
+        rot = f" rotated {t['rotation']}°" if t["rotation"] else ""
+        print(f"     {t['handler'] or '?'} {t['codec'] or '?'}{extra}{rot}: {t['kbps'] or '?'} kbps, {t['samples']} samples")
+
+def scan_site(index: SiteIndex, under: list[str] | None = None) -> list[dict]:
+    """Report every video in the index (or only those below the folders in under)."""
+    reports = []
+    rels = sorted(rel for d in under for rel in index.files_under(d)) if under is not None else \
+        sorted(rel for rel, e in index.entries.items() if not e.is_dir)
+    for rel in rels:
+        if os.path.splitext(rel)[1].lower() not in VIDEO_EXTS:
+            continue
+        try:
+            reports.append(scan_file(ROOT / rel))
+        except (Mp4Error, struct.error) as e:
+            print(f"❌ {rel}: {e}")
+    return reports
+
+def run_faststart(posters: bool = True, poster_at: float = POSTER_AT, quiet: bool = False,
+                  index: SiteIndex | None = None, under: list[str] | None = None) -> list[dict]:
+    """
+    Relocate, extract posters, update pages. Returns the per-file reports.
+    watch_site.py passes its index and the changed project folders (under):
+    only their videos and pages are looked at.
+    """
+    if index is None:
+        index = SiteIndex(ROOT)
+        index.scan()
+    reports = scan_site(index, under)
+    if not reports:
+        print("— No videos found.")
+        return reports
+    if posters and not shutil.which("ffmpeg"):
+        print("ℹ️  ffmpeg not found: posters are only used if <name>-poster.jpg already exists.")
+
+    relocated = pages = 0
+    with Batch(SCRIPT) as batch:
+        for info in reports:
+            path = ROOT / info["path"]
+            if not info["faststart"]:
+                if info["fragmented"]:
+                    print(f"⚠️  {info['path']}: fragmented MP4, left as it is")
+                else:
+                    tmp = path.with_name(f".{path.name}.faststart-tmp")
+                    try:
+                        relocate(path, info, tmp)
+                    except (Mp4Error, struct.error) as e:
+                        tmp.unlink(missing_ok=True)
+                        print(f"❌ {info['path']}: {e}")
+                    else:
+                        batch.write_from(path, tmp)
+                        info.update(scan_file(path))
+                        relocated += 1
+                        print(f"✅ Moved moov to the front: {info['path']}")
+            poster = poster_path(path)
+            if not poster.exists() and posters and info["display"]:
+                if extract_poster(batch, path, info["duration"], poster_at):
+                    print(f"✅ Poster: {poster.relative_to(ROOT)}")
+            if poster.exists():
+                info["poster"] = poster.relative_to(ROOT).as_posix()
+
+        videos = {r["path"]: r for r in reports}
+        pages_to_check = site_html_files(index)
+        if under is not None:
+            pages_to_check = [ROOT / rel for d in under for rel in index.files_under(d) if rel.lower().endswith(".html")]
+        for page in pages_to_check:
+            rel = page.relative_to(ROOT).as_posix()
+            text = page.read_text(encoding="utf-8")
+            new, count = update_video_tags(text, rel, videos)
+            if new != text:
+                batch.write_text(page, new)
+                pages += 1
+                print(f"✅ Updated {count} <video> tag(s) in {rel}")
+
+    if not quiet:
+        for r in reports:
+            print_report(r)
+    print(f"Videos: {len(reports)} | relocated: {relocated} | pages updated: {pages}")
+    if batch.id:
+        print(f"Undo: python3 site_journal.py undo {batch.id}")
+    return reports
+
+def main():
+    ap = argparse.ArgumentParser(description="Move moov before mdat, report bitrate/duration, and fix <video> tags.")
+    ap.add_argument("--check", action="store_true", help="Report only; exit 1 if any file isn't faststart")
+    ap.add_argument("--json", action="store_true", help="Print the per-file report as JSON")
+    ap.add_argument("--poster-at", type=float, default=POSTER_AT, help=f"Poster frame time in seconds (default: {POSTER_AT})")
+    ap.add_argument("--no-posters", action="store_true", help="Don't extract poster frames")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "mp4_faststart")
+
+    if args.check:
+        index = SiteIndex(ROOT)
+        index.scan()
+        reports = scan_site(index)
+        if args.json:
+            print(json.dumps(reports, ensure_ascii=False, indent=1))
+        else:
+            for r in reports:
+                print_report(r)
+        sys.exit(0 if all(r["faststart"] for r in reports) else 1)
+
+    if args.json:
+        # 进度信息走 stderr，stdout 只有 JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            reports = run_faststart(not args.no_posters, args.poster_at, quiet=True)
+        print(json.dumps(reports, ensure_ascii=False, indent=1))
+    else:
+        run_faststart(not args.no_posters, args.poster_at)
+
+if __name__ == "__main__":
+    main()
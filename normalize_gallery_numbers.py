@@ -1,112 +1,296 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+"""
+Renumber gallery files in every project so each folder uses one zero-padded width
+and lowercase extensions:
+
+  img/01.jpg, img/12.JPG            -> img/001.jpg, img/012.jpg   (bare numbers: at least 3 digits)
+  img/grid-01.jpg ... grid-010.jpg  -> grid-01.jpg ... grid-10.jpg (prefixed: the folder's usual width)
+  feature-01-480w.webp              follows its source (renditions from build_derivatives.py)
+
+--compact also closes gaps (1, 2, 4 -> 1, 2, 3); files sharing a number (img-027.jpg
++ img-027.webp) keep sharing it.
+
+The whole plan is computed first and checked for collisions (two files -> one
+name, a name that is already taken, names that differ only in case) before
+anything moves. Then, in one site_journal batch:
+
+  1. plan.json is saved in the batch
+  2. every file is renamed to a temp name   (one journal fsync for the lot)
+  3. every temp name is renamed to its final name
+  4. every page that references a renamed file is rewritten
+
+If the run dies half way the batch stays "open":
+  python3 normalize_gallery_numbers.py --resume <batch-id>     finish it
+  python3 site_journal.py recover                               or roll it back
+"""
+
 from pathlib import Path
+import argparse
+import os
+import posixpath
 import re
-from datetime import datetime
+import sys
+from collections import Counter
+
+from audit_projects import list_project_folders
+import profiling
+from ref_rewriter import ASCII_FOLD, REF_END, REF_START, site_html_files, trie_pattern
+from site_index import SiteIndex
+from site_journal import Batch, load_batch_json
 
 ROOT = Path(".").resolve()
 PROJECTS_DIR = ROOT / "works" / "projects"
+SCRIPT = "normalize_gallery_numbers"
 
-# 只处理你现在 WARN 的这三个项目（精准、不乱动其它）
-TARGET_SLUGS = {
-    "p-2022-001-columbarium-of-the-days",
-    "p-2024-001-the-awarded",
-    "p-2024-002-the-alienated",
-}
+BARE_MIN_WIDTH = 3  # 纯数字文件名的约定：001.jpg
+NUMBERED_RE = re.compile(
+    r"(?P<prefix>[A-Za-z]+[-_])?(?P<num>\d+)(?P<rendition>-\d+w)?\.(?P<ext>jpe?g|png|webp|avif)",
+    re.I,
+)
+TEMP_PREFIX = ".renumber-"
 
-IMG_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".JPG", ".JPEG", ".PNG", ".WEBP"}
+class PlanError(Exception):
+    pass
 
-def backup(p: Path) -> Path:
-    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    bak = p.with_suffix(p.suffix + f".bak.{ts}")
-    bak.write_text(p.read_text(encoding="utf-8"), encoding="utf-8")
-    return bak
+def list_entries(folder: Path, index: SiteIndex | None = None) -> list[tuple[str, bool]]:
+    """(name, is_dir) for every directory and file in folder, from the index when there is one."""
+    if index is not None:
+        return [(name, e.is_dir) for name, e in index.listdir(folder.relative_to(ROOT).as_posix()).items()]
+    entries = []
+    with os.scandir(folder) as it:
+        for e in it:
+            if e.is_dir(follow_symlinks=False):
+                entries.append((e.name, True))
+            elif e.is_file():
+                entries.append((e.name, False))
+    return entries
 
-def main():
-    if not PROJECTS_DIR.exists():
-        print("❌ works/projects not found")
-        return
+def walk_folders(base: Path, index: SiteIndex | None = None):
+    """Yield (folder, [file names]) for base and every non-hidden subfolder."""
+    stack = [base]
+    while stack:
+        current = stack.pop()
+        names = []
+        for name, is_dir in list_entries(current, index):
+            if not is_dir:
+                names.append(name)
+            elif not name.startswith("."):
+                stack.append(current / name)
+        yield current, sorted(names)
 
-    # Map for updating HTML references: "img/01.jpg" -> "img/001.jpg" (case-insensitive ext handled)
-    ref_map = {}
+def choose_width(prefix: str, widths: list[int], needed: int, forced: int | None) -> int:
+    if forced:
+        return max(forced, needed)
+    if not prefix:
+        return max(BARE_MIN_WIDTH, needed, *widths)
+    counts = Counter(widths)
+    # 文件夹里最常见的位数（平局取更宽的），但至少要放得下最大的编号
+    usual = max(counts, key=lambda w: (counts[w], w))
+    return max(usual, needed)
 
-    renamed_total = 0
-    updated_html = 0
+def plan_folder(folder: Path, names: list[str], compact: bool, forced_width: int | None) -> list[tuple[str, str]]:
+    """[(old name, new name)] for one folder; only names that actually change."""
+    groups: dict[str, list[tuple[str, re.Match]]] = {}
+    for name in names:
+        m = NUMBERED_RE.fullmatch(name)
+        if m:
+            groups.setdefault((m.group("prefix") or ""), []).append((name, m))
 
-    for slug in sorted(TARGET_SLUGS):
-        proj = PROJECTS_DIR / slug
-        img_dir = proj / "img"
-        if not img_dir.exists():
-            print(f"⚠️ Skip (no img dir): {slug}")
+    renames = []
+    for prefix, items in groups.items():
+        sources = [(n, m) for n, m in items if not m.group("rendition")]
+        if not sources:
             continue
+        numbers = sorted({int(m.group("num")) for _n, m in sources})
+        new_number = {v: i for i, v in enumerate(numbers, 1)} if compact else {v: v for v in numbers}
+        needed = len(str(max(new_number.values())))
+        width = choose_width(prefix, [len(m.group("num")) for _n, m in sources], needed, forced_width)
+        for name, m in items:
+            value = int(m.group("num"))
+            if value not in new_number:
+                continue  # 孤立的 rendition（源文件已不在）：不动
+            new = f"{prefix}{new_number[value]:0{width}d}{m.group('rendition') or ''}.{m.group('ext').lower()}"
+            if new != name:
+                renames.append((name, new))
+    return renames
 
-        # 1) 收集需要改名的两位编号文件：01.jpg, 02.png ...
-        to_rename = []
-        for p in img_dir.iterdir():
-            if not p.is_file():
+def build_plan(project_dirs: list[Path], compact: bool, forced_width: int | None,
+               index: SiteIndex | None = None) -> list[dict]:
+    """
+    Full plan across projects. Raises PlanError listing every collision; nothing has moved yet.
+    With index the folders are listed from the snapshot instead of the disk.
+    """
+    plan = []
+    problems = []
+    for proj in project_dirs:
+        img_dir = proj / "img"
+        if index is not None:
+            entry = index.entries.get(img_dir.relative_to(ROOT).as_posix())
+            if entry is None or not entry.is_dir:
                 continue
-            if p.suffix not in IMG_EXTS:
+        elif not img_dir.is_dir():
+            continue
+        for folder, names in walk_folders(img_dir, index):
+            renames = plan_folder(folder, names, compact, forced_width)
+            if not renames:
                 continue
-            m = re.fullmatch(r"(\d{2})\.(jpg|jpeg|png|webp|JPG|JPEG|PNG|WEBP)", p.name)
-            if m:
-                num2 = m.group(1)             # "01"
-                ext = m.group(2)              # "jpg"/"png"...
-                num3 = num2.zfill(3)          # "001"
-                new_name = f"{num3}.{ext.lower()}"
-                to_rename.append((p, new_name))
-
-                # 建立 HTML 引用替换表（尽量覆盖各种扩展写法）
-                # 例如 img/01.jpg -> img/001.jpg
-                ref_map[f"img/{num2}.jpg"] = f"img/{num3}.jpg"
-                ref_map[f"img/{num2}.jpeg"] = f"img/{num3}.jpeg"
-                ref_map[f"img/{num2}.png"] = f"img/{num3}.png"
-                ref_map[f"img/{num2}.webp"] = f"img/{num3}.webp"
-
-        if not to_rename:
-            print(f"— No 2-digit gallery files to rename: {slug}")
+            moving = {old for old, _new in renames}
+            staying = {n.lower(): n for n in names if n not in moving}
+            seen: dict[str, str] = {}
+            for old, new in renames:
+                key = new.lower()  # macOS 默认不区分大小写：按小写查冲突
+                if key in seen:
+                    problems.append(f"{folder.relative_to(ROOT)}: {seen[key]} and {old} would both become {new}")
+                elif key in staying:
+                    problems.append(f"{folder.relative_to(ROOT)}: {old} -> {new}, but {staying[key]} already exists")
+                seen[key] = old
+            for i, (old, new) in enumerate(renames):
+                rel = folder.relative_to(ROOT).as_posix()
+                plan.append({
+                    "src": f"{rel}/{old}",
+                    "tmp": f"{rel}/{TEMP_PREFIX}{len(plan)}-{old}",
+                    "dst": f"{rel}/{new}",
+                })
+    if problems:
+        raise PlanError("\n".join(problems))
+    return plan
+
+class PlanRewriter:
+    """
+    The whole plan as one matcher for every page: a URL token whose last segment
+    is a renamed file name is resolved against the page's folder and looked up by
+    site-relative path (ASCII case-insensitive). Only the file name is replaced,
+    so the reference keeps the form the page wrote it in.
+    """
+
+    def __init__(self, plan: list[dict]):
+        # 改名都在同一个文件夹里，所以只换最后一段
+        self.renames = {s["src"].translate(ASCII_FOLD): posixpath.basename(s["dst"]) for s in plan}
+        names = {posixpath.basename(s["src"]).translate(ASCII_FOLD) for s in plan}
+        with profiling.span("compile", keys=len(names)):
+            pattern = rf"{REF_START}(?P<dir>[^\s\"'(),?#<>=]*/)?(?:{trie_pattern(names)}){REF_END}"
+            self.regex = re.compile(pattern, re.IGNORECASE | re.ASCII) if plan else None
+
+    def rewrite(self, text: str, page_dir: str) -> tuple[str, int]:
+        """(new text, number of references replaced) for a page in page_dir (site-relative)."""
+        if self.regex is None:
+            return text, 0
+        count = 0
+
+        def repl(m: re.Match) -> str:
+            nonlocal count
+            ref = m.group(0)
+            base = "" if ref.startswith("/") else page_dir
+            new = self.renames.get(posixpath.normpath(posixpath.join(base, ref.lstrip("/"))).translate(ASCII_FOLD))
+            if new is None:
+                return ref
+            count += 1
+            return (m.group("dir") or "") + new
+
+        with profiling.span("match", chars=len(text)):
+            new_text = self.regex.sub(repl, text)
+        return new_text, count
+
+def apply_plan(batch: Batch, plan: list[dict], index: SiteIndex | None = None) -> int:
+    """Run (or finish) the renames and page updates. Safe to call again on a half-done batch."""
+    with profiling.span("rename", files=len(plan)):
+        phase1 = [(ROOT / s["src"], ROOT / s["tmp"]) for s in plan if (ROOT / s["src"]).exists() and not (ROOT / s["tmp"]).exists()]
+        if phase1:
+            batch.rename_many(phase1)
+        phase2 = [(ROOT / s["tmp"], ROOT / s["dst"]) for s in plan if (ROOT / s["tmp"]).exists()]
+        if phase2:
+            batch.rename_many(phase2)
+
+    # 续跑时已经改过的页面不能再改一次（--compact 时 2->1、3->2 会连锁）
+    done_pages = {op["path"] for op in batch.ops if op["op"] == "write"}
+    rewriter = PlanRewriter(plan)
+    updated = 0
+    for page in site_html_files(index):
+        rel = page.relative_to(ROOT).as_posix()
+        if rel in done_pages:
             continue
+        with profiling.span("rewrite", page=rel):
+            text = page.read_text(encoding="utf-8")
+            new, hits = rewriter.rewrite(text, posixpath.dirname(rel))
+            if new != text:
+                batch.write_text(page, new)
+                updated += 1
+                print(f"   ✅ Updated {rel} ({hits} reference(s))")
+    return updated
 
-        # 2) 两阶段改名避免冲突：先改成临时名，再改成最终名
-        temp_pairs = []
-        for old_path, new_name in to_rename:
-            tmp = old_path.with_name(f"__tmp__{old_path.name}")
-            old_path.rename(tmp)
-            temp_pairs.append((tmp, img_dir / new_name))
-
-        for tmp, final in temp_pairs:
-            # 如果最终名已经存在，避免覆盖：加后缀 _dup
-            if final.exists():
-                final = final.with_name(final.stem + "_dup" + final.suffix)
-            tmp.rename(final)
-            renamed_total += 1
-
-        print(f"✅ Renamed gallery files to 3-digit: {slug} ({len(temp_pairs)} files)")
-
-        # 3) 更新该项目的 index.html 里对 img/01.jpg 这类引用
-        index_html = proj / "index.html"
-        if index_html.exists():
-            text = index_html.read_text(encoding="utf-8")
-            original = text
-
-            # 只替换 img/NN.ext 形式（简单稳妥）
-            for old, new in ref_map.items():
-                # 同时兼容大小写（把常见四种都替换一次）
-                text = text.replace(old, new)
-                text = text.replace(old.upper(), new)
-                text = text.replace(old.replace("img/", "img/").title(), new)
-
-            if text != original:
-                bak = backup(index_html)
-                index_html.write_text(text, encoding="utf-8")
-                updated_html += 1
-                print(f"   ✅ Updated index.html refs (backup: {bak.name})")
-        else:
-            print(f"⚠️ No index.html to update refs: {slug}")
+def print_plan(plan: list[dict]) -> None:
+    by_folder: dict[str, list[dict]] = {}
+    for step in plan:
+        by_folder.setdefault(posixpath.dirname(step["src"]), []).append(step)
+    for folder, steps in by_folder.items():
+        print(f"\n{folder}  ({len(steps)} file(s))")
+        for step in steps[:8]:
+            print(f"  {posixpath.basename(step['src'])} -> {posixpath.basename(step['dst'])}")
+        if len(steps) > 8:
+            print(f"  ... and {len(steps) - 8} more")
+
+def run_normalize(slugs: list[str] | None = None, compact: bool = False, width: int | None = None,
+                  dry_run: bool = False, index: SiteIndex | None = None) -> str | None:
+    """
+    main() without the CLI (site_pipeline.py passes its SiteIndex so nothing is walked again).
+    Raises PlanError on collisions, before anything moves. Returns the journal batch id, if any.
+    """
+    projects = list_project_folders(PROJECTS_DIR, index)
+    if slugs:
+        projects = [p for p in projects if p.name in set(slugs)]
+    with profiling.span("plan"):
+        plan = build_plan(projects, compact, width, index)
+
+    if not plan:
+        print("— Gallery numbering is already consistent.")
+        return None
+    print_plan(plan)
+    if dry_run:
+        print(f"\n(dry run) {len(plan)} file(s) would be renamed.")
+        return None
+
+    with Batch(SCRIPT) as batch:
+        batch.save_json("plan", plan)
+        updated = apply_plan(batch, plan, index)
 
     print("\nDone.")
-    print(f"- Total renamed files: {renamed_total}")
-    print(f"- Project pages updated: {updated_html}")
+    print(f"- Total renamed files: {len(plan)}")
+    print(f"- Pages updated: {updated}")
+    print(f"- Undo: python3 site_journal.py undo {batch.id}")
+    return batch.id
+
+def main():
+    ap = argparse.ArgumentParser(description="Renumber gallery files in every project (two-phase, journaled, pages updated).")
+    ap.add_argument("slugs", nargs="*", help="Only these projects (default: all)")
+    ap.add_argument("--compact", action="store_true", help="Also close gaps in the numbering")
+    ap.add_argument("--width", type=int, help="Force this many digits everywhere")
+    ap.add_argument("--dry-run", action="store_true", help="Show the plan, change nothing")
+    ap.add_argument("--resume", metavar="BATCH_ID", help="Finish a batch an interrupted run left open")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "normalize_gallery_numbers")
+
+    if args.resume:
+        plan = load_batch_json(args.resume, "plan")
+        batch = Batch.reopen(args.resume)
+        with batch:
+            updated = apply_plan(batch, plan)
+        print(f"\n✅ Resumed {args.resume}: {len(plan)} rename(s) in place, {updated} page(s) updated now")
+        return
+
+    if not PROJECTS_DIR.exists():
+        print("❌ works/projects not found")
+        return
+
+    try:
+        run_normalize(args.slugs, args.compact, args.width, args.dry_run)
+    except PlanError as e:
+        print("❌ Collisions found; nothing was renamed:")
+        for line in str(e).splitlines():
+            print(f"  - {line}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
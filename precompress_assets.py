@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Write style.css.gz / style.css.br (etc.) next to every text asset, so the CDN and
+serve_site.py can send them as they are instead of compressing on each miss.
+
+  - gzip at level 9 (mtime 0, so the output only depends on the content)
+  - brotli at quality 11 when the brotli module is installed (pip install brotli)
+  - a variant that doesn't save at least --min-savings percent is not written
+    (and an old one is removed), so tiny files stay uncompressed
+  - inbox/precompress_cache.json keeps each source's sha256: unchanged files
+    (even if touched) are skipped; variants of deleted sources are removed
+  - files are compressed on a process pool
+"""
+
+from pathlib import Path
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import profiling
+from site_index import UNPUBLISHED_PREFIXES, SiteIndex
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖
+    brotli = None
+
+ROOT = Path(".").resolve()
+CACHE_PATH = ROOT / "inbox" / "precompress_cache.json"
+TEXT_EXTS = {".html", ".css", ".js", ".mjs", ".svg", ".json", ".xml", ".txt", ".webmanifest", ".map"}
+MIN_SAVINGS = 10  # 百分比
+VARIANT_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+def available_encodings() -> list[str]:
+    return ["gzip", "br"] if brotli is not None else ["gzip"]
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+def write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def compress_file(rel: str, encodings: list[str], min_savings: int) -> tuple[str, str, dict]:
+    """Worker: write the variants that are worth it, remove the ones that aren't. Runs in a child process."""
+    src = ROOT / rel
+    data = src.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    variants = {}
+    for enc in encodings:
+        out = src.with_name(src.name + VARIANT_SUFFIXES[enc])
+        packed = compress(data, enc)
+        saved = 100 * (1 - len(packed) / len(data)) if data else 0
+        if saved >= min_savings:
+            write_atomic(out, packed)
+            variants[enc] = len(packed)
+        else:
+            variants[enc] = None
+            if out.exists():
+                out.unlink()
+    return rel, digest, variants
+
+def load_cache() -> dict:
+    if not CACHE_PATH.exists():
+        return {}
+    try:
+        return json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache: dict) -> None:
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(CACHE_PATH, json.dumps(cache, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8"))
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def variants_present(rel: str, entry: dict) -> bool:
+    return all(
+        (ROOT / (rel + VARIANT_SUFFIXES[enc])).exists()
+        for enc, size in entry["variants"].items()
+        if size is not None
+    )
+
+def run_precompress(jobs: int = 1, min_savings: int = MIN_SAVINGS, force: bool = False,
+                    index: SiteIndex | None = None, only: set[str] | None = None) -> dict:
+    """
+    Compress what changed. Returns counts. watch_site.py passes its index and the
+    paths it knows changed (only); every other file keeps its cache entry unchecked.
+    """
+    encodings = available_encodings()
+    settings = {"encodings": encodings, "min_savings": min_savings}
+    cache = load_cache()
+    if cache.get("settings") != settings:
+        force = True
+    old_files = cache.get("files", {})
+
+    if index is None:
+        index = SiteIndex(ROOT)
+        index.scan()
+    candidates = index.entries.items() if only is None or force else \
+        ((rel, index.entries[rel]) for rel in only if rel in index.entries)
+    sources = {
+        rel: e for rel, e in candidates
+        if not e.is_dir and os.path.splitext(rel)[1].lower() in TEXT_EXTS and not rel.startswith(UNPUBLISHED_PREFIXES)
+    }
+
+    # 只看 only 里的路径时，其余还在的文件缓存原样保留
+    files = {} if only is None or force else \
+        {rel: entry for rel, entry in old_files.items() if rel not in only and rel in index.entries}
+    todo = []
+    for rel, e in sorted(sources.items()):
+        entry = old_files.get(rel)
+        if not force and entry and entry["variants"].keys() == set(encodings) and variants_present(rel, entry):
+            if entry["size"] == e.size and entry["mtime_ns"] == e.mtime_ns:
+                files[rel] = entry
+                continue
+            # 只是 touch 过：内容没变就不用重新压缩
+            if sha256_file(ROOT / rel) == entry["sha256"]:
+                # 压缩件的 mtime 跟上源文件，否则 serve_site.py 会把它们当成过期的
+                for enc, size in entry["variants"].items():
+                    if size is not None:
+                        os.utime(ROOT / (rel + VARIANT_SUFFIXES[enc]), ns=(e.mtime_ns, e.mtime_ns))
+                files[rel] = dict(entry, size=e.size, mtime_ns=e.mtime_ns)
+                continue
+        todo.append(rel)
+
+    original = compressed = 0
+    if todo:
+        items = [(rel, encodings, min_savings) for rel in todo]
+        if jobs > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as ex:
+                results = list(ex.map(compress_file, *zip(*items), chunksize=8))
+        else:
+            results = [compress_file(*item) for item in items]
+        for rel, digest, variants in results:
+            e = sources[rel]
+            files[rel] = {"sha256": digest, "size": e.size, "mtime_ns": e.mtime_ns, "variants": variants}
+            original += e.size
+            best = min((v for v in variants.values() if v is not None), default=e.size)
+            compressed += best
+            kept = ", ".join(f"{enc} {v / 1024:.1f} KB" for enc, v in variants.items() if v is not None)
+            print(f"✅ {rel}: {e.size / 1024:.1f} KB -> {kept or 'not worth compressing'}")
+
+    # 源文件没了：它的压缩件也删掉
+    removed = 0
+    for rel, entry in old_files.items():
+        if rel in files:
+            continue
+        for enc, size in entry["variants"].items():
+            out = ROOT / (rel + VARIANT_SUFFIXES[enc])
+            if size is not None and out.exists():
+                out.unlink()
+                removed += 1
+
+    save_cache({"settings": settings, "files": files})
+    stats = {"sources": len(sources), "compressed": len(todo), "unchanged": len(sources) - len(todo), "removed": removed}
+    saved = f" | saved {100 * (1 - compressed / original):.0f}% on what changed" if original else ""
+    print(f"Text assets: {stats['sources']} | compressed: {stats['compressed']} | unchanged: {stats['unchanged']} | stale variants removed: {removed}{saved}")
+    return stats
+
+def main():
+    ap = argparse.ArgumentParser(description="Write .gz (and .br) variants next to every text asset, incrementally.")
+    ap.add_argument("--min-savings", type=int, default=MIN_SAVINGS, help=f"Only keep variants at least this many percent smaller (default: {MIN_SAVINGS})")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (default: 0 = one per CPU)")
+    ap.add_argument("--force", action="store_true", help="Recompress everything")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "precompress_assets")
+
+    if brotli is None:
+        print("ℹ️  brotli not installed: writing .gz only (pip install brotli for .br).")
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    run_precompress(jobs, args.min_savings, args.force)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Opt-in profiling for the site scripts: named spans, filesystem call counts,
+bytes read / written, a Chrome trace and a summary table.
+
+Every script with a main() takes --profile:
+
+  python3 audit_projects.py --profile                 -> inbox/profiles/audit_projects-<time>.trace.json
+  python3 build_site.py --profile /tmp/build.json     -> that file
+
+Open the trace in chrome://tracing or https://ui.perfetto.dev. The summary
+(per span: calls, total / mean / max time, filesystem calls, bytes) goes to
+stderr when the script exits. Code marks the interesting parts with
+
+    with profiling.span("audit_one", project=slug):
+        ...
+
+which is a shared no-op object until --profile turns profiling on, so the
+spans cost nothing in normal runs.
+
+While profiling, os.stat / scandir / listdir / open / replace / rename / ...
+and open() are wrapped to count calls per function. Bytes and read / write
+syscalls come from /proc/self/io (Linux; whole process, all threads), so
+they cover C code (zlib, sqlite, Pillow) too. Worker processes are not
+traced; their time shows up in the span that waits for them.
+
+Any script can also be run under it without --profile support:
+
+  python3 profiling.py [-o TRACE.json] SCRIPT.py [ARGS...]
+"""
+
+from pathlib import Path
+import argparse
+import atexit
+import builtins
+import contextlib
+import functools
+import io
+import json
+import os
+import resource
+import runpy
+import sys
+import threading
+import time
+from datetime import datetime
+
+ROOT = Path(".").resolve()
+PROFILES_DIR = ROOT / "inbox" / "profiles"
+# 文件系统相关的调用：打开 --profile 时包一层计数
+FS_CALLS = ("stat", "lstat", "scandir", "listdir", "open", "replace", "rename", "link", "unlink", "mkdir",
+            "rmdir", "fsync", "utime", "chmod", "copy_file_range", "sendfile")
+IO_FIELDS = ("rchar", "wchar", "syscr", "syscw")
+MAX_EVENTS = 200_000  # 再多 trace 文件就太大了；之后只汇总不记事件
+
+_NULL = contextlib.nullcontext()
+_state = None
+
+class _State:
+    def __init__(self, script: str, trace_path: Path):
+        self.script = script
+        self.trace_path = trace_path
+        self.pid = os.getpid()
+        self.t0 = time.perf_counter_ns()
+        self.events: list[dict] = []
+        self.dropped = 0
+        self.totals: dict[str, list] = {}  # name -> [calls, ns, max ns, fs calls, rchar, wchar]
+        self.fs_counts = dict.fromkeys(FS_CALLS, 0)
+        self.fs_counts["open()"] = 0
+        self.patched: list[tuple[object, str, object]] = []
+        self.lock = threading.Lock()
+        try:
+            self.io_fd = os.open("/proc/self/io", os.O_RDONLY)
+        except OSError:
+            self.io_fd = None  # 不是 Linux：只有调用次数，没有字节数
+
+    def io(self) -> list[int]:
+        if self.io_fd is None:
+            return [0, 0, 0, 0]
+        values = {}
+        for line in os.pread(self.io_fd, 4096, 0).decode("ascii").splitlines():
+            key, _sep, value = line.partition(":")
+            values[key] = int(value)
+        return [values.get(k, 0) for k in IO_FIELDS]
+
+    def fs_total(self) -> int:
+        return sum(self.fs_counts.values())
+
+class _Span:
+    __slots__ = ("name", "args", "start", "fs", "io")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.fs = _state.fs_total()
+        self.io = _state.io()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        st = _state
+        if st is None:
+            return False
+        io_end = st.io()
+        fs = st.fs_total() - self.fs
+        rchar, wchar, syscr, syscw = (b - a for a, b in zip(self.io, io_end))
+        dur = end - self.start
+        with st.lock:
+            t = st.totals.setdefault(self.name, [0, 0, 0, 0, 0, 0])
+            t[0] += 1
+            t[1] += dur
+            t[2] = max(t[2], dur)
+            t[3] += fs
+            t[4] += rchar
+            t[5] += wchar
+            if len(st.events) < MAX_EVENTS:
+                args = {k: v if isinstance(v, (int, float, bool)) or v is None else str(v) for k, v in self.args.items()}
+                args.update(fs_calls=fs, read_bytes=rchar, written_bytes=wchar, read_calls=syscr, write_calls=syscw)
+                st.events.append({
+                    "name": self.name, "cat": st.script, "ph": "X",
+                    "ts": (self.start - st.t0) / 1000, "dur": dur / 1000,
+                    "pid": st.pid, "tid": threading.get_native_id(), "args": args,
+                })
+            else:
+                st.dropped += 1
+        return False
+
+def span(name: str, **args):
+    """Context manager timing one named piece of work; a no-op unless profiling is on."""
+    if _state is None:
+        return _NULL
+    return _Span(name, args)
+
+def traced(name: str | None = None):
+    """Decorator form of span() (span name defaults to the function name)."""
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*a, **kw):
+            if _state is None:
+                return fn(*a, **kw)
+            with _Span(label, {}):
+                return fn(*a, **kw)
+        return inner
+    return wrap
+
+def enabled() -> bool:
+    return _state is not None
+
+def _counting(fn, key: str):
+    counts = _state.fs_counts
+
+    @functools.wraps(fn)
+    def inner(*a, **kw):
+        counts[key] += 1
+        return fn(*a, **kw)
+    return inner
+
+def _patch(owner, attr: str, key: str) -> None:
+    original = getattr(owner, attr, None)
+    if original is None:
+        return
+    wrapper = _counting(original, key)
+    setattr(owner, attr, wrapper)
+    _state.patched.append((owner, attr, original))
+    # shutil / pathlib 用 "os.stat in os.supports_fd" 之类判断能力，包装后的函数也要在里面
+    if owner is os:
+        for name in ("supports_fd", "supports_dir_fd", "supports_follow_symlinks", "supports_effective_ids"):
+            group = getattr(os, name, None)
+            if isinstance(group, set) and original in group:
+                group.add(wrapper)
+
+def add_argument(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--profile", nargs="?", const="", default=None, metavar="TRACE.json",
+                    help=f"Time spans, count filesystem calls and bytes; write a Chrome trace "
+                         f"(default: {PROFILES_DIR.relative_to(ROOT)}/<script>-<time>.trace.json) and print a summary")
+
+def start(profile: str | None, script: str) -> None:
+    """Turn profiling on if --profile was given (profile is its value: None = off, '' = default path)."""
+    global _state
+    if profile is None or _state is not None:
+        return
+    path = Path(profile) if profile else PROFILES_DIR / f"{script}-{datetime.now():%Y%m%d-%H%M%S}.trace.json"
+    _state = _State(script, path.resolve())
+    for attr in FS_CALLS:
+        _patch(os, attr, attr)
+    _patch(builtins, "open", "open()")
+    _patch(io, "open", "open()")
+    root = _Span(script, {"argv": " ".join(sys.argv[1:])})
+    root.__enter__()
+    atexit.register(_finish, root)
+
+def _finish(root: _Span) -> None:
+    global _state
+    st = _state
+    if st is None:
+        return
+    root.__exit__(None, None, None)
+    for owner, attr, original in reversed(st.patched):
+        setattr(owner, attr, original)
+    _state = None
+    if st.io_fd is not None:
+        os.close(st.io_fd)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    trace = {
+        "traceEvents": [
+            {"name": "process_name", "ph": "M", "pid": st.pid, "args": {"name": st.script}},
+            *sorted(st.events, key=lambda e: e["ts"]),
+        ],
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "script": st.script,
+            "argv": sys.argv,
+            "cpu_user_s": usage.ru_utime,
+            "cpu_system_s": usage.ru_stime,
+            "peak_rss_kb": usage.ru_maxrss,
+            "fs_calls": {k: v for k, v in st.fs_counts.items() if v},
+            "dropped_events": st.dropped,
+        },
+    }
+    st.trace_path.parent.mkdir(parents=True, exist_ok=True)
+    st.trace_path.write_text(json.dumps(trace, ensure_ascii=False), encoding="utf-8")
+    print_summary(st, usage, sys.stderr)
+
+def print_summary(st: _State, usage, out) -> None:
+    wall = st.totals.get(st.script, [0, 0])[1] or 1
+    print(f"\n── profile: {st.script} ──", file=out)
+    print(f"{'span':<28} {'calls':>8} {'total s':>9} {'%':>6} {'mean ms':>9} {'max ms':>9} {'fs calls':>9} {'read KB':>10} {'write KB':>10}", file=out)
+    for name, (calls, ns, peak, fs, rchar, wchar) in sorted(st.totals.items(), key=lambda kv: -kv[1][1]):
+        print(f"{name[:28]:<28} {calls:>8} {ns / 1e9:>9.3f} {100 * ns / wall:>5.1f}% {ns / calls / 1e6:>9.3f} {peak / 1e6:>9.3f}"
+              f" {fs:>9} {rchar / 1024:>10.1f} {wchar / 1024:>10.1f}", file=out)
+    calls = ", ".join(f"{k} {v}" for k, v in sorted(st.fs_counts.items(), key=lambda kv: -kv[1]) if v)
+    print(f"filesystem calls: {calls or 'none'}", file=out)
+    print(f"CPU user {usage.ru_utime:.3f}s system {usage.ru_stime:.3f}s | peak RSS {usage.ru_maxrss / 1024:.1f} MB", file=out)
+    if st.dropped:
+        print(f"⚠️ {st.dropped} span(s) past {MAX_EVENTS} were only counted, not put in the trace", file=out)
+    print(f"✅ Trace: {st.trace_path}", file=out)
+
+def main():
+    ap = argparse.ArgumentParser(description="Run a script with profiling on (spans, filesystem calls, Chrome trace).")
+    ap.add_argument("--output", "-o", default="", metavar="TRACE.json", help="Trace file (default: inbox/profiles/<script>-<time>.trace.json)")
+    ap.add_argument("script", help="Python script to run")
+    ap.add_argument("args", nargs=argparse.REMAINDER, help="Its arguments")
+    args = ap.parse_args()
+
+    # 脚本里的 "import profiling" 要拿到这个（已经打开的）模块，而不是再载入一份
+    sys.modules["profiling"] = sys.modules[__name__]
+    path = Path(args.script)
+    sys.argv = [str(path), *args.args]
+    sys.path.insert(0, str(path.resolve().parent))
+    start(args.output, path.stem)
+    runpy.run_path(str(path), run_name="__main__")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Rewrite many old -> new references in one pass over every page.
+
+The mapping is compiled once into a trie, and the trie is emitted as a single
+regular expression with shared prefixes factored out
+(works/work-(?:one|t(?:wo|hree))/index\\.html). Scanning a page is then one
+left-to-right pass in the C regex engine, whatever the number of mappings:
+
+  - leftmost-longest: "img/01.jpg" and "img/01.jpg.bak" never fight
+  - no chaining: replaced text is never re-scanned, so a -> b, b -> c turns a into b
+  - ignore_case folds ASCII only, so match offsets never shift (.JPG == .jpg)
+  - refs_only matches whole URL tokens only (between quotes, spaces, commas,
+    parentheses, ?/#), so "img/1.jpg" leaves "../other/img/1.jpg" alone
+
+CLI (pages default to every *.html in the site, templates/ excluded):
+  python3 ref_rewriter.py --map map.json [--ignore-case] [--dry-run] [-j N] [PAGE...]
+
+map.json is {"old": "new", ...}. --dry-run prints a unified diff and writes nothing;
+otherwise changes go through one site_journal batch.
+"""
+
+from pathlib import Path
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import profiling
+from site_index import SiteIndex
+from site_journal import Batch
+
+ROOT = Path(".").resolve()
+PAGE_SKIP_PREFIXES = ("templates/",)
+ASCII_FOLD = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+# URL 在 HTML/CSS 里的左右边界：引号、空白、逗号（srcset）、括号（url()）、= 以及 ?#（查询串/锚点）
+REF_START = r"(?<![^\s\"'(,=])"
+REF_END = r"(?![^\s\"'),?#<>])"
+
+def _trie_regex(node: dict) -> str:
+    """node: {char: child, "": True if a key ends here} -> regex matching the longest key first."""
+    end = "" in node
+    branches = []
+    for ch in sorted(k for k in node if k):
+        child = node[ch]
+        # 单链压成一段字面量，少一层分组
+        literal = ch
+        while len(child) == 1 and "" not in child:
+            (nxt, child), = child.items()
+            literal += nxt
+        branches.append(re.escape(literal) + _trie_regex(child))
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if end:
+        # 贪婪的可选组：能继续匹配更长的 key 就继续，否则在这里结束
+        return f"(?:{body})?"
+    return body
+
+def trie_pattern(keys) -> str:
+    """Regex source matching any of keys (longest first), shared prefixes factored out."""
+    trie: dict = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    return _trie_regex(trie)
+
+class RefRewriter:
+    """Compiled old -> new mapping. Cheap to pickle (only the pattern text and the dict travel)."""
+
+    def __init__(self, mapping: dict[str, str], ignore_case: bool = False, refs_only: bool = False):
+        self.ignore_case = ignore_case
+        self.mapping = {}
+        for old, new in mapping.items():
+            if not old:
+                continue
+            key = old.translate(ASCII_FOLD) if ignore_case else old
+            self.mapping.setdefault(key, new)
+        flags = re.IGNORECASE | re.ASCII if ignore_case else 0
+        with profiling.span("compile", keys=len(self.mapping)):
+            pattern = trie_pattern(self.mapping)
+            if refs_only:
+                pattern = f"{REF_START}(?:{pattern}){REF_END}"
+            self.regex = re.compile(pattern, flags) if self.mapping else None
+
+    def __getstate__(self):
+        return {"ignore_case": self.ignore_case, "mapping": self.mapping,
+                "pattern": self.regex.pattern if self.regex else None}
+
+    def __setstate__(self, state):
+        self.ignore_case = state["ignore_case"]
+        self.mapping = state["mapping"]
+        flags = re.IGNORECASE | re.ASCII if self.ignore_case else 0
+        self.regex = re.compile(state["pattern"], flags) if state["pattern"] else None
+
+    def rewrite(self, text: str) -> tuple[str, int]:
+        """(new text, number of replacements)."""
+        if self.regex is None:
+            return text, 0
+        count = 0
+        fold = self.ignore_case
+
+        def repl(m: re.Match) -> str:
+            nonlocal count
+            count += 1
+            found = m.group(0)
+            return self.mapping[found.translate(ASCII_FOLD) if fold else found]
+
+        with profiling.span("match", chars=len(text)):
+            new = self.regex.sub(repl, text)
+        return new, count
+
+def site_html_files(index: SiteIndex | None = None) -> list[Path]:
+    """Every *.html page under the site root (one SiteIndex scan), templates/ excluded."""
+    if index is None:
+        index = SiteIndex(ROOT)
+        index.scan()
+    return [
+        ROOT / rel for rel in sorted(index.entries)
+        if rel.lower().endswith(".html") and not index.entries[rel].is_dir and not rel.startswith(PAGE_SKIP_PREFIXES)
+    ]
+
+# ---------- worker side ----------
+_REWRITER: RefRewriter | None = None
+
+def _init_worker(rewriter: RefRewriter) -> None:
+    global _REWRITER
+    _REWRITER = rewriter
+
+def _rewrite_file(path: str) -> tuple[str, str | None, str | None, int]:
+    """Worker: (path, original, new) when something changed, else (path, None, None, 0)."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    with profiling.span("rewrite", page=os.path.basename(path)):
+        new, count = _REWRITER.rewrite(text)
+    if new == text:
+        return path, None, None, 0
+    return path, text, new, count
+
+def rewrite_files(rewriter: RefRewriter, paths: list[Path], script: str, jobs: int = 1,
+                  dry_run: bool = False) -> tuple[int, int, str | None]:
+    """
+    Rewrite paths (in parallel when jobs > 1). dry_run prints unified diffs instead of writing.
+    Returns (files changed, replacements, journal batch id or None).
+    """
+    items = [str(p) for p in paths]
+    if jobs > 1 and len(items) > 1:
+        ex = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(rewriter,))
+        results = ex.map(_rewrite_file, items, chunksize=16)
+    else:
+        ex = None
+        _init_worker(rewriter)
+        results = map(_rewrite_file, items)
+
+    changed = 0
+    total = 0
+    try:
+        with Batch(script) as batch:
+            for path, old, new, count in results:
+                if new is None:
+                    continue
+                changed += 1
+                total += count
+                rel = Path(path).relative_to(ROOT).as_posix()
+                if dry_run:
+                    sys.stdout.writelines(difflib.unified_diff(
+                        old.splitlines(keepends=True), new.splitlines(keepends=True),
+                        fromfile=f"a/{rel}", tofile=f"b/{rel}",
+                    ))
+                else:
+                    batch.write_text(Path(path), new)
+                    print(f"✅ Updated: {rel}  (replacements: {count})")
+    finally:
+        if ex is not None:
+            ex.shutdown()
+    return changed, total, batch.id
+
+def main():
+    ap = argparse.ArgumentParser(description="Apply an old -> new reference map to every HTML page in one pass.")
+    ap.add_argument("--map", required=True, help='JSON file: {"old": "new", ...}')
+    ap.add_argument("--ignore-case", action="store_true", help="Match old strings case-insensitively (ASCII)")
+    ap.add_argument("--dry-run", action="store_true", help="Print a unified diff, write nothing")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (default: 0 = one per CPU)")
+    ap.add_argument("pages", nargs="*", help="Only these files (default: every *.html in the site)")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "ref_rewriter")
+
+    mapping = json.loads(Path(args.map).read_text(encoding="utf-8"))
+    rewriter = RefRewriter(mapping, args.ignore_case)
+    pages = [(ROOT / p).resolve() for p in args.pages] if args.pages else site_html_files()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    changed, total, batch_id = rewrite_files(rewriter, pages, "ref_rewriter", jobs, args.dry_run)
+    print(f"\nPages: {len(pages)} | changed: {changed} | replacements: {total}", file=sys.stderr if args.dry_run else sys.stdout)
+    if batch_id:
+        print(f"Undo: python3 site_journal.py undo {batch_id}")
+
+if __name__ == "__main__":
+    main()
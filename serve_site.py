@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local static server that behaves like the production host, for measuring before deploying.
+
+  - ETag + Last-Modified on every file; If-None-Match / If-Modified-Since -> 304
+  - Cache-Control: HTML is revalidated every time; ?v= URLs are immutable; other assets 1 day
+  - precompressed siblings: style.css.br / style.css.gz are sent when the client accepts them
+    (and they are not older than the original); Vary: Accept-Encoding
+  - byte ranges (single range, If-Range) so <video> can seek and stream
+  - HTTP/1.1 keep-alive, files sent with sendfile()
+  - one log line per request: status, bytes on the wire, encoding, time; totals on Ctrl-C
+
+Journal, snapshots (_snapshots/), inbox, .git, templates/, schemas/ and other internal
+folders are not served.
+
+  python3 serve_site.py [--port 8000] [--bind 127.0.0.1] [--log requests.jsonl]
+"""
+
+from pathlib import Path
+import argparse
+import email.utils
+import json
+import mimetypes
+import os
+import posixpath
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import profiling
+from site_index import UNPUBLISHED_PREFIXES, skip_dir
+
+ROOT = Path(".").resolve()
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("video/mp4", ".mp4")
+mimetypes.add_type("font/woff2", ".woff2")
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+# 优先级从高到低：客户端接受哪个就发哪个
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/manifest+json")
+
+CACHE_HTML = "no-cache"
+CACHE_VERSIONED = "public, max-age=31536000, immutable"
+CACHE_ASSET = "public, max-age=86400"
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.by_status: dict[int, int] = {}
+
+    def add(self, status: int, nbytes: int) -> None:
+        with self.lock:
+            self.requests += 1
+            self.bytes += nbytes
+            self.by_status[status] = self.by_status.get(status, 0) + 1
+
+def http_date(ts: float) -> str:
+    return email.utils.formatdate(ts, usegmt=True)
+
+def make_etag(st: os.stat_result, encoding: str | None) -> str:
+    tag = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None | bool:
+    """
+    'bytes=a-b' -> (start, end inclusive). None = ignore the header (serve it all),
+    False = unsatisfiable (416). Multiple ranges are ignored, which HTTP allows.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            n = int(last)
+            if n <= 0:
+                return False
+            return max(0, size - n), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+def cache_control(path: Path, query: str) -> str:
+    if path.suffix.lower() in (".html", ".htm"):
+        return CACHE_HTML
+    if "v=" in query:
+        return CACHE_VERSIONED
+    return CACHE_ASSET
+
+class SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "serve_site"
+    stats: Stats = None
+    log_file = None
+    log_lock = threading.Lock()
+
+    def resolve(self, url_path: str) -> Path | None:
+        path = posixpath.normpath(unquote(url_path))
+        parts = [p for p in path.split("/") if p]
+        if any(p == ".." for p in parts):
+            return None
+        # 小写再比：macOS 的文件系统不分大小写，/Templates/ 也能读到 templates/
+        if any(skip_dir(p.lower()) for p in parts[:-1]) or (parts and parts[-1].startswith(".")):
+            return None  # 日志、快照、.git 等内部文件夹不对外
+        if ("/".join(parts).lower() + "/").startswith(UNPUBLISHED_PREFIXES):
+            return None
+        target = ROOT.joinpath(*parts)
+        if target.is_dir():
+            if not url_path.endswith("/"):
+                return target  # 交给 do_GET 做 301
+            target = target / "index.html"
+        return target
+
+    def pick_encoding(self, target: Path, st: os.stat_result, ctype: str) -> tuple[Path, str | None, os.stat_result]:
+        if not ctype.startswith(COMPRESSIBLE_TYPES):
+            return target, None, st
+        accepted = {p.split(";")[0].strip().lower() for p in self.headers.get("Accept-Encoding", "").split(",")}
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding not in accepted:
+                continue
+            sibling = target.with_name(target.name + suffix)
+            try:
+                sst = sibling.stat()
+            except FileNotFoundError:
+                continue
+            if sst.st_mtime_ns >= st.st_mtime_ns:  # 比原文件旧的压缩件视为过期
+                return sibling, encoding, sst
+        return target, None, st
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def handle_request(self, head: bool) -> None:
+        t0 = time.perf_counter()
+        self._sent = 0
+        self._encoding = None
+        status = self.serve(head)
+        elapsed = (time.perf_counter() - t0) * 1000
+        self.stats.add(status, self._sent)
+        enc = f" {self._encoding}" if self._encoding else ""
+        print(f"{status} {self.command:<4} {self.path}  {self._sent / 1024:.1f} KB{enc}  {elapsed:.1f} ms")
+        if self.log_file:
+            record = {
+                "ts": time.time(), "method": self.command, "path": self.path, "status": status,
+                "bytes": self._sent, "encoding": self._encoding, "ms": round(elapsed, 2),
+                "range": self.headers.get("Range"),
+            }
+            with self.log_lock:
+                self.log_file.write(json.dumps(record) + "\n")
+                self.log_file.flush()
+
+    def send_empty(self, status: int, headers: dict | None = None) -> int:
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return status
+
+    def serve(self, head: bool) -> int:
+        url = urlsplit(self.path)
+        target = self.resolve(url.path)
+        if target is None:
+            return self.send_empty(HTTPStatus.FORBIDDEN)
+        if target.is_dir():
+            return self.send_empty(HTTPStatus.MOVED_PERMANENTLY, {"Location": url.path + "/" + (f"?{url.query}" if url.query else "")})
+        try:
+            st = target.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            return self.send_empty(HTTPStatus.NOT_FOUND)
+
+        ctype = mimetypes.guess_type(target.name)[0] or "application/octet-stream"
+        if ctype.startswith("text/") or ctype == "application/javascript":
+            ctype += "; charset=utf-8"
+        body_path, encoding, bst = self.pick_encoding(target, st, ctype)
+        etag = make_etag(bst, encoding)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": http_date(st.st_mtime),
+            "Cache-Control": cache_control(target, url.query),
+            "Accept-Ranges": "bytes",
+        }
+        if ctype.startswith(COMPRESSIBLE_TYPES):
+            headers["Vary"] = "Accept-Encoding"
+
+        # 条件请求：If-None-Match 优先于 If-Modified-Since
+        inm = self.headers.get("If-None-Match")
+        if inm is not None:
+            if etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*":
+                return self.send_empty(HTTPStatus.NOT_MODIFIED, headers)
+        else:
+            ims = self.headers.get("If-Modified-Since")
+            if ims:
+                try:
+                    since = email.utils.parsedate_to_datetime(ims).timestamp()
+                except (TypeError, ValueError):
+                    since = None
+                if since is not None and int(st.st_mtime) <= since:
+                    return self.send_empty(HTTPStatus.NOT_MODIFIED, headers)
+
+        size = bst.st_size
+        start, end = 0, size - 1
+        status = HTTPStatus.OK
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and encoding is None and (if_range is None or if_range.strip() == etag):
+            r = parse_range(range_header, size)
+            if r is False:
+                return self.send_empty(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, {"Content-Range": f"bytes */{size}"})
+            if r is not None:
+                start, end = r
+                status = HTTPStatus.PARTIAL_CONTENT
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        length = max(0, end - start + 1)
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(length))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+            self._encoding = encoding
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        if head or length == 0:
+            return status
+        with body_path.open("rb") as f:
+            try:
+                self.wfile.flush()
+                self._sent = self.connection.sendfile(f, offset=start, count=length)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # 浏览器拖动进度条时会主动断开
+        return status
+
+    def log_message(self, format, *args):
+        pass  # 用 handle_request 里的一行日志代替默认的访问日志
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve the site locally like production (ETag, ranges, precompressed files, timing log).")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--bind", default="127.0.0.1")
+    ap.add_argument("--log", help="Also append one JSON object per request to this file")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "serve_site")
+
+    SiteHandler.stats = Stats()
+    if args.log:
+        SiteHandler.log_file = open(args.log, "a", encoding="utf-8")
+    server = ThreadingHTTPServer((args.bind, args.port), SiteHandler)
+    server.daemon_threads = True
+    print(f"Serving {ROOT} at http://{args.bind}:{args.port}/  (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        s = SiteHandler.stats
+        codes = ", ".join(f"{k}: {v}" for k, v in sorted(s.by_status.items()))
+        print(f"\nRequests: {s.requests} | sent: {s.bytes / 1e6:.2f} MB | {codes or 'no requests'}")
+        if SiteHandler.log_file:
+            SiteHandler.log_file.close()
+
+if __name__ == "__main__":
+    main()
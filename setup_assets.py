@@ -3,12 +3,23 @@
 
 import argparse
 import csv
+import hashlib
+import os
+import threading
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import shutil
 
+import profiling
+
 MAC_GARBAGE_NAMES = {".DS_Store"}
 MAC_GARBAGE_PREFIXES = ("._",)
+MAC_GARBAGE_DIRS = {"__MACOSX"}
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".tif", ".tiff", ".bmp", ".heic", ".JPG", ".JPEG", ".PNG"}
+INVENTORY_FIELDS = ["filename", "relative_path", "ext", "bytes", "sha256", "crc32", "mtime_ns"]
+CHUNK = 1 << 20
 
 def unzip_images(zip_path: Path, out_dir: Path) -> Path:
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -37,8 +48,7 @@ def clean_macos_artifacts(root: Path) -> None:
                 pass
 
 def write_inventory(images_dir: Path, inventory_csv: Path) -> None:
-    exts = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".tif", ".tiff", ".bmp", ".heic", ".JPG", ".JPEG", ".PNG"}
-    files = [p for p in images_dir.rglob("*") if p.is_file() and p.suffix in exts]
+    files = [p for p in images_dir.rglob("*") if p.is_file() and p.suffix in IMAGE_EXTS]
     files.sort(key=lambda x: x.name.lower())
 
     inventory_csv.parent.mkdir(parents=True, exist_ok=True)
@@ -49,6 +59,170 @@ def write_inventory(images_dir: Path, inventory_csv: Path) -> None:
             rel = p.relative_to(images_dir)
             w.writerow([p.name, str(rel).replace("\\", "/"), p.suffix, p.stat().st_size])
 
+# ---------- streaming ingestion ----------
+# 一次遍历 zip：垃圾文件根本不写出来；多线程解压；边解压边算哈希、记清单；
+# 收件箱里已有的同内容文件（CRC32 一致）直接跳过，zip 变大后重跑只解新文件。
+
+def is_mac_garbage(member_name: str) -> bool:
+    parts = member_name.split("/")
+    name = parts[-1]
+    return (
+        any(part in MAC_GARBAGE_DIRS for part in parts)
+        or name in MAC_GARBAGE_NAMES
+        or name.startswith(MAC_GARBAGE_PREFIXES)
+    )
+
+def safe_member_path(member_name: str) -> str | None:
+    """Same sanitising as ZipFile.extract: no absolute paths, no '..', no drive letters."""
+    parts = [p for p in member_name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    if parts and len(parts[0]) == 2 and parts[0][1] == ":":
+        parts = parts[1:]
+    return "/".join(parts) or None
+
+def read_inventory(inventory_csv: Path) -> dict[str, dict]:
+    """relative_path -> row. Rows from inventories without hash columns are kept but can't short-cut."""
+    if not inventory_csv.exists():
+        return {}
+    with inventory_csv.open("r", newline="", encoding="utf-8") as f:
+        return {r["relative_path"]: r for r in csv.DictReader(f) if r.get("relative_path")}
+
+def file_crc32(path: Path) -> int:
+    crc = 0
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def already_extracted(target: Path, info: zipfile.ZipInfo, known: dict | None) -> bool:
+    try:
+        st = target.stat()
+    except FileNotFoundError:
+        return False
+    if st.st_size != info.file_size:
+        return False
+    # 清单里记过同 size/mtime 的 CRC，就不用再读文件
+    if known and known.get("crc32") and known.get("mtime_ns") == str(st.st_mtime_ns):
+        return int(known["crc32"]) == info.CRC
+    return file_crc32(target) == info.CRC
+
+def inventory_row(rel: str, path: Path, sha256: str, crc: int) -> dict:
+    st = path.stat()
+    name = rel.rsplit("/", 1)[-1]
+    return {
+        "filename": name,
+        "relative_path": rel,
+        "ext": path.suffix,
+        "bytes": st.st_size,
+        "sha256": sha256,
+        "crc32": crc,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+def stream_extract(zip_path: Path, out_dir: Path, inventory_csv: Path, jobs: int) -> Path:
+    """Extract zip_path into out_dir in one pass and write the inventory. Returns the images folder."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        infos = zf.infolist()
+
+    members = []
+    junk = 0
+    for info in infos:
+        if info.is_dir():
+            continue
+        if is_mac_garbage(info.filename):
+            junk += 1
+            continue
+        rel = safe_member_path(info.filename)
+        if rel:
+            members.append((info, rel))
+
+    # 和旧版一样：zip 里有顶层 images/ 就以它为清单根目录
+    top = "images/" if any(rel.startswith("images/") for _, rel in members) else ""
+    images_dir = out_dir / "images" if top else out_dir
+    previous = read_inventory(inventory_csv)
+
+    todo = []
+    rows = {}
+    skipped = 0
+    for info, rel in members:
+        target = out_dir / rel
+        inv_rel = rel[len(top):] if rel.startswith(top) else None
+        if already_extracted(target, info, previous.get(inv_rel) if inv_rel else None):
+            skipped += 1
+            if inv_rel is not None and target.suffix in IMAGE_EXTS:
+                known = previous.get(inv_rel)
+                if known and known.get("sha256") and known.get("mtime_ns") == str(target.stat().st_mtime_ns):
+                    rows[inv_rel] = known
+                else:
+                    todo.append((info, rel, inv_rel, False))  # 只补算哈希，不重写文件
+            continue
+        todo.append((info, rel, inv_rel, True))
+    for d in sorted({(out_dir / rel).parent for _, rel, _, write in todo if write}):
+        d.mkdir(parents=True, exist_ok=True)
+
+    # 每个线程各开一个 ZipFile（共享一个句柄时 seek/read 会互相打架）；zlib 和 hashlib 解压/哈希时都会释放 GIL
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def open_zip() -> zipfile.ZipFile:
+        zf = getattr(local, "zf", None)
+        if zf is None:
+            zf = local.zf = zipfile.ZipFile(zip_path, "r")
+            with handles_lock:
+                handles.append(zf)
+        return zf
+
+    def work(item) -> tuple[str | None, dict | None]:
+        info, rel, inv_rel, write = item
+        target = out_dir / rel
+        h = hashlib.sha256()
+        crc = 0
+        if write:
+            tmp = target.with_name(f".{target.name}.part")
+            with open_zip().open(info) as src, tmp.open("wb") as dst:
+                # ZipExtFile 读到结尾时会校验 CRC，坏数据直接抛 BadZipFile
+                for chunk in iter(lambda: src.read(CHUNK), b""):
+                    h.update(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    dst.write(chunk)
+            os.replace(tmp, target)
+        else:
+            with target.open("rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK), b""):
+                    h.update(chunk)
+                    crc = zlib.crc32(chunk, crc)
+        if inv_rel is None or target.suffix not in IMAGE_EXTS:
+            return None, None
+        return inv_rel, inventory_row(inv_rel, target, h.hexdigest(), crc)
+
+    extracted = sum(1 for item in todo if item[3])
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+            for inv_rel, row in ex.map(work, todo):
+                if inv_rel is not None:
+                    rows[inv_rel] = row
+    finally:
+        for zf in handles:
+            zf.close()
+
+    # 以前解过、这次 zip 里没有但文件还在的，也保留在清单里
+    for rel, row in previous.items():
+        if rel not in rows and (images_dir / rel).is_file():
+            rows[rel] = row
+
+    inventory_csv.parent.mkdir(parents=True, exist_ok=True)
+    tmp = inventory_csv.with_name(inventory_csv.name + ".tmp")
+    with tmp.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=INVENTORY_FIELDS, extrasaction="ignore")
+        w.writeheader()
+        for row in sorted(rows.values(), key=lambda r: r["filename"].lower()):
+            w.writerow(row)
+    os.replace(tmp, inventory_csv)
+
+    print(f"- Zip members: {len(infos)} | junk skipped: {junk} | already in inbox: {skipped} | extracted: {extracted}")
+    return images_dir
+
 def ensure_base_structure(project_root: Path) -> None:
     # Keep site-wide images here (logo, favicon, etc.)
     (project_root / "images" / "site").mkdir(parents=True, exist_ok=True)
@@ -91,7 +265,12 @@ def main():
     ap.add_argument("--zip", default="images.zip", help="Path to images.zip (default: images.zip in project root)")
     ap.add_argument("--project-root", default=".", help="Project root directory (default: current dir)")
     ap.add_argument("--inbox", default="inbox/images_raw", help="Where to extract images into (default: inbox/images_raw)")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Extraction threads (default: 0 = one per CPU)")
+    ap.add_argument("--extract-all", action="store_true",
+                    help="Old behaviour: extractall, then clean junk and walk the tree for the inventory")
+    profiling.add_argument(ap)
     args = ap.parse_args()
+    profiling.start(args.profile, "setup_assets")
 
     project_root = Path(args.project_root).resolve()
     zip_path = (project_root / args.zip).resolve()
@@ -99,12 +278,17 @@ def main():
 
     ensure_base_structure(project_root)
 
+    inventory_csv = project_root / "inbox" / "image_inventory.csv"
     if zip_path.exists():
-        extracted_images_dir = unzip_images(zip_path, inbox_root)
-        clean_macos_artifacts(extracted_images_dir)
-        write_inventory(extracted_images_dir, project_root / "inbox" / "image_inventory.csv")
+        if args.extract_all:
+            extracted_images_dir = unzip_images(zip_path, inbox_root)
+            clean_macos_artifacts(extracted_images_dir)
+            write_inventory(extracted_images_dir, inventory_csv)
+        else:
+            jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+            extracted_images_dir = stream_extract(zip_path, inbox_root, inventory_csv, jobs)
         print(f"✅ Unzipped to: {extracted_images_dir}")
-        print(f"✅ Inventory CSV: {project_root / 'inbox' / 'image_inventory.csv'}")
+        print(f"✅ Inventory CSV: {inventory_csv}")
     else:
         print(f"⚠️ Zip not found: {zip_path} (skip unzip)")
 
@@ -5,8 +5,7 @@ MODE="dry-run"         # dry-run | apply
 ROOT="works/projects/p-2022-001-columbarium-of-the-days/img"
 MAX=1600               # max pixel (long edge)
 QUALITY=80             # 0-100 (jpeg)
-DO_BACKUP="yes"        # yes | no
-BACKUP_DIR="_img_backup_$(date +%Y%m%d-%H%M%S)"
+DO_BACKUP="yes"        # yes | no (snapshot via snapshot_store.py)
 
 usage() {
   cat <<USAGE
@@ -47,17 +46,13 @@ echo "Backup: $DO_BACKUP"
 echo
 
 if [[ "$MODE" == "apply" && "$DO_BACKUP" == "yes" ]]; then
-  mkdir -p "$BACKUP_DIR"
+  # 去重快照代替整份复制：只存新内容，之后可用 restore 还原
+  python3 snapshot_store.py create --label shrink-images "$ROOT"
 fi
 
 # 用 find + while read，兼容 macOS bash 3.2（无 mapfile）
 find "$ROOT" -type f \( -iname "*.jpg" -o -iname "*.jpeg" -o -iname "*.png" \) ! -name ".DS_Store" -print0 \
 | while IFS= read -r -d '' f; do
-    if [[ "$MODE" == "apply" && "$DO_BACKUP" == "yes" ]]; then
-      mkdir -p "$BACKUP_DIR/$(dirname "$f")"
-      cp -p "$f" "$BACKUP_DIR/$f"
-    fi
-
     if [[ "$MODE" == "dry-run" ]]; then
       echo "[dry-run] sips -Z $MAX \"$f\" >/dev/null"
       echo "[dry-run] (if jpg) sips -s formatOptions $QUALITY \"$f\" >/dev/null"
@@ -77,5 +72,5 @@ find "$ROOT" -type f \( -iname "*.jpg" -o -iname "*.jpeg" -o -iname "*.png" \) !
 echo
 echo "Done."
 if [[ "$MODE" == "apply" && "$DO_BACKUP" == "yes" ]]; then
-  echo "Backup folder: $BACKUP_DIR"
+  echo "Undo: python3 snapshot_store.py list ; python3 snapshot_store.py restore <id>"
 fi
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+In-memory index of the site tree: relative posix path -> (is_dir, size, mtime_ns).
+
+One os.scandir walk builds it; after that callers refresh single paths or
+single directories instead of walking everything again, and read directory
+listings from memory (listdir).
+"""
+
+from pathlib import Path
+import os
+from typing import NamedTuple
+
+import profiling
+
+ROOT = Path(".").resolve()
+
+# 不进索引的目录：版本库、生成物、备份和垃圾桶
+SKIP_DIRS = {".git", "__pycache__", "_snapshots", "inbox", "node_modules"}
+SKIP_DIR_PREFIXES = ("_img_backup_", "_trash_invalid_", ".")
+# 在索引里、但不属于发布的站点：生成用的模板和校验规则
+UNPUBLISHED_PREFIXES = ("templates/", "schemas/")
+
+class Entry(NamedTuple):
+    is_dir: bool
+    size: int
+    mtime_ns: int
+
+def skip_dir(name: str) -> bool:
+    return name in SKIP_DIRS or name.startswith(SKIP_DIR_PREFIXES)
+
+def project_slug(rel: str) -> str | None:
+    """'works/projects/<slug>/...' -> '<slug>' (None for anything else)."""
+    parts = rel.split("/")
+    if len(parts) >= 3 and parts[0] == "works" and parts[1] == "projects":
+        return parts[2]
+    return None
+
+class SiteIndex:
+    def __init__(self, root: Path = ROOT):
+        self.root = root
+        self.entries: dict[str, Entry] = {}
+        # 目录 -> {名字: Entry}，随 entries 一起增删；列目录、删子树都不用扫整个 entries
+        self._children: dict[str, dict[str, Entry]] = {}
+
+    def rel(self, path: Path | str) -> str:
+        return Path(path).resolve().relative_to(self.root).as_posix()
+
+    def scan(self) -> None:
+        """Full walk (startup, or after the watcher lost events)."""
+        self.entries = {}
+        self._children = {}
+        with profiling.span("scan"):
+            self._walk(self.root, "")
+
+    def _set(self, rel: str, entry: Entry) -> None:
+        self.entries[rel] = entry
+        parent, _sep, name = rel.rpartition("/")
+        self._children.setdefault(parent, {})[name] = entry
+
+    def _walk(self, dir_path: Path, rel_dir: str) -> None:
+        stack = [(dir_path, rel_dir)]
+        while stack:
+            current, rel_current = stack.pop()
+            try:
+                it = os.scandir(current)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            with it:
+                for e in it:
+                    rel = f"{rel_current}/{e.name}" if rel_current else e.name
+                    try:
+                        if e.is_dir(follow_symlinks=False):
+                            if skip_dir(e.name):
+                                continue
+                            st = e.stat(follow_symlinks=False)
+                            self._set(rel, Entry(True, 0, st.st_mtime_ns))
+                            stack.append((Path(e.path), rel))
+                        elif e.is_file():
+                            st = e.stat()
+                            self._set(rel, Entry(False, st.st_size, st.st_mtime_ns))
+                    except FileNotFoundError:
+                        continue
+
+    def _subtree(self, rel: str) -> list[str]:
+        """rel (if indexed) and everything below it, parents before children."""
+        found = [rel] if rel in self.entries else []
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            prefix = f"{current}/" if current else ""
+            for name, e in self._children.get(current, {}).items():
+                found.append(prefix + name)
+                if e.is_dir:
+                    stack.append(prefix + name)
+        return found
+
+    def _drop_subtree(self, rel: str) -> list[str]:
+        gone = self._subtree(rel)
+        for k in gone:
+            del self.entries[k]
+            self._children.pop(k, None)
+        parent, _sep, name = rel.rpartition("/")
+        self._children.get(parent, {}).pop(name, None)
+        return gone
+
+    def refresh(self, rel: str) -> list[str]:
+        """
+        Re-stat one path and return the relative paths whose entry changed.
+        A new directory is walked; a vanished one drops its whole subtree.
+        """
+        path = self.root / rel
+        old = self.entries.get(rel)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return self._drop_subtree(rel) if old else []
+
+        if path.is_dir():
+            if any(skip_dir(part) for part in rel.split("/")):
+                return []
+            new = Entry(True, 0, st.st_mtime_ns)
+            if old is None or not old.is_dir:
+                if old is not None:
+                    self._drop_subtree(rel)
+                self._set(rel, new)
+                self._walk(path, rel)
+                return self._subtree(rel)
+            self._set(rel, new)
+            return [rel] if new != old else []
+
+        new = Entry(False, st.st_size, st.st_mtime_ns)
+        if new == old:
+            return []
+        if old is not None and old.is_dir:
+            self._drop_subtree(rel)
+        self._set(rel, new)
+        return [rel]
+
+    def rescan_dir(self, rel_dir: str) -> list[str]:
+        """
+        Re-list one directory (polling fallback): picks up added / removed children
+        and re-stats the files directly inside it. Subdirectories are not descended
+        unless they are new.
+        """
+        changed = []
+        dir_path = self.root / rel_dir if rel_dir else self.root
+        prefix = f"{rel_dir}/" if rel_dir else ""
+        known = set(self._children.get(rel_dir, {}))
+        try:
+            names = os.listdir(dir_path)
+        except FileNotFoundError:
+            return self._drop_subtree(rel_dir) if rel_dir else []
+        seen = set()
+        for name in names:
+            if skip_dir(name) and (dir_path / name).is_dir():
+                continue
+            seen.add(name)
+            changed += self.refresh(prefix + name)
+        for name in known - seen:
+            changed += self._drop_subtree(prefix + name)
+        return changed
+
+    def listdir(self, rel_dir: str) -> dict[str, Entry]:
+        """
+        Children of one indexed directory, name -> Entry, without touching the disk
+        ("" is the root). Skipped directories are not in it. Don't modify the result.
+        """
+        return self._children.get(rel_dir, {})
+
+    def dirs(self) -> list[str]:
+        return [k for k, e in self.entries.items() if e.is_dir]
+
+    def files_under(self, rel_dir: str) -> list[str]:
+        rel_dir = rel_dir.rstrip("/")
+        return sorted(k for k in self._subtree(rel_dir) if k != rel_dir and not self.entries[k].is_dir)
+
+    def project_slugs(self) -> list[str]:
+        return sorted(name for name, e in self.listdir("works/projects").items() if e.is_dir)
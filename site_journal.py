@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Change journal shared by every script that edits the site.
+
+A script opens one Batch, does all its writes / renames / moves through it,
+and the batch is committed at the end (or rolled back if the script raises).
+
+  .journal/<batch-id>/meta.json   script, start time, status (open/committed/rolled-back/undone)
+  .journal/<batch-id>/ops.jsonl   one line per operation, appended + fsync'ed *before* it runs
+  .journal/<batch-id>/blobs/N     previous content of overwritten files
+  .journal/<batch-id>/<name>.json extra state a script saved (e.g. a rename plan, for resuming)
+
+Writes go to a temp file and are renamed into place, so a file is never half
+written. Because the old file is replaced rather than modified, its inode can
+simply be hardlinked into blobs/ (no copy); reflink or copy is the fallback.
+
+CLI:
+  python3 site_journal.py list
+  python3 site_journal.py show <batch-id>
+  python3 site_journal.py undo <batch-id> [--force]
+  python3 site_journal.py recover            roll back batches left open by a crash
+  python3 site_journal.py prune --keep N     forget all but the newest N batches
+"""
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import profiling
+from snapshot_store import materialise
+
+ROOT = Path(".").resolve()
+JOURNAL_DIR = ROOT / ".journal"
+
+def _sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _sha256_file(path: Path) -> str | None:
+    if not path.is_file():
+        return None
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Temp file in the same folder + fsync + rename: readers see old or new, never half."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.journal-tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if path.exists():
+        shutil.copymode(path, tmp)
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+class Batch:
+    """
+    One journaled unit of work.
+
+        with Batch("sync_home_work_cards") as batch:
+            batch.write_text(INDEX_HTML, new_html)
+        print(batch.id)
+
+    Leaving the block normally commits; an exception rolls back what was done
+    so far and re-raises. A batch that recorded nothing leaves no trace.
+    """
+
+    def __init__(self, script: str):
+        self.script = script
+        self.id = None
+        self.dir = None
+        self.ops = []
+        self._rel_dirs: dict[str, str] = {}  # 绝对目录 -> 相对路径；大批量改名时不用每个文件都 resolve
+
+    # -- lifecycle -------------------------------------------------------------
+
+    @classmethod
+    def reopen(cls, batch_id: str) -> "Batch":
+        """Continue a batch a crashed run left open (its ops stay, new ones are appended)."""
+        batch_dir = find_batch(batch_id)
+        meta = _load_meta(batch_dir)
+        if meta["status"] != "open":
+            raise SystemExit(f"❌ Batch {batch_id} is {meta['status']}, not open; nothing to resume.")
+        batch = cls(meta["script"])
+        batch.id = batch_id
+        batch.dir = batch_dir
+        batch.meta = meta
+        batch.ops = _load_ops(batch_dir)
+        return batch
+
+    def __enter__(self) -> "Batch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self.dir is None:
+            return False
+        if exc_type is None:
+            self._set_status("committed")
+        else:
+            print(f"⚠️ {self.script} failed; rolling back batch {self.id}")
+            _rollback(self.dir, force=True)
+            self._set_status("rolled-back")
+        return False
+
+    def _open(self) -> None:
+        if self.dir is not None:
+            return
+        base = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self.script}"
+        batch_id = base
+        n = 2
+        while (JOURNAL_DIR / batch_id).exists():
+            batch_id = f"{base}-{n}"
+            n += 1
+        self.id = batch_id
+        self.dir = JOURNAL_DIR / batch_id
+        (self.dir / "blobs").mkdir(parents=True)
+        self.meta = {
+            "id": batch_id,
+            "script": self.script,
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "status": "open",
+        }
+        self._write_meta()
+
+    def _write_meta(self) -> None:
+        atomic_write_bytes(self.dir / "meta.json", json.dumps(self.meta, indent=1).encode("utf-8"))
+
+    def _set_status(self, status: str) -> None:
+        self.meta["status"] = status
+        self.meta["finished"] = datetime.now().isoformat(timespec="seconds")
+        self._write_meta()
+
+    def _log(self, op: dict) -> None:
+        self._log_many([op])
+
+    def _log_many(self, ops: list[dict]) -> None:
+        """Append ops with a single fsync (all of them are logged before any is performed)."""
+        self._open()
+        lines = []
+        for op in ops:
+            op["seq"] = len(self.ops)
+            self.ops.append(op)
+            lines.append(json.dumps(op, ensure_ascii=False) + "\n")
+        with (self.dir / "ops.jsonl").open("a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rel(self, path: Path) -> str:
+        """Site-relative path. The folder is resolved once per batch; the name is taken as is."""
+        head, name = os.path.split(os.path.abspath(path))
+        rel_dir = self._rel_dirs.get(head)
+        if rel_dir is None:
+            rel_dir = self._rel_dirs[head] = Path(head).resolve().relative_to(ROOT).as_posix()
+        return name if rel_dir == "." else f"{rel_dir}/{name}"
+
+    # -- operations ------------------------------------------------------------
+
+    def write_bytes(self, path: Path, data: bytes) -> None:
+        path = Path(path)
+        self._open()
+        backup = None
+        with profiling.span("write", path=path.name, bytes=len(data)):
+            if path.exists():
+                backup = f"blobs/{len(self.ops)}"
+                with profiling.span("backup"):
+                    materialise(path, self.dir / backup, "hardlink")
+            self._log({"op": "write", "path": self._rel(path), "backup": backup, "sha256": _sha256_bytes(data)})
+            atomic_write_bytes(path, data)
+
+    def write_text(self, path: Path, text: str, encoding: str = "utf-8") -> None:
+        self.write_bytes(path, text.encode(encoding))
+
+    def write_from(self, path: Path, tmp: Path) -> None:
+        """
+        Like write_bytes, for content that is already in a temp file on the same
+        filesystem (files too big to hold in memory). tmp is renamed onto path.
+        """
+        path, tmp = Path(path), Path(tmp)
+        self._open()
+        backup = None
+        with profiling.span("write", path=path.name):
+            if path.exists():
+                backup = f"blobs/{len(self.ops)}"
+                with profiling.span("backup"):
+                    materialise(path, self.dir / backup, "hardlink")
+                shutil.copymode(path, tmp)
+            with tmp.open("rb") as f:
+                os.fsync(f.fileno())
+            self._log({"op": "write", "path": self._rel(path), "backup": backup, "sha256": _sha256_file(tmp)})
+            os.replace(tmp, path)
+            _fsync_dir(path.parent)
+
+    def mkdir(self, path: Path) -> None:
+        """mkdir -p; only the folders actually created are recorded (undo removes them if empty)."""
+        path = Path(path)
+        missing = []
+        p = path
+        while not p.exists():
+            missing.append(p)
+            p = p.parent
+        for d in reversed(missing):
+            self._log({"op": "mkdir", "path": self._rel(d)})
+            d.mkdir()
+
+    def rename(self, src: Path, dst: Path) -> None:
+        """Rename/move a file or folder. Refuses to overwrite (undo would lose data)."""
+        src, dst = Path(src), Path(dst)
+        if dst.exists() and not _same_entry(src, dst):
+            raise FileExistsError(f"rename target exists: {dst}")
+        self.mkdir(dst.parent)
+        self._log({"op": "rename", "src": self._rel(src), "dst": self._rel(dst)})
+        os.rename(src, dst)
+
+    move = rename
+
+    def rename_many(self, pairs: list[tuple[Path, Path]]) -> None:
+        """
+        Many renames, one journal fsync. Every target is checked before anything
+        moves; rollback of a rename that never ran is a no-op, so logging the
+        whole group up front is safe.
+        """
+        pairs = [(Path(src), Path(dst)) for src, dst in pairs]
+        for src, dst in pairs:
+            if dst.exists() and not _same_entry(src, dst):
+                raise FileExistsError(f"rename target exists: {dst}")
+        for parent in sorted({dst.parent for _src, dst in pairs}):
+            self.mkdir(parent)
+        self._log_many([{"op": "rename", "src": self._rel(src), "dst": self._rel(dst)} for src, dst in pairs])
+        for src, dst in pairs:
+            os.rename(src, dst)
+        _fsync_dir_set({dst.parent for _src, dst in pairs} | {src.parent for src, _dst in pairs})
+
+    def save_json(self, name: str, data) -> None:
+        """Keep script state next to the ops (read back with load_batch_json)."""
+        self._open()
+        atomic_write_bytes(self.dir / f"{name}.json", json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8"))
+
+def _fsync_dir_set(dirs: set[Path]) -> None:
+    for d in sorted(dirs):
+        _fsync_dir(d)
+
+def load_batch_json(batch_id: str, name: str):
+    return json.loads((find_batch(batch_id) / f"{name}.json").read_text(encoding="utf-8"))
+
+def _same_entry(a: Path, b: Path) -> bool:
+    """True when a and b are the same file (case-only rename on a case-insensitive disk)."""
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+# -- reading / undoing ---------------------------------------------------------------
+
+def _load_meta(batch_dir: Path) -> dict:
+    return json.loads((batch_dir / "meta.json").read_text(encoding="utf-8"))
+
+def _load_ops(batch_dir: Path) -> list[dict]:
+    ops_path = batch_dir / "ops.jsonl"
+    if not ops_path.exists():
+        return []
+    ops = []
+    for line in ops_path.read_text(encoding="utf-8").splitlines():
+        try:
+            ops.append(json.loads(line))
+        except ValueError:
+            break  # 崩溃时写了半行：之后的都没执行
+    return ops
+
+def load_batch_ops(batch_id: str) -> list[dict]:
+    """The ops a batch recorded, oldest first (paths are site-relative posix)."""
+    return _load_ops(find_batch(batch_id))
+
+def _rollback(batch_dir: Path, force: bool) -> list[str]:
+    """
+    Reverse every op, newest first. Each step is idempotent, so it is safe on a
+    batch that crashed between logging an op and performing it.
+    Returns paths that were skipped because they changed after the batch.
+    """
+    skipped = []
+    for op in reversed(_load_ops(batch_dir)):
+        kind = op["op"]
+        if kind == "write":
+            path = ROOT / op["path"]
+            current = _sha256_file(path)
+            if current is not None and current != op["sha256"] and not force:
+                # 不是本批写的内容：可能是没执行到，也可能被后来的修改覆盖了
+                if op["backup"] and current == _sha256_file(batch_dir / op["backup"]):
+                    continue
+                skipped.append(op["path"])
+                continue
+            if op["backup"]:
+                blob = batch_dir / op["backup"]
+                if blob.exists():
+                    materialise(blob, path, "auto")
+                    shutil.copymode(blob, path)
+            elif path.exists():
+                path.unlink()
+        elif kind == "rename":
+            src, dst = ROOT / op["src"], ROOT / op["dst"]
+            if dst.exists() and not src.exists():
+                os.rename(dst, src)
+            elif dst.exists():
+                skipped.append(op["dst"])
+        elif kind == "mkdir":
+            d = ROOT / op["path"]
+            try:
+                d.rmdir()
+            except OSError:
+                pass  # 不存在或非空：保留
+    return skipped
+
+def find_batch(batch_id: str) -> Path:
+    batch_dir = JOURNAL_DIR / batch_id
+    if not (batch_dir / "meta.json").exists():
+        raise SystemExit(f"❌ Batch not found: {batch_id}")
+    return batch_dir
+
+def all_batches() -> list[Path]:
+    if not JOURNAL_DIR.exists():
+        return []
+    return sorted(p for p in JOURNAL_DIR.iterdir() if (p / "meta.json").exists())
+
+def undo(batch_id: str, force: bool = False) -> bool:
+    batch_dir = find_batch(batch_id)
+    meta = _load_meta(batch_dir)
+    if meta["status"] in ("undone", "rolled-back"):
+        print(f"— Batch {batch_id} is already {meta['status']}.")
+        return True
+    skipped = _rollback(batch_dir, force)
+    if skipped:
+        print(f"⚠️ Changed after batch {batch_id}, left alone (use --force to overwrite):")
+        for p in skipped:
+            print(f"  - {p}")
+        return False
+    meta["status"] = "undone"
+    meta["undone"] = datetime.now().isoformat(timespec="seconds")
+    atomic_write_bytes(batch_dir / "meta.json", json.dumps(meta, indent=1).encode("utf-8"))
+    print(f"✅ Undid batch {batch_id} ({len(_load_ops(batch_dir))} op(s))")
+    return True
+
+def recover() -> None:
+    """Roll back batches a crashed script left 'open'."""
+    found = 0
+    for batch_dir in all_batches():
+        meta = _load_meta(batch_dir)
+        if meta["status"] != "open":
+            continue
+        found += 1
+        _rollback(batch_dir, force=True)
+        meta["status"] = "rolled-back"
+        meta["finished"] = datetime.now().isoformat(timespec="seconds")
+        atomic_write_bytes(batch_dir / "meta.json", json.dumps(meta, indent=1).encode("utf-8"))
+        print(f"✅ Rolled back interrupted batch {meta['id']} ({meta['script']})")
+    if not found:
+        print("No interrupted batches.")
+
+def describe(op: dict) -> str:
+    if op["op"] == "rename":
+        return f"rename {op['src']} -> {op['dst']}"
+    if op["op"] == "write":
+        return f"write  {op['path']}" + ("" if op["backup"] else " (new file)")
+    return f"{op['op']:<6} {op['path']}"
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect and undo journaled site changes.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="List batches")
+    p_show = sub.add_parser("show", help="Show the operations of one batch")
+    p_show.add_argument("id")
+    p_undo = sub.add_parser("undo", help="Undo one batch")
+    p_undo.add_argument("id")
+    p_undo.add_argument("--force", action="store_true", help="Restore even files edited after the batch")
+    sub.add_parser("recover", help="Roll back batches left open by a crash")
+    p_prune = sub.add_parser("prune", help="Delete old batches (they can no longer be undone)")
+    p_prune.add_argument("--keep", type=int, default=20)
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "site_journal")
+
+    if args.cmd == "list":
+        batches = all_batches()
+        if not batches:
+            print("No batches.")
+        for batch_dir in batches:
+            meta = _load_meta(batch_dir)
+            print(f"{meta['id']:<48} {meta['status']:<12} {len(_load_ops(batch_dir)):>5} op(s)")
+    elif args.cmd == "show":
+        batch_dir = find_batch(args.id)
+        meta = _load_meta(batch_dir)
+        print(f"{meta['id']}  [{meta['status']}]  started {meta['started']}")
+        for op in _load_ops(batch_dir):
+            print(f"  {describe(op)}")
+    elif args.cmd == "undo":
+        if not undo(args.id, args.force):
+            sys.exit(1)
+    elif args.cmd == "recover":
+        recover()
+    elif args.cmd == "prune":
+        batches = all_batches()
+        old = batches[:-args.keep] if args.keep > 0 else batches
+        for batch_dir in old:
+            shutil.rmtree(batch_dir)
+        print(f"✅ Pruned {len(old)} batch(es); kept {len(batches) - len(old)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Run several maintenance stages in one process, on one walk of the tree.
+
+  python3 site_pipeline.py                  full refresh: fix normalize sync audit
+  python3 site_pipeline.py audit            just one stage
+  python3 site_pipeline.py fix sync audit   any sequence, in the order given
+
+  fix        fix_projects_state.py         trash invalid folders, add missing pages, rewrite projects.csv
+  normalize  normalize_gallery_numbers.py  renumber gallery files, update the pages that use them
+  sync       sync_home_work_cards.py       index.html + work.html
+  audit      audit_projects.py             report in inbox/
+
+Run one after another, each script starts a new interpreter, parses
+projects.csv and walks works/projects again. Here the tree is walked once
+into a SiteIndex and projects.csv is parsed once; the stages read both
+instead of the disk. Every change a stage makes goes through a site_journal
+batch, so afterwards only the paths its batches recorded (and their folders)
+are re-stat'ed, and projects.csv is parsed again only if a batch rewrote it.
+
+Stage modules are imported when their stage starts, so a one-stage run
+doesn't load the others. A failing stage has its batch rolled back and
+stops the pipeline.
+"""
+
+from pathlib import Path
+import argparse
+import csv
+import posixpath
+import sys
+import time
+
+import profiling
+from site_index import SiteIndex, skip_dir
+from site_journal import all_batches, load_batch_ops
+
+ROOT = Path(".").resolve()
+CSV_PATH = ROOT / "projects.csv"
+CSV_REL = "projects.csv"
+FULL_REFRESH = ("fix", "normalize", "sync", "audit")
+
+def read_projects_csv(csv_path: Path) -> list[dict] | None:
+    """build_site.read_projects() rows ({slug, title, year}) without importing build_site; None if there is no CSV."""
+    if not csv_path.exists():
+        return None
+    rows = []
+    with profiling.span("csv"), csv_path.open("r", encoding="utf-8", newline="") as f:
+        for r in csv.DictReader(f):
+            slug = (r.get("project_slug") or "").strip()
+            if slug:
+                rows.append({"slug": slug, "title": (r.get("title") or "").strip(), "year": (r.get("year") or "").strip()})
+    return rows
+
+class Site:
+    """What the stages share: the tree snapshot and the parsed projects.csv, kept current between stages."""
+
+    def __init__(self, root: Path = ROOT):
+        self.index = SiteIndex(root)
+        self.index.scan()
+        self._projects: list[dict] | None = None
+        self._projects_stale = True
+
+    @property
+    def projects(self) -> list[dict] | None:
+        if self._projects_stale:
+            self._projects = read_projects_csv(CSV_PATH)
+            self._projects_stale = False
+        return self._projects
+
+    def absorb(self, batch_ids: list[str]) -> int:
+        """Re-stat what these journal batches touched. Returns the number of paths looked at."""
+        touched = set()
+        for batch_id in batch_ids:
+            for op in load_batch_ops(batch_id):
+                for key in ("path", "src", "dst"):
+                    rel = op.get(key)
+                    if rel:
+                        touched.add(rel)
+                        # 增删改名都会改变所在目录的 mtime（audit 的指纹用它）
+                        if posixpath.dirname(rel):
+                            touched.add(posixpath.dirname(rel))
+        if CSV_REL in touched:
+            self._projects_stale = True
+        # 被跳过的目录（垃圾桶、备份）里的东西不进索引
+        touched = {rel for rel in touched if not any(skip_dir(part) for part in rel.split("/")[:-1])}
+        for rel in sorted(touched, key=lambda r: (r.count("/"), r)):
+            self.index.refresh(rel)
+        return len(touched)
+
+def stage_fix(site: Site, args) -> None:
+    import fix_projects_state
+    fix_projects_state.fix_projects(site.index, site.projects)
+
+def stage_normalize(site: Site, args) -> None:
+    import normalize_gallery_numbers
+    normalize_gallery_numbers.run_normalize(compact=args.compact, index=site.index)
+
+def stage_sync(site: Site, args) -> None:
+    # 和 sync_home_work_cards.py 一样：只建首页和 Work 页
+    import build_site
+    build_site.build({"index.html", "work.html"}, projects=site.projects)
+
+def stage_audit(site: Site, args) -> None:
+    # 目录列表和指纹都从快照里取，审计本身不碰磁盘
+    import audit_projects
+    audit_projects.run_audit(fmt=args.format, index=site.index, projects=site.projects)
+
+# 名字 -> 函数；执行顺序由命令行决定
+STAGES = {
+    "fix": stage_fix,
+    "normalize": stage_normalize,
+    "sync": stage_sync,
+    "audit": stage_audit,
+}
+
+def run_pipeline(names: list[str], args) -> bool:
+    """Run the stages in order on one shared Site. False if a stage failed (the rest are skipped)."""
+    t0 = time.perf_counter()
+    site = Site()
+    print(f"Indexed {len(site.index.entries)} entries in {time.perf_counter() - t0:.2f}s")
+
+    for name in names:
+        before = {p.name for p in all_batches()}
+        t0 = time.perf_counter()
+        print(f"\n▶ {name}")
+        try:
+            with profiling.span(name):
+                STAGES[name](site, args)
+        except Exception as e:
+            print(f"❌ Stage {name} failed: {e}")
+            return False
+        finally:
+            refreshed = site.absorb([p.name for p in all_batches() if p.name not in before])
+        print(f"✅ {name} done in {time.perf_counter() - t0:.2f}s (re-stat'ed {refreshed} path(s))")
+    return True
+
+def main():
+    ap = argparse.ArgumentParser(description="Run maintenance stages in one process, sharing one tree scan and one projects.csv parse.")
+    ap.add_argument("stages", nargs="*", metavar="STAGE",
+                    help=f"Stages to run, in this order: {', '.join(STAGES)} (default: {' '.join(FULL_REFRESH)})")
+    ap.add_argument("--compact", action="store_true", help="normalize: also close gaps in the numbering")
+    ap.add_argument("--format", choices=["text", "jsonl"], default="text", help="audit: report format (default: text)")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "site_pipeline")
+
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        ap.error(f"unknown stage(s): {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+    if not run_pipeline(args.stages or list(FULL_REFRESH), args):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed, deduplicated backups (replaces the full-copy _img_backup_* folders).
+
+  _snapshots/objects/ab/cdef...   one file per distinct content (sha256), read-only
+  _snapshots/manifests/<id>.json  one small manifest per snapshot: path -> hash/size/mode
+
+Commands:
+  create PATH... [--label L]   snapshot files/folders (paths relative to the site root)
+  list                         show snapshots
+  restore ID [--to DIR]        put a snapshot's files back (default: into the site root)
+  delete ID                    drop a manifest (objects are freed by gc)
+  gc                           delete objects no manifest references
+  import-legacy [--remove]     turn _img_backup_* folders into snapshots
+
+Objects are materialised with a reflink (copy-on-write clone) when the filesystem
+supports it, otherwise a plain copy. --link-mode hardlink is available for restores
+into throwaway folders; a hardlinked file edited in place would change the object.
+"""
+
+from pathlib import Path
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+from datetime import datetime
+
+import profiling
+
+ROOT = Path(".").resolve()
+STORE_DIR = ROOT / "_snapshots"
+OBJECTS_DIR = STORE_DIR / "objects"
+MANIFESTS_DIR = STORE_DIR / "manifests"
+LEGACY_PREFIX = "_img_backup_"
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+SKIP_NAMES = {".DS_Store"}
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def object_path(digest: str) -> Path:
+    return OBJECTS_DIR / digest[:2] / digest[2:]
+
+def reflink(src: Path, dst: Path) -> bool:
+    """Copy-on-write clone (btrfs/xfs/APFS-style). False if the filesystem can't."""
+    try:
+        with src.open("rb") as fs, dst.open("wb") as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        return True
+    except OSError:
+        try:
+            dst.unlink()
+        except FileNotFoundError:
+            pass
+        return False
+
+def materialise(src: Path, dst: Path, mode: str) -> str:
+    """Place src's content at dst (via a temp name + rename). Returns the method used."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.snap-tmp")
+    if tmp.exists():
+        tmp.unlink()
+    if mode == "hardlink":
+        try:
+            os.link(src, tmp)
+            os.replace(tmp, dst)
+            return "hardlink"
+        except OSError:
+            pass
+    if mode in ("auto", "reflink", "hardlink") and reflink(src, tmp):
+        method = "reflink"
+    else:
+        shutil.copyfile(src, tmp)
+        method = "copy"
+    os.replace(tmp, dst)
+    return method
+
+def store_object(src: Path, digest: str) -> bool:
+    """Add src to the object store. False if the content was already there."""
+    obj = object_path(digest)
+    if obj.exists():
+        return False
+    materialise(src, obj, "auto")
+    os.chmod(obj, 0o444)
+    return True
+
+def iter_files(paths: list[Path]):
+    for base in paths:
+        if base.is_file():
+            yield base
+            continue
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for name in sorted(filenames):
+                if name not in SKIP_NAMES and not name.startswith("._"):
+                    yield Path(dirpath) / name
+
+def load_manifest(snapshot_id: str) -> dict:
+    path = MANIFESTS_DIR / f"{snapshot_id}.json"
+    if not path.exists():
+        raise SystemExit(f"❌ Snapshot not found: {snapshot_id}")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def all_manifests() -> list[dict]:
+    if not MANIFESTS_DIR.exists():
+        return []
+    return [json.loads(p.read_text(encoding="utf-8")) for p in sorted(MANIFESTS_DIR.glob("*.json"))]
+
+def new_snapshot_id(label: str) -> str:
+    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = f"{ts}-{label}" if label else ts
+    sid = base
+    n = 2
+    while (MANIFESTS_DIR / f"{sid}.json").exists():
+        sid = f"{base}-{n}"
+        n += 1
+    return sid
+
+def known_hashes() -> dict:
+    """(path, size, mtime_ns) -> sha256 from earlier manifests, so unchanged files aren't re-hashed."""
+    known = {}
+    for m in all_manifests():
+        for rel, info in m["files"].items():
+            if "mtime_ns" in info:
+                known[(rel, info["size"], info["mtime_ns"])] = info["sha256"]
+    return known
+
+def create_snapshot(paths: list[Path], label: str, base: Path = ROOT) -> str:
+    """Snapshot files under paths; manifest keys are relative to base."""
+    MANIFESTS_DIR.mkdir(parents=True, exist_ok=True)
+    known = known_hashes()
+    files = {}
+    new_objects = 0
+    new_bytes = 0
+    total_bytes = 0
+    for p in iter_files(paths):
+        rel = p.resolve().relative_to(base).as_posix()
+        st = p.stat()
+        digest = known.get((rel, st.st_size, st.st_mtime_ns)) or sha256_file(p)
+        if store_object(p, digest):
+            new_objects += 1
+            new_bytes += st.st_size
+        total_bytes += st.st_size
+        files[rel] = {
+            "sha256": digest,
+            "size": st.st_size,
+            "mode": stat.S_IMODE(st.st_mode),
+            "mtime_ns": st.st_mtime_ns,
+        }
+
+    sid = new_snapshot_id(label)
+    manifest = {
+        "id": sid,
+        "label": label,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+    }
+    tmp = MANIFESTS_DIR / f".{sid}.json.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, MANIFESTS_DIR / f"{sid}.json")
+
+    print(f"✅ Snapshot {sid}: {len(files)} file(s), {total_bytes / 1e6:.1f} MB")
+    print(f"   New objects: {new_objects} ({new_bytes / 1e6:.1f} MB); the rest was already stored")
+    return sid
+
+def restore_snapshot(snapshot_id: str, target: Path, mode: str) -> None:
+    manifest = load_manifest(snapshot_id)
+    restored = 0
+    unchanged = 0
+    methods: dict[str, int] = {}
+    for rel, info in sorted(manifest["files"].items()):
+        obj = object_path(info["sha256"])
+        if not obj.exists():
+            print(f"❌ Missing object for {rel} ({info['sha256'][:12]}); store is damaged")
+            continue
+        dst = target / rel
+        if dst.is_file() and dst.stat().st_size == info["size"] and sha256_file(dst) == info["sha256"]:
+            unchanged += 1
+            continue
+        method = materialise(obj, dst, mode)
+        if method != "hardlink":
+            os.chmod(dst, info.get("mode", 0o644))
+        if "mtime_ns" in info:
+            os.utime(dst, ns=(info["mtime_ns"], info["mtime_ns"]))
+        methods[method] = methods.get(method, 0) + 1
+        restored += 1
+    detail = ", ".join(f"{k}: {v}" for k, v in sorted(methods.items()))
+    print(f"✅ Restored {restored} file(s) into {target} ({detail or 'nothing to do'}); unchanged: {unchanged}")
+
+def gc() -> None:
+    referenced = {info["sha256"] for m in all_manifests() for info in m["files"].values()}
+    removed = 0
+    freed = 0
+    if OBJECTS_DIR.exists():
+        for shard in sorted(OBJECTS_DIR.iterdir()):
+            if not shard.is_dir():
+                continue
+            for obj in shard.iterdir():
+                if shard.name + obj.name in referenced:
+                    continue
+                freed += obj.stat().st_size
+                obj.chmod(0o644)
+                obj.unlink()
+                removed += 1
+            if not any(shard.iterdir()):
+                shard.rmdir()
+    print(f"✅ GC removed {removed} object(s), freed {freed / 1e6:.1f} MB; {len(referenced)} still referenced")
+
+def list_snapshots() -> None:
+    manifests = all_manifests()
+    if not manifests:
+        print("No snapshots.")
+        return
+    for m in manifests:
+        size = sum(info["size"] for info in m["files"].values())
+        print(f"{m['id']:<40} {len(m['files']):>6} files {size / 1e6:>9.1f} MB  {m.get('label', '')}")
+
+def import_legacy(remove: bool) -> None:
+    """_img_backup_<ts>/ mirrors the site tree, so its paths map 1:1 onto manifest keys."""
+    legacy = sorted(p for p in ROOT.iterdir() if p.is_dir() and p.name.startswith(LEGACY_PREFIX))
+    if not legacy:
+        print("No _img_backup_* folders found.")
+        return
+    for folder in legacy:
+        sid = create_snapshot([folder], label=folder.name, base=folder.resolve())
+        manifest = load_manifest(sid)
+        ok = all(object_path(info["sha256"]).exists() for info in manifest["files"].values())
+        if remove and ok:
+            shutil.rmtree(folder)
+            print(f"   Removed {folder.name}")
+        elif remove:
+            print(f"⚠️ Kept {folder.name}: some objects are missing")
+
+def main():
+    ap = argparse.ArgumentParser(description="Deduplicated, content-addressed snapshots of site files.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_create = sub.add_parser("create", help="Snapshot files or folders")
+    p_create.add_argument("paths", nargs="+", help="Files/folders (relative to the site root)")
+    p_create.add_argument("--label", default="", help="Short label stored with the snapshot")
+
+    sub.add_parser("list", help="List snapshots")
+
+    p_restore = sub.add_parser("restore", help="Restore a snapshot")
+    p_restore.add_argument("id")
+    p_restore.add_argument("--to", help="Restore into this folder instead of the site root")
+    p_restore.add_argument("--link-mode", choices=["auto", "reflink", "hardlink", "copy"], default="auto",
+                           help="auto = reflink if possible, else copy (default)")
+
+    p_delete = sub.add_parser("delete", help="Delete a snapshot manifest (run gc afterwards)")
+    p_delete.add_argument("id")
+
+    sub.add_parser("gc", help="Remove objects no snapshot references")
+
+    p_legacy = sub.add_parser("import-legacy", help="Import _img_backup_* folders as snapshots")
+    p_legacy.add_argument("--remove", action="store_true", help="Delete each folder after a successful import")
+
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "snapshot_store")
+
+    if args.cmd == "create":
+        paths = [(ROOT / p).resolve() for p in args.paths]
+        missing = [p for p in paths if not p.exists()]
+        if missing:
+            print(f"❌ Not found: {', '.join(str(p) for p in missing)}")
+            sys.exit(1)
+        label = "".join(c if c.isalnum() or c in "-_" else "-" for c in args.label)
+        create_snapshot(paths, label)
+    elif args.cmd == "list":
+        list_snapshots()
+    elif args.cmd == "restore":
+        target = (ROOT / args.to).resolve() if args.to else ROOT
+        restore_snapshot(args.id, target, args.link_mode)
+    elif args.cmd == "delete":
+        path = MANIFESTS_DIR / f"{args.id}.json"
+        if not path.exists():
+            print(f"❌ Snapshot not found: {args.id}")
+            sys.exit(1)
+        path.unlink()
+        print(f"✅ Deleted snapshot {args.id} (run gc to free its objects)")
+    elif args.cmd == "gc":
+        gc()
+    elif args.cmd == "import-legacy":
+        import_legacy(args.remove)
+
+if __name__ == "__main__":
+    main()
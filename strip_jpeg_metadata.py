@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Drop camera/phone metadata from the site's JPEGs without re-encoding them.
+
+Each file is streamed marker segment by marker segment; APPn and COM segments
+are kept only if they are on the allow-list, everything from the first scan
+to EOI is copied byte for byte, and data after EOI (MPF secondary images,
+depth / gain maps) is dropped. Pixels are untouched, so it is lossless.
+
+Segment names for --keep (default: jfif adobe icc orientation date):
+
+  jfif         APP0 JFIF header
+  jfxx         APP0 JFXX (thumbnail)
+  exif         APP1 Exif, complete (GPS, maker notes, thumbnail, ...)
+  orientation  a minimal Exif with only the Orientation tag (when it isn't 1)
+  date         ... plus DateTimeOriginal (media_catalogue.py queries by it)
+  xmp          APP1 XMP / extended XMP
+  icc          APP2 ICC profile (keeps colour right, sRGB or not)
+  mpf          APP2 MPF (index of images appended after EOI)
+  ducky        APP12
+  iptc         APP13 Photoshop / IPTC
+  adobe        APP14 Adobe (colour transform flag; needed to decode CMYK/YCCK)
+  com          COM comments
+  other        any other APPn
+
+Running it again changes nothing. Files are processed on a process pool and
+replaced through the site journal; bytes saved are reported per project.
+
+  python3 strip_jpeg_metadata.py [PATH...] [--keep NAME ...] [--dry-run] [-j N]
+"""
+
+from pathlib import Path
+import argparse
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from image_headers import EXIF_HEADER, parse_exif
+import profiling
+from site_index import SiteIndex, project_slug
+from site_journal import Batch
+
+ROOT = Path(".").resolve()
+SCRIPT = "strip_jpeg_metadata"
+DEFAULT_PREFIXES = ("works/projects/", "images/")
+JPEG_EXTS = {".jpg", ".jpeg"}
+DEFAULT_KEEP = ("jfif", "adobe", "icc", "orientation", "date")
+SEGMENT_NAMES = ("jfif", "jfxx", "exif", "orientation", "date", "xmp", "icc", "mpf", "ducky", "iptc", "adobe", "com", "other")
+TMP_SUFFIX = ".strip-tmp"
+COPY_CHUNK = 1 << 20
+
+XMP_HEADERS = (b"http://ns.adobe.com/xap/1.0/\x00", b"http://ns.adobe.com/xmp/extension/\x00")
+ICC_HEADER = b"ICC_PROFILE\x00"
+MPF_HEADER = b"MPF\x00"
+
+class NotJpeg(Exception):
+    pass
+
+def segment_name(marker: int, payload: bytes) -> str:
+    if marker == 0xFE:
+        return "com"
+    if marker == 0xE0:
+        if payload.startswith(b"JFIF\x00"):
+            return "jfif"
+        if payload.startswith(b"JFXX\x00"):
+            return "jfxx"
+    elif marker == 0xE1:
+        if payload.startswith(EXIF_HEADER):
+            return "exif"
+        if payload.startswith(XMP_HEADERS):
+            return "xmp"
+    elif marker == 0xE2:
+        if payload.startswith(ICC_HEADER):
+            return "icc"
+        if payload.startswith(MPF_HEADER):
+            return "mpf"
+    elif marker == 0xEC:
+        return "ducky"
+    elif marker == 0xED:
+        return "iptc"
+    elif marker == 0xEE and payload.startswith(b"Adobe"):
+        return "adobe"
+    return "other"
+
+def minimal_exif(orientation: int | None, taken: str | None) -> bytes | None:
+    """Big-endian Exif with just Orientation (and DateTimeOriginal). None if there's nothing to keep."""
+    if orientation in (None, 1):
+        orientation = None
+    if orientation is None and taken is None:
+        return None
+    entries = []
+    if orientation is not None:
+        entries.append(struct.pack(">HHII", 0x0112, 3, 1, orientation << 16))
+    ifd0_size = 2 + 12 * (len(entries) + (taken is not None)) + 4
+    tail = b""
+    if taken is not None:
+        exif_ifd = 8 + ifd0_size
+        entries.append(struct.pack(">HHII", 0x8769, 4, 1, exif_ifd))
+        date = (taken.replace("-", ":").replace("T", " ")[:19]).encode("ascii") + b"\x00"
+        date_off = exif_ifd + 2 + 12 + 4
+        tail = struct.pack(">H", 1) + struct.pack(">HHII", 0x9003, 2, len(date), date_off) + b"\x00\x00\x00\x00" + date
+    ifd0 = struct.pack(">H", len(entries)) + b"".join(entries) + b"\x00\x00\x00\x00"
+    return EXIF_HEADER + b"MM\x00\x2a\x00\x00\x00\x08" + ifd0 + tail
+
+def rewrite_exif(payload: bytes, keep: set[str]) -> bytes | None:
+    info = parse_exif(payload[len(EXIF_HEADER):])
+    return minimal_exif(
+        info["orientation"] if "orientation" in keep else None,
+        info["taken"] if "date" in keep else None,
+    )
+
+def copy_to_eoi(src, out, size: int) -> int:
+    """Copy the entropy-coded data up to and including EOI. Returns how many bytes followed EOI (dropped)."""
+    carry = b""
+    while True:
+        chunk = src.read(COPY_CHUNK)
+        if not chunk:
+            out.write(carry)
+            return 0  # 没有 EOI（截断的文件）：原样照抄
+        data = carry + chunk
+        # 扫描数据里的 0xFF 后面只会跟 00 / RSTn / 标记，所以第一个 FFD9 就是 EOI
+        i = data.find(b"\xff\xd9")
+        if i >= 0:
+            out.write(data[:i + 2])
+            return len(data) - i - 2 + size - src.tell()
+        out.write(data[:-1])
+        carry = data[-1:]
+
+class CountingSink:
+    """Stands in for the output file in --dry-run: only counts bytes."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+
+def strip_stream(src, out, size: int, keep: set[str]) -> dict[str, int]:
+    """Stream one JPEG from src to out. Returns {segment name: bytes dropped}."""
+    if src.read(2) != b"\xff\xd8":
+        raise NotJpeg("no SOI marker")
+    out.write(b"\xff\xd8")
+    dropped: dict[str, int] = {}
+    while True:
+        byte = src.read(1)
+        while byte == b"\xff":  # 填充字节
+            byte = src.read(1)
+        if not byte:
+            raise NotJpeg("ended before the image data")
+        marker = byte[0]
+        if marker == 0xD9:
+            out.write(b"\xff\xd9")
+            return dropped
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            out.write(b"\xff" + byte)
+            continue
+        raw = src.read(2)
+        if len(raw) < 2:
+            raise NotJpeg("truncated segment header")
+        (length,) = struct.unpack(">H", raw)
+        if marker == 0xDA:
+            out.write(b"\xff\xda" + raw)
+            tail = copy_to_eoi(src, out, size)
+            if tail:
+                dropped["after EOI"] = tail
+            return dropped
+        if not (0xE0 <= marker <= 0xEF or marker == 0xFE):
+            # DQT / DHT / SOF / DRI ...：解码需要的段，原样照抄
+            out.write(b"\xff" + byte + raw)
+            remaining = length - 2
+            while remaining:
+                data = src.read(min(remaining, COPY_CHUNK))
+                if not data:
+                    raise NotJpeg("truncated segment")
+                out.write(data)
+                remaining -= len(data)
+            continue
+        payload = src.read(length - 2)
+        name = segment_name(marker, payload)
+        if name in keep:
+            out.write(b"\xff" + byte + raw + payload)
+            continue
+        if name == "exif" and keep & {"orientation", "date"}:
+            small = rewrite_exif(payload, keep)
+            if small is not None:
+                out.write(b"\xff\xe1" + struct.pack(">H", len(small) + 2) + small)
+                saved = len(payload) - len(small)
+                if saved:
+                    dropped["exif"] = dropped.get("exif", 0) + saved
+                continue
+        dropped[name] = dropped.get(name, 0) + length + 2
+
+def strip_file(rel: str, keep: list[str], dry_run: bool) -> tuple[str, int, int, dict, str | None]:
+    """Worker: (rel, old size, new size, dropped, temp file to install or None if unchanged)."""
+    path = ROOT / rel
+    size = path.stat().st_size
+    keep_set = set(keep)
+    tmp = path.with_name(f".{path.name}{TMP_SUFFIX}")
+    with path.open("rb") as src:
+        if dry_run:
+            sink = CountingSink()
+            dropped = strip_stream(src, sink, size, keep_set)
+            return rel, size, sink.size, dropped, None
+        with tmp.open("wb") as out:
+            dropped = strip_stream(src, out, size, keep_set)
+            new_size = out.tell()
+    if not dropped and new_size == size:
+        tmp.unlink()
+        return rel, size, size, dropped, None
+    return rel, size, new_size, dropped, str(tmp)
+
+def safe_strip(rel: str, keep: list[str], dry_run: bool):
+    try:
+        return strip_file(rel, keep, dry_run)
+    except (NotJpeg, OSError, struct.error) as e:
+        return rel, 0, 0, {"error": str(e)}, None
+
+def find_jpegs(paths: list[str]) -> list[str]:
+    index = SiteIndex(ROOT)
+    index.scan()
+    prefixes = tuple(p.rstrip("/") + "/" for p in paths) if paths else DEFAULT_PREFIXES
+    return [
+        rel for rel, e in sorted(index.entries.items())
+        if not e.is_dir and os.path.splitext(rel)[1].lower() in JPEG_EXTS
+        and (rel.startswith(prefixes) or rel in paths)
+    ]
+
+def group_of(rel: str) -> str:
+    return project_slug(rel) or rel.split("/", 1)[0]
+
+def main():
+    ap = argparse.ArgumentParser(description="Losslessly strip metadata segments from JPEGs (streaming, journaled, parallel).")
+    ap.add_argument("paths", nargs="*", help=f"Files or folders (default: {' '.join(DEFAULT_PREFIXES)})")
+    ap.add_argument("--keep", nargs="+", choices=SEGMENT_NAMES, default=list(DEFAULT_KEEP), metavar="NAME",
+                    help=f"Segments to keep (default: {' '.join(DEFAULT_KEEP)}; choices: {', '.join(SEGMENT_NAMES)})")
+    ap.add_argument("--dry-run", action="store_true", help="Report what would be saved, write nothing")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (default: 0 = one per CPU)")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "strip_jpeg_metadata")
+
+    files = find_jpegs(args.paths)
+    if not files:
+        print("— No JPEGs found.")
+        return
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    items = [(rel, args.keep, args.dry_run) for rel in files]
+
+    per_group: dict[str, list[int]] = {}
+    changed = errors = 0
+    with Batch(SCRIPT) as batch:
+        if jobs > 1 and len(files) > 1:
+            ex = ProcessPoolExecutor(max_workers=jobs)
+            results = ex.map(safe_strip, *zip(*items), chunksize=8)
+        else:
+            ex = None
+            results = (safe_strip(*item) for item in items)
+        try:
+            for rel, old, new, dropped, tmp in results:
+                if "error" in dropped:
+                    errors += 1
+                    print(f"❌ {rel}: {dropped['error']}")
+                    continue
+                stats = per_group.setdefault(group_of(rel), [0, 0, 0])
+                stats[0] += 1
+                stats[1] += old
+                if old == new and not dropped:
+                    continue
+                stats[2] += old - new
+                changed += 1
+                if tmp:
+                    batch.write_from(ROOT / rel, Path(tmp))
+                what = ", ".join(f"{k} {v / 1024:.1f} KB" for k, v in sorted(dropped.items()))
+                print(f"{'(dry run) ' if args.dry_run else ''}✅ {rel}: -{(old - new) / 1024:.1f} KB ({what})")
+        finally:
+            if ex is not None:
+                ex.shutdown()
+
+    print("\nSaved per project:")
+    total_old = total_saved = 0
+    for group, (count, old, saved) in sorted(per_group.items()):
+        total_old += old
+        total_saved += saved
+        pct = 100 * saved / old if old else 0
+        print(f"  {group}: {count} file(s), {saved / 1024:.1f} KB of {old / 1e6:.1f} MB ({pct:.1f}%)")
+    print(f"\nJPEGs: {len(files)} | changed: {changed} | errors: {errors} | saved: {total_saved / 1024:.1f} KB"
+          + (" (dry run, nothing written)" if args.dry_run else ""))
+    if batch.id:
+        print(f"Undo: python3 site_journal.py undo {batch.id}")
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,11 @@
 # -*- coding: utf-8 -*-
 
 from pathlib import Path
-import re
-from datetime import datetime
+import argparse
+import os
+
+import profiling
+from ref_rewriter import RefRewriter, rewrite_files, site_html_files
 
 # 你确认的新项目详情页路径（A: works/projects/<slug>/index.html）
 NEW_LINKS = {
@@ -24,57 +27,28 @@ REPLACE_MAP = {
     # "works/work-six/index.html": NEW_LINKS["making_conversation"],
 }
 
-# 默认会处理这些文件；你也可以让它扫描所有 .html
-DEFAULT_FILES = ["index.html", "work.html"]
-
-
-def backup_file(p: Path) -> Path:
-    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    bak = p.with_suffix(p.suffix + f".bak.{ts}")
-    bak.write_text(p.read_text(encoding="utf-8"), encoding="utf-8")
-    return bak
-
-
-def replace_in_text(text: str, replace_map: dict) -> tuple[str, int]:
-    count = 0
-    for old, new in replace_map.items():
-        # 只替换精确字符串（保守）
-        if old in text:
-            text = text.replace(old, new)
-            count += 1
-    return text, count
-
-
 def main():
-    root = Path(".").resolve()
-
-    # 你可以把 scan_all_html 改成 True，让它扫描根目录下所有 .html
-    scan_all_html = False
-
-    if scan_all_html:
-        targets = sorted([p for p in root.glob("*.html") if p.is_file()])
-    else:
-        targets = [root / f for f in DEFAULT_FILES if (root / f).exists()]
+    ap = argparse.ArgumentParser(description="Point old works/work-*/ links at the new project pages.")
+    ap.add_argument("--dry-run", action="store_true", help="Print a unified diff, write nothing")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Worker processes (default: 0 = one per CPU)")
+    ap.add_argument("pages", nargs="*", help="Only these files (default: every .html in the site)")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "update_project_links")
 
+    root = Path(".").resolve()
+    # 默认扫描整站所有 .html（精确字符串匹配，一遍扫完，不会连锁替换）
+    targets = [(root / p).resolve() for p in args.pages] if args.pages else site_html_files()
     if not targets:
-        print("⚠️ No target HTML files found. (Expected index.html / work.html)")
+        print("⚠️ No target HTML files found.")
         return
 
-    total_changed_files = 0
-    for p in targets:
-        original = p.read_text(encoding="utf-8")
-        updated, hits = replace_in_text(original, REPLACE_MAP)
-
-        if updated != original:
-            bak = backup_file(p)
-            p.write_text(updated, encoding="utf-8")
-            total_changed_files += 1
-            print(f"✅ Updated: {p.name}  (replacements: {hits})  backup: {bak.name}")
-        else:
-            print(f"— No change: {p.name}")
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    changed, hits, batch_id = rewrite_files(RefRewriter(REPLACE_MAP), targets, "update_project_links", jobs, args.dry_run)
 
-    print("\nDone.")
-    print("If anything looks wrong, restore from the .bak file.")
+    print(f"\nDone. Pages scanned: {len(targets)} | changed: {changed} | replacements: {hits}")
+    if batch_id:
+        print(f"If anything looks wrong: python3 site_journal.py undo {batch_id}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Check every project folder against a declarative layout schema.
+
+  schemas/types/<type>.json       shared rules (default, series, ...)
+  schemas/projects/<slug>.json    per-project rules; "extends" names a type
+
+A project without its own file is checked against types/default.json.
+"extends" is applied base-first: lists and scalars are replaced, groups are
+merged by name.
+
+Schema keys:
+  required_files   paths (relative to the project) that must exist, exact case
+  optional_files   known extras; like required_files they are not part of any group
+  extensions       allowed extensions (exact, so .JPG is not .jpg); others under img/ are warned about
+  ignore           regexes for file names to skip (.DS_Store, ._*, generated renditions)
+  groups           name -> {dir, dir_pattern?, pattern, extensions?, count? | min? / max?}
+                   dir may contain * for one folder level (img/dates/*); counts are per folder
+
+Each project is read with one directory walk; projects are checked on a
+thread pool.
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+
+from audit_projects import list_project_folders
+import profiling
+
+ROOT = Path(".").resolve()
+PROJECTS_DIR = ROOT / "works" / "projects"
+SCHEMAS_DIR = ROOT / "schemas"
+DEFAULT_TYPE = "default"
+
+def load_type(name: str, seen: tuple[str, ...] = ()) -> dict:
+    path = SCHEMAS_DIR / "types" / f"{name}.json"
+    if name in seen:
+        raise ValueError(f"schema type cycle: {' -> '.join(seen + (name,))}")
+    if not path.exists():
+        raise FileNotFoundError(f"schema type not found: {path.relative_to(ROOT)}")
+    return resolve_schema(json.loads(path.read_text(encoding="utf-8")), seen + (name,))
+
+def resolve_schema(schema: dict, seen: tuple[str, ...] = ()) -> dict:
+    base_name = schema.get("extends")
+    if not base_name:
+        return schema
+    merged = dict(load_type(base_name, seen))
+    for key, value in schema.items():
+        if key == "groups":
+            merged["groups"] = {**merged.get("groups", {}), **value}
+        elif key != "extends":
+            merged[key] = value
+    return merged
+
+def schema_for(slug: str) -> tuple[dict, str]:
+    """(resolved schema, where it came from)."""
+    path = SCHEMAS_DIR / "projects" / f"{slug}.json"
+    if path.exists():
+        return resolve_schema(json.loads(path.read_text(encoding="utf-8"))), path.relative_to(ROOT).as_posix()
+    return load_type(DEFAULT_TYPE), f"schemas/types/{DEFAULT_TYPE}.json"
+
+def walk_project(project_dir: Path) -> dict[str, list[str]]:
+    """One pass: relative folder ('' = project root) -> file names in it."""
+    tree: dict[str, list[str]] = {}
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        names = tree.setdefault(rel, [])
+        try:
+            it = os.scandir(project_dir / rel if rel else project_dir)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    if not e.name.startswith("."):
+                        stack.append(f"{rel}/{e.name}" if rel else e.name)
+                elif e.is_file():
+                    names.append(e.name)
+    for names in tree.values():
+        names.sort()
+    return tree
+
+def ext_of(name: str) -> str:
+    return os.path.splitext(name)[1]
+
+def validate_project(project_dir: Path) -> dict:
+    slug = project_dir.name
+    errors, warnings, oks = [], [], []
+    try:
+        schema, source = schema_for(slug)
+    except (OSError, ValueError) as e:
+        return {"slug": slug, "schema": None, "errors": [str(e)], "warnings": [], "ok": []}
+
+    tree = walk_project(project_dir)
+    ignore = [re.compile(p) for p in schema.get("ignore", [])]
+    allowed_exts = schema.get("extensions", [])
+
+    def ignored(name: str) -> bool:
+        return any(r.search(name) for r in ignore)
+
+    claimed = set()
+    for rel in schema.get("required_files", []):
+        folder, _, name = rel.rpartition("/")
+        claimed.add(rel)
+        if name not in tree.get(folder, ()):
+            errors.append(f"Missing required file: {rel}")
+    if not errors:
+        oks.append(f"Required files present ({len(schema.get('required_files', []))})")
+    claimed.update(schema.get("optional_files", []))
+
+    for group, rule in schema.get("groups", {}).items():
+        folders = [d for d in tree if d and fnmatchcase(d, rule["dir"]) and d.count("/") == rule["dir"].count("/")]
+        if not folders:
+            errors.append(f"{group}: missing folder {rule['dir']}")
+            continue
+        pattern = re.compile(rule["pattern"])
+        dir_pattern = re.compile(rule["dir_pattern"]) if rule.get("dir_pattern") else None
+        exts = rule.get("extensions", allowed_exts)
+        total = 0
+        group_errors = len(errors)
+        for folder in sorted(folders):
+            if dir_pattern and not dir_pattern.search(folder.rsplit("/", 1)[-1]):
+                errors.append(f"{group}: folder name {folder} doesn't match {rule['dir_pattern']}")
+            files = [n for n in tree[folder] if not ignored(n) and f"{folder}/{n}" not in claimed]
+            for name in files:
+                if exts and ext_of(name) not in exts:
+                    errors.append(f"{group}: bad extension: {folder}/{name} (allowed: {', '.join(exts)})")
+                elif not pattern.search(name):
+                    errors.append(f"{group}: bad name: {folder}/{name} (expected pattern: {rule['pattern']})")
+            n = len(files)
+            total += n
+            if "count" in rule and n != rule["count"]:
+                errors.append(f"{group}: expected {rule['count']} file(s) in {folder}, found {n}")
+            if "min" in rule and n < rule["min"]:
+                errors.append(f"{group}: expected at least {rule['min']} file(s) in {folder}, found {n}")
+            if "max" in rule and n > rule["max"]:
+                errors.append(f"{group}: expected at most {rule['max']} file(s) in {folder}, found {n}")
+        if len(errors) == group_errors:
+            where = f"{len(folders)} folder(s)" if len(folders) > 1 else folders[0]
+            oks.append(f"{group}: {total} file(s) OK ({where})")
+
+    # img/ 下大写或不在白名单里的扩展名：托管服务器区分大小写，先提醒
+    stray = [
+        f"{folder}/{name}"
+        for folder, names in tree.items()
+        if folder == "img" or folder.startswith("img/")
+        for name in names
+        if not ignored(name) and allowed_exts and ext_of(name) not in allowed_exts
+    ]
+    if stray:
+        warnings.append("Non-lowercase / unexpected extensions under img/: " + ", ".join(sorted(stray)))
+
+    return {"slug": slug, "schema": source, "errors": errors, "warnings": warnings, "ok": oks}
+
+def main():
+    ap = argparse.ArgumentParser(description="Validate project folder layouts against schemas/ (replaces the per-project bash checks).")
+    ap.add_argument("slugs", nargs="*", help="Only these projects (default: all folders under works/projects)")
+    ap.add_argument("--jobs", "-j", type=int, default=0, help="Threads (default: 0 = one per CPU)")
+    ap.add_argument("--json", action="store_true", help="One JSON object per project instead of text")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "validate_layouts")
+
+    folders = list_project_folders(PROJECTS_DIR)
+    if args.slugs:
+        wanted = set(args.slugs)
+        missing = wanted - {p.name for p in folders}
+        for slug in sorted(missing):
+            print(f"❌ Missing project folder: works/projects/{slug}")
+        folders = [p for p in folders if p.name in wanted]
+        if missing:
+            sys.exit(1)
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        results = list(ex.map(validate_project, folders))
+
+    failed = 0
+    for r in results:
+        failed += bool(r["errors"])
+        if args.json:
+            print(json.dumps(r, ensure_ascii=False))
+            continue
+        print(f"\nProject: {r['slug']}  [{r['schema']}]")
+        for msg in r["ok"]:
+            print(f"✅ {msg}")
+        for msg in r["warnings"]:
+            print(f"⚠️  {msg}")
+        for msg in r["errors"]:
+            print(f"❌ {msg}")
+
+    if not args.json:
+        print(f"\nProjects: {len(results)} | OK: {len(results) - failed} | failed: {failed}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
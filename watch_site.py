@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Long-running watcher: keeps a SiteIndex of the tree in memory and, when
+something changes, runs only the stages that depend on it.
+
+  projects.csv or templates/ changed -> build_site (every page) + audit (CSV section)
+  works/projects/<slug>/... changed  -> build_site (home, work and that project's pages) + audit of that one project
+  a video changed                    -> mp4_faststart (that project's videos and pages)
+  an image or project page changed   -> lqip (that project's pages)
+  a text asset changed or was built  -> precompress_assets (those files only)
+
+Every stage reads the watcher's SiteIndex instead of walking the tree again;
+what a stage wrote is put into the index before the next stage runs.
+
+Linux uses inotify (via ctypes); anything else, or --poll, falls back to
+re-listing directories whose mtime moved.
+
+The stages write into the tree they watch (build_site and lqip rewrite
+project pages and gallery/*.json). Whatever their journal batches recorded is
+dropped from the next round of changes, so a cycle doesn't retrigger itself.
+"""
+
+from pathlib import Path
+import argparse
+import ctypes
+import ctypes.util
+import os
+import posixpath
+import select
+import struct
+import sys
+import time
+
+import profiling
+from site_index import SiteIndex, project_slug, skip_dir
+from site_journal import all_batches, load_batch_ops
+
+ROOT = Path(".").resolve()
+CSV_REL = "projects.csv"
+# build_site 的页面模板：改了要重建所有页面
+TEMPLATES_PREFIX = "templates/"
+# 首页和 Work 页内联了它们的关键 CSS
+BUILD_INPUTS = {"style.css", "script.js"}
+COMPRESS_EXTS = {".html", ".css", ".js", ".mjs", ".svg", ".json", ".xml", ".txt", ".webmanifest", ".map"}
+VIDEO_EXTS = {".mp4", ".m4v", ".mov"}
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"}
+# precompress_assets.py 的输出（和它的临时文件）
+COMPRESSED_OUTPUTS = (".gz", ".br", ".gz.tmp", ".br.tmp")
+# site_journal 原子写入时的临时文件（.<name>.journal-tmp）
+JOURNAL_TMP = ".journal-tmp"
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+class InotifyWatcher:
+    """Recursive inotify: one watch per indexed directory, added/dropped as dirs come and go."""
+
+    def __init__(self, index: SiteIndex):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify not available")
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.index = index
+        self.wd_to_rel: dict[int, str] = {}
+        self.rel_to_wd: dict[str, int] = {}
+        self.add_watch("")
+        for rel in index.dirs():
+            self.add_watch(rel)
+
+    def add_watch(self, rel: str) -> None:
+        if rel in self.rel_to_wd:
+            return
+        path = str(self.index.root / rel) if rel else str(self.index.root)
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == 28:  # ENOSPC: fs.inotify.max_user_watches reached
+                print("⚠️ inotify watch limit reached; raise fs.inotify.max_user_watches or use --poll")
+            return
+        self.wd_to_rel[wd] = rel
+        self.rel_to_wd[rel] = wd
+
+    def forget(self, rel: str) -> None:
+        prefix = rel + "/"
+        for r in [r for r in self.rel_to_wd if r == rel or r.startswith(prefix)]:
+            self.wd_to_rel.pop(self.rel_to_wd.pop(r), None)
+
+    def wait(self, timeout: float) -> list[str] | None:
+        """
+        Block up to timeout seconds; return changed relative paths.
+        None means the kernel queue overflowed and the caller must rescan.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        changed = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(buf, offset)
+                offset += EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if mask & IN_IGNORED:
+                    rel = self.wd_to_rel.pop(wd, None)
+                    if rel is not None:
+                        self.rel_to_wd.pop(rel, None)
+                    continue
+                parent = self.wd_to_rel.get(wd)
+                if parent is None or not name:
+                    continue
+                rel = f"{parent}/{name}" if parent else name
+                refreshed = self.index.refresh(rel)
+                for r in refreshed:
+                    entry = self.index.entries.get(r)
+                    if entry is not None and entry.is_dir:
+                        self.add_watch(r)
+                if mask & IN_ISDIR and mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.forget(rel)
+                if not refreshed and mask & IN_CLOSE_WRITE:
+                    # 重写了同样大小、同一 mtime 粒度内的文件：索引看不出来，但内容可能变了
+                    refreshed = [rel]
+                changed += refreshed
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Fallback: stat every indexed directory each tick and re-list only the ones
+    whose mtime moved (adds / removes / renames). projects.csv is stat'ed
+    directly because edits to a file don't touch its directory's mtime.
+    """
+
+    def __init__(self, index: SiteIndex, interval: float):
+        self.index = index
+        self.interval = interval
+        self.watched_files = [CSV_REL]
+        self.root_mtime = index.root.stat().st_mtime_ns
+
+    def wait(self, timeout: float) -> list[str] | None:
+        time.sleep(min(timeout, self.interval))
+        changed = []
+
+        mtime = self.index.root.stat().st_mtime_ns
+        if mtime != self.root_mtime:
+            self.root_mtime = mtime
+            changed += self.index.rescan_dir("")
+
+        for rel in self.index.dirs():
+            entry = self.index.entries.get(rel)
+            if entry is None:
+                continue  # 已随父目录一起删掉
+            try:
+                mtime = (self.index.root / rel).stat().st_mtime_ns
+            except FileNotFoundError:
+                changed += self.index.refresh(rel)
+                continue
+            if mtime != entry.mtime_ns:
+                changed += self.index.refresh(rel)
+                changed += self.index.rescan_dir(rel)
+
+        for rel in self.watched_files:
+            changed += self.index.refresh(rel)
+        return changed
+
+    def close(self) -> None:
+        pass
+
+def plan_stages(changed: list[str]) -> dict[str, set[str] | None]:
+    """
+    Map changed paths to stages. The value is the set of project slugs the stage
+    should look at (empty set = no project changed; None = everything: used for
+    --initial, after an inotify overflow, and for video/lqip changes outside a project).
+    Paths the stages wrote themselves must be filtered out by the caller
+    (see batch_writes): project pages map to build, audit and lqip like any
+    other edit. The journal's own temp files are ignored here; writes outside
+    it (inbox/, .gz/.br variants) only rerun "compress", which skips
+    unchanged content.
+    """
+    plan: dict[str, set[str] | None] = {}
+
+    def add(stage: str, slug: str | None = None, by_project: bool = False) -> None:
+        # by_project: the stage only knows project folders, so anything outside them means everything
+        if by_project and not slug:
+            plan[stage] = None
+            return
+        slugs = plan.setdefault(stage, set())
+        if slug and slugs is not None:
+            slugs.add(slug)
+
+    for rel in changed:
+        if rel.endswith(COMPRESSED_OUTPUTS) or rel.endswith(JOURNAL_TMP):
+            continue
+        if rel == CSV_REL or rel.startswith(TEMPLATES_PREFIX):
+            plan["build"] = None
+            if rel == CSV_REL:
+                add("audit")
+            continue
+        if rel in BUILD_INPUTS:
+            add("build")
+        slug = project_slug(rel)
+        if slug and slug.startswith("."):
+            slug = None
+        if slug:
+            add("build", slug)
+            add("audit", slug)
+        ext = os.path.splitext(rel)[1].lower()
+        if ext in VIDEO_EXTS:
+            add("video", slug, by_project=True)
+        # 图片换了要重算占位图；手写页面改了要补上
+        if ext in IMAGE_EXTS or (slug and ext == ".html"):
+            add("lqip", slug, by_project=True)
+        # 文本资源变了就重新压缩；.gz/.br 自己不算。build 写出的页面由 run_stages 补上
+        if ext in COMPRESS_EXTS:
+            add("compress")
+    return plan
+
+def project_dirs(slugs: set[str] | None) -> list[str] | None:
+    """Project folders to restrict a stage to (None: the whole site)."""
+    return [f"works/projects/{slug}" for slug in sorted(slugs)] if slugs else None
+
+# 每个 stage 拿到：要看的项目（None/空 = 全站）、监视器的索引、本轮变了或刚写过的路径（None = 全部）
+
+def stage_build(slugs: set[str] | None, index: SiteIndex, paths: set[str] | None) -> None:
+    # 首页和 Work 页总在计划里，没变就按依赖签名跳过；项目页只看变了的项目
+    import build_site
+    build_site.build(slugs=slugs)
+
+def stage_audit(slugs: set[str] | None, index: SiteIndex, paths: set[str] | None) -> None:
+    import audit_projects
+    if slugs is None:
+        audit_projects.run_audit(incremental=True, index=index)
+    else:
+        audit_projects.run_audit(changed=slugs, index=index)
+
+def stage_video(slugs: set[str] | None, index: SiteIndex, paths: set[str] | None) -> None:
+    # moov 前置 + <video> 标签；已经是 faststart 的文件只读头部，很快
+    import mp4_faststart
+    mp4_faststart.run_faststart(quiet=True, index=index, under=project_dirs(slugs))
+
+def stage_lqip(slugs: set[str] | None, index: SiteIndex, paths: set[str] | None) -> None:
+    # 占位图按内容哈希缓存，已经加过的页面不会重写
+    import lqip
+    dirs = project_dirs(slugs)
+    pages = None
+    if dirs is not None:
+        pages = [ROOT / rel for d in dirs for rel in index.files_under(d) if rel.lower().endswith(".html")]
+    lqip.run_lqip(pages, jobs=os.cpu_count() or 1, quiet=True, index=index)
+
+def stage_compress(slugs: set[str] | None, index: SiteIndex, paths: set[str] | None) -> None:
+    # 按内容哈希增量压缩，放在 build 之后，能带上刚生成的页面
+    import precompress_assets
+    precompress_assets.run_precompress(jobs=os.cpu_count() or 1, index=index, only=paths)
+
+# 顺序即执行顺序
+STAGES = {
+    "build": stage_build,
+    "video": stage_video,
+    "audit": stage_audit,
+    "lqip": stage_lqip,
+    "compress": stage_compress,
+}
+
+def batch_writes(batch_ids: list[str]) -> set[str]:
+    """Paths these journal batches wrote, created or renamed, plus their folders."""
+    written = set()
+    for batch_id in batch_ids:
+        for op in load_batch_ops(batch_id):
+            for key in ("path", "src", "dst"):
+                rel = op.get(key)
+                if rel:
+                    written.add(rel)
+                    # 轮询模式下报的是 mtime 变了的目录
+                    written.add(posixpath.dirname(rel))
+    return written
+
+def absorb_writes(index: SiteIndex, written: set[str], watcher) -> None:
+    """Put what a stage wrote into the index, so later stages (and the watcher) see it."""
+    # 父目录先于子路径：新目录整棵扫进来，再补监视
+    for rel in sorted(written, key=lambda r: r.count("/")):
+        if not rel or any(skip_dir(part) for part in rel.split("/")):
+            continue
+        for r in index.refresh(rel):
+            entry = index.entries.get(r)
+            if entry is not None and entry.is_dir and isinstance(watcher, InotifyWatcher):
+                watcher.add_watch(r)
+
+def run_stages(plan: dict[str, set[str] | None], index: SiteIndex, changed: list[str] | None,
+               watcher) -> set[str]:
+    """
+    Run the planned stages in order; returns what their journal batches wrote.
+    changed: the paths that triggered the cycle (None = everything). Each stage
+    also gets what the stages before it wrote, and anything written queues compress.
+    """
+    paths = set(changed) if changed is not None else None
+    written: set[str] = set()
+    for name, fn in STAGES.items():
+        if name not in plan and not (name == "compress" and written):
+            continue
+        slugs = plan.get(name, set())
+        label = f"{name} ({', '.join(sorted(slugs))})" if slugs else name
+        before = {p.name for p in all_batches()}
+        t0 = time.perf_counter()
+        print(f"▶ {label}")
+        try:
+            fn(slugs, index, paths)
+        except Exception as e:  # 守护进程不能因为一个 stage 出错就退出
+            print(f"❌ Stage {name} failed: {e}")
+            continue
+        finally:
+            wrote = batch_writes([p.name for p in all_batches() if p.name not in before])
+            absorb_writes(index, wrote, watcher)
+            written |= wrote
+            if paths is not None:
+                paths |= wrote
+        print(f"✅ {name} done in {time.perf_counter() - t0:.2f}s")
+    return written
+
+def main():
+    ap = argparse.ArgumentParser(description="Watch the site tree and rerun only the affected stages.")
+    ap.add_argument("--poll", action="store_true", help="Force the polling fallback instead of inotify")
+    ap.add_argument("--interval", type=float, default=1.0, help="Polling interval in seconds (default: 1.0)")
+    ap.add_argument("--debounce", type=float, default=0.3,
+                    help="Wait this long after the last change before running stages (default: 0.3)")
+    ap.add_argument("--initial", action="store_true", help="Run every stage once at startup")
+    profiling.add_argument(ap)
+    args = ap.parse_args()
+    profiling.start(args.profile, "watch_site")
+
+    index = SiteIndex(ROOT)
+    t0 = time.perf_counter()
+    index.scan()
+    print(f"Indexed {len(index.entries)} entries in {time.perf_counter() - t0:.2f}s")
+
+    watcher = None
+    if not args.poll and sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher(index)
+            print(f"Watching with inotify ({len(watcher.rel_to_wd)} directories)")
+        except OSError as e:
+            print(f"⚠️ inotify unavailable ({e}); falling back to polling")
+    if watcher is None:
+        watcher = PollingWatcher(index, args.interval)
+        print(f"Watching by polling every {args.interval:.1f}s")
+
+    own_writes: set[str] = set()
+    if args.initial:
+        own_writes = run_stages({name: None for name in STAGES}, index, None, watcher)
+
+    pending: list[str] = []
+    try:
+        while True:
+            changed = watcher.wait(args.debounce if pending else 3600)
+            if changed is None:
+                print("⚠️ Event queue overflowed; rescanning the whole tree")
+                index.scan()
+                if isinstance(watcher, InotifyWatcher):
+                    for rel in index.dirs():
+                        watcher.add_watch(rel)
+                own_writes = run_stages({name: None for name in STAGES}, index, None, watcher)
+                pending = []
+                continue
+            if changed:
+                pending += changed
+                continue
+            if pending:
+                # 上一轮 stage 自己写的文件不算新的变化，否则会自己触发自己
+                changed = [rel for rel in pending if rel not in own_writes]
+                plan = plan_stages(changed)
+                pending = []
+                own_writes = run_stages(plan, index, changed, watcher) if plan else set()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        watcher.close()
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,6 @@ ROOT="works/projects/p-2022-001-columbarium-of-the-days/img"
 QUALITY="80"
 MAX="1600"
 DO_BACKUP="yes"
-BACKUP_DIR="_img_backup_$(date +%Y%m%d-%H%M%S)"
 
 while [ $# -gt 0 ]; do
   case "$1" in
@@ -22,14 +21,13 @@ command -v cwebp >/dev/null 2>&1 || { echo "Missing: cwebp"; echo "Install: brew
 
 printf 'Mode: %s\nRoot: %s\nQual: %s\nMax : %s\nBackup: %s\n' "$MODE" "$ROOT" "$QUALITY" "$MAX" "$DO_BACKUP"
 
+if [ "$MODE" = "apply" ] && [ "$DO_BACKUP" = "yes" ]; then
+  python3 snapshot_store.py create --label webpify "$ROOT"
+fi
+
 find "$ROOT" -type f \( -iname '*.jpg' -o -iname '*.jpeg' \) -print0 | while IFS= read -r -d '' f; do
   out="${f%.*}.webp"
 
-  if [ "$MODE" = "apply" ] && [ "$DO_BACKUP" = "yes" ]; then
-    mkdir -p "$BACKUP_DIR/$(dirname "$f")"
-    cp -p "$f" "$BACKUP_DIR/$f"
-  fi
-
   w="$(sips -g pixelWidth "$f" 2>/dev/null | awk '/pixelWidth/ {print $2}')"
   h="$(sips -g pixelHeight "$f" 2>/dev/null | awk '/pixelHeight/ {print $2}')"
   if [ -z "${w:-}" ] || [ -z "${h:-}" ]; then
@@ -62,5 +60,5 @@ done
 
 echo "Done."
 if [ "$MODE" = "apply" ] && [ "$DO_BACKUP" = "yes" ]; then
-  echo "Backup folder: $BACKUP_DIR"
+  echo "Undo: python3 snapshot_store.py list ; python3 snapshot_store.py restore <id>"
 fi